@@ -3,83 +3,294 @@ backstop.py — Python post-generation filter.
 
 Catches cases where the LLM fails to refuse out-of-scope or safety-sensitive
 messages, and returns a safe fallback response instead.
+
+Model output has its own rules (`output_rules`), in the input categories
+plus `refusal`. check_output() applies them to a complete response, and
+StreamCheck applies them to a streamed one delta by delta, so a stream can
+be stopped as soon as a rule fires rather than after the whole answer has
+been generated.
+
+The rules live in a versioned JSON file (app/rules.json, or
+BACKSTOP_RULES_PATH). It is validated and compiled into a RuleSet at load:
+each category becomes one alternation, searched in priority order
+(distress, then adversarial, then out-of-scope) against a single lowercased
+copy of the message. Patterns must therefore be written in lowercase.
+
+The file is re-checked at most every BACKSTOP_RULES_RELOAD_INTERVAL seconds
+and hot-swapped when it changes. A request keeps the RuleSet it started
+with, and a file that fails validation is rejected while the previous
+rules stay live.
 """
 
+import json
+import logging
+import os
 import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+RULES_PATH = Path(os.getenv("BACKSTOP_RULES_PATH", Path(__file__).parent / "rules.json"))
+RULES_RELOAD_INTERVAL = float(os.getenv("BACKSTOP_RULES_RELOAD_INTERVAL", "5"))
+# Time every rule individually on one in N messages to attribute match cost
+RULES_PROFILE_EVERY = int(os.getenv("BACKSTOP_RULES_PROFILE_EVERY", "100"))
+# Characters of already-streamed output rescanned with each new delta: the
+# longest output rule match that is still caught when split across deltas
+OUTPUT_WINDOW = int(os.getenv("BACKSTOP_OUTPUT_WINDOW", "256"))
+
+SCHEMA_VERSION = 1
+
+# Categories in priority order: when a message matches rules from several
+# categories, the earliest category here wins.
+CATEGORIES = ("distress", "adversarial", "out_of_scope")
+# Output rules may also catch the model refusing, so the stream can stop
+# there and send the canned redirect instead of the rest of the answer.
+OUTPUT_CATEGORIES = (*CATEGORIES, "refusal")
+
+RULE_ID = re.compile(r"[a-z][a-z0-9_]*")
+_WHITESPACE = re.compile(r"\s")
+
+
+class RuleError(ValueError):
+    """The rules file is malformed or a pattern doesn't compile."""
+
+
+class Rule(NamedTuple):
+    id: str
+    category: str
+    pattern: str
+    response: str
+
+
+class BackstopMatch(NamedTuple):
+    category: str
+    rule: str
+    span: tuple[int, int]
+    response: str
+
+
+@dataclass
+class RuleStats:
+    hits: int = 0
+    profiled: int = 0       # messages this rule was individually timed on
+    seconds: float = 0.0    # total time of those individual timings
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "mean_match_us": self.seconds / self.profiled * 1e6 if self.profiled else None,
+        }
+
+
+# Keyed by rule id so counters survive reloads that keep a rule
+_stats: dict[str, RuleStats] = {}
+
+
+class Matcher:
+    """
+    Rules compiled into one regex per category.
+
+    One alternation across *all* rules would need a full scan to honour
+    priority, and CPython's re gets no faster with more alternatives, so
+    per-category searches that stop at the first hit are cheaper in
+    practice. The search regexes have no capturing groups (those make
+    CPython's matcher 2-3x slower); the rule that fired is identified
+    afterwards by re-matching only at the hit position. Matching runs on
+    lowercased text without re.IGNORECASE, which roughly halves the
+    per-character cost.
+    """
+
+    def __init__(self, rules: list[Rule], categories: tuple[str, ...] = CATEGORIES):
+        self.rules = rules
+        self.compiled = [(re.compile(r.pattern), r) for r in rules]
+        self.categories: list[tuple[re.Pattern, list[tuple[re.Pattern, Rule]]]] = []
+        for category in categories:
+            members = [(regex, r) for regex, r in self.compiled if r.category == category]
+            if members:
+                search = re.compile("|".join(f"(?:{r.pattern})" for _, r in members))
+                self.categories.append((search, members))
+        self._calls = 0
+
+    def match(self, text: str, partial: bool = False) -> BackstopMatch | None:
+        """
+        Return the highest-priority match in `text`, or None. The span
+        indexes the lowercased text, which has the same length as `text`
+        for everything but a handful of exotic characters.
+
+        With `partial`, `text` may still be continued, so a hit that runs
+        to its very end isn't reported yet: the next characters could
+        undo a trailing \b ("tea" in "teaspoon").
+        """
+        text = text.lower()
+        self._calls += 1
+        if RULES_PROFILE_EVERY and self._calls % RULES_PROFILE_EVERY == 0:
+            self._profile(text)
+
+        for search, members in self.categories:
+            m = search.search(text)
+            if m and not (partial and m.end() == len(text)):
+                for regex, rule in members:
+                    hit = regex.match(text, m.start())
+                    if hit:
+                        _stats.setdefault(rule.id, RuleStats()).hits += 1
+                        return BackstopMatch(rule.category, rule.id, hit.span(), rule.response)
+        return None
+
+    def _profile(self, text: str):
+        for regex, rule in self.compiled:
+            start = time.perf_counter()
+            regex.search(text)
+            stats = _stats.setdefault(rule.id, RuleStats())
+            stats.seconds += time.perf_counter() - start
+            stats.profiled += 1
+
+
+class RuleSet:
+    """An immutable, compiled snapshot of one rules file."""
+
+    def __init__(self, config: dict, path: Path | None = None, mtime: float = 0.0):
+        self.path = path
+        self.mtime = mtime
+        self.version = str(config["version"])
+        responses = config["responses"]
+        self.rules = [
+            Rule(r["id"], r["category"], r["pattern"], responses[r["response"]])
+            for r in config["rules"]
+        ]
+        self.matcher = Matcher(self.rules)
+        self.output_rules = [
+            Rule(r["id"], r["category"], r["pattern"], responses[r["response"]])
+            for r in config.get("output_rules", [])
+        ]
+        self.output_matcher = Matcher(self.output_rules, OUTPUT_CATEGORIES)
+        # Topics the model must refuse: if the user message matches and the
+        # model output contains no refusal phrase, the output is replaced.
+        self.unrefused_topics = [
+            (re.compile(t["pattern"]), responses[t["response"]])
+            for t in config.get("unrefused_topics", [])
+        ]
+        self.refusal_phrases = list(config["refusal_phrases"])
+        self.refusal_regex = re.compile("|".join(map(re.escape, self.refusal_phrases)))
 
-# --- Safety / Distress Keywords ---
-# If the user input contains these, skip the LLM and return a crisis response.
-DISTRESS_PATTERNS = [
-    r"\b(suicid|kill myself|end my life|self.harm|want to die|hurt myself)\b",
-    r"\b(depressed|hopeless|no reason to live)\b",
-]
-
-DISTRESS_RESPONSE = (
-    "I'm just a coffee bot, so I'm not equipped to help with what you're describing. "
-    "Please reach out to someone who can — the 988 Suicide & Crisis Lifeline is available "
-    "24/7 by calling or texting 988 (US). You deserve real support. ☕"
-)
-
-# --- Adversarial / Jailbreak Patterns ---
-# Catch prompt injections and dangerous requests BEFORE they reach the LLM.
-ADVERSARIAL_PATTERNS = [
-    r"ignore (your|all|my) (previous )?(instructions|rules|guidelines|programming)",
-    r"pretend you are",
-    r"you are now",
-    r"\bno (restrictions|rules|guidelines|limits)\b",
-    r"\bjailbreak\b",
-    r"\b(bomb|weapon|hack|exploit|steal|illegal)\b",
-]
-
-ADVERSARIAL_RESPONSE = (
-    "That's outside BrewBot's expertise! I'm your go-to for anything "
-    "coffee brewing related — from dialing in your espresso to choosing "
-    "the right pour-over technique. ☕"
-)
-
-# --- Out-of-Scope Topics (keyword backstop) ---
-# These catch cases where the LLM answers something it shouldn't.
-# Maps a regex pattern to a friendly redirect message.
-OUT_OF_SCOPE_PATTERNS = [
-    (
-        r"\b(open a caf[eé]|start a coffee shop|business plan|profit margin|wholesale price|pos system|hire barista)\b",
-        "That sounds like a café business question, which is outside BrewBot's expertise! "
-        "For business advice, check out the Specialty Coffee Association (sca.coffee). "
-        "Happy to help with anything about brewing though! ☕",
-    ),
-    (
-        r"\b(tea|matcha|chai|kombucha|juice|smoothie|beer|wine|cocktail|whiskey|alcohol)\b",
-        "BrewBot is a coffee specialist — other beverages are outside my expertise. "
-        "Ask me anything about coffee brewing and I'm all yours! ☕",
-    ),
-    (
-        r"\b(diagnos|prescri|medication|doctor|cancer|diabetes|heart disease|blood pressure|calorie|diet plan|weight loss)\b",
-        "BrewBot covers brewing craft, not medical or nutritional advice. "
-        "For health questions, please consult a healthcare professional. "
-        "I'm happy to talk about coffee flavors, ratios, or brewing methods! ☕",
-    ),
-    (
-        r"\b(cover letter|resume|job application|curriculum vitae)\b",
-        "That's outside BrewBot's expertise! I'm your go-to for anything "
-        "coffee brewing related — from dialing in your espresso to choosing "
-        "the right pour-over technique. ☕",
-    ),
-]
-
-# --- LLM Refusal Bypass Detection ---
-# If the model's OUTPUT looks like it answered an out-of-scope topic despite
-# our prompt, these patterns on the OUTPUT signal a missed refusal.
-# (Used in eval only — not applied at runtime to avoid false positives.)
-REFUSAL_PHRASES = [
-    "outside my expertise",
-    "outside brewbot",
-    "coffee specialist",
-    "brewbot focuses on",
-    "not equipped to help",
-    "consult a",
-    "healthcare professional",
-    "not 100% certain",
-]
+    def is_refusal(self, response: str) -> bool:
+        return self.refusal_regex.search(response.lower()) is not None
+
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise RuleError(message)
+
+
+def validate(config: dict):
+    """Raise RuleError unless `config` is a well-formed rules document."""
+    _require(isinstance(config, dict), "rules file must be a JSON object")
+    _require(config.get("schema") == SCHEMA_VERSION, f"unsupported schema (expected {SCHEMA_VERSION})")
+    _require("version" in config, "missing 'version'")
+    responses = config.get("responses")
+    _require(isinstance(responses, dict) and responses, "'responses' must be a non-empty object")
+
+    seen = set()
+    entries = [("rules", r) for r in config.get("rules", [])]
+    entries += [("unrefused_topics", t) for t in config.get("unrefused_topics", [])]
+    entries += [("output_rules", r) for r in config.get("output_rules", [])]
+    _require(any(kind == "rules" for kind, _ in entries), "'rules' must be a non-empty list")
+    for kind, entry in entries:
+        rule_id = entry.get("id", "")
+        where = f"{kind}[{rule_id or '?'}]"
+        _require(bool(RULE_ID.fullmatch(rule_id)), f"{where}: id must match {RULE_ID.pattern}")
+        _require(rule_id not in seen, f"{where}: duplicate id")
+        seen.add(rule_id)
+        if kind == "rules":
+            _require(entry.get("category") in CATEGORIES, f"{where}: category must be one of {CATEGORIES}")
+        elif kind == "output_rules":
+            _require(entry.get("category") in OUTPUT_CATEGORIES,
+                     f"{where}: category must be one of {OUTPUT_CATEGORIES}")
+        _require(entry.get("response") in responses, f"{where}: unknown response {entry.get('response')!r}")
+        pattern = entry.get("pattern")
+        _require(isinstance(pattern, str) and pattern, f"{where}: missing pattern")
+        # Escapes like \b and \W are fine; literal text must be lowercase
+        _require(re.sub(r"\\.", "", pattern) == re.sub(r"\\.", "", pattern).lower(),
+                 f"{where}: patterns are matched against lowercased text and must be lowercase")
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise RuleError(f"{where}: invalid pattern: {e}") from e
+
+    phrases = config.get("refusal_phrases")
+    _require(isinstance(phrases, list) and phrases and all(isinstance(p, str) and p == p.lower() for p in phrases),
+             "'refusal_phrases' must be a non-empty list of lowercase strings")
+
+
+def load_rules(path: Path = RULES_PATH) -> RuleSet:
+    """Read, validate and compile a rules file."""
+    path = Path(path)
+    mtime = path.stat().st_mtime
+    try:
+        config = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        raise RuleError(f"{path}: {e}") from e
+    validate(config)
+    return RuleSet(config, path, mtime)
+
+
+# --- Hot Reload ---
+_rules = load_rules()
+_loaded_mtime = _rules.mtime  # mtime of the last file we tried to load
+_reload_lock = threading.Lock()
+_next_check = time.monotonic() + RULES_RELOAD_INTERVAL
+
+
+def current_rules() -> RuleSet:
+    """
+    Return the live RuleSet, reloading it first if the file has changed.
+    The swap is a single reference assignment, so callers holding the old
+    RuleSet finish with it undisturbed.
+    """
+    global _rules, _loaded_mtime, _next_check
+    if time.monotonic() < _next_check or not _reload_lock.acquire(blocking=False):
+        return _rules
+    try:
+        _next_check = time.monotonic() + RULES_RELOAD_INTERVAL
+        try:
+            mtime = _rules.path.stat().st_mtime
+        except OSError as e:
+            logger.error("Keeping backstop rules version %s; cannot stat file: %s", _rules.version, e)
+            return _rules
+        if mtime != _loaded_mtime:
+            # A broken file is tried once per edit, not on every check
+            _loaded_mtime = mtime
+            try:
+                _rules = load_rules(_rules.path)
+                logger.info("Reloaded backstop rules version %s", _rules.version)
+            except (OSError, RuleError) as e:
+                logger.error("Keeping backstop rules version %s; reload failed: %s", _rules.version, e)
+        return _rules
+    finally:
+        _reload_lock.release()
+
+
+def rule_stats() -> dict:
+    """Per-rule hit counts and sampled match cost for the live input and output rules."""
+    rules = current_rules()
+    return {
+        "version": rules.version,
+        "rules": {
+            rule.id: {"category": rule.category, **_stats.get(rule.id, RuleStats()).as_dict()}
+            for rule in [*rules.rules, *rules.output_rules]
+        },
+    }
+
+
+# --- Checks ---
+
+def match_input(user_message: str) -> BackstopMatch | None:
+    """Return the rule that user input triggers (category, rule id, span, response), if any."""
+    return current_rules().matcher.match(user_message)
 
 
 def check_input(user_message: str) -> str | None:
@@ -87,24 +298,13 @@ def check_input(user_message: str) -> str | None:
     Check user input BEFORE sending to the LLM.
     Returns a fallback string if triggered, or None if input is safe to pass through.
     """
-    msg = user_message.lower()
-
-    # Check distress first (highest priority)
-    for pattern in DISTRESS_PATTERNS:
-        if re.search(pattern, msg, re.IGNORECASE):
-            return DISTRESS_RESPONSE
+    match = match_input(user_message)
+    return match.response if match else None
 
-    # Check adversarial / jailbreak patterns
-    for pattern in ADVERSARIAL_PATTERNS:
-        if re.search(pattern, msg, re.IGNORECASE):
-            return ADVERSARIAL_RESPONSE
 
-    # Check out-of-scope topics
-    for pattern, response in OUT_OF_SCOPE_PATTERNS:
-        if re.search(pattern, msg, re.IGNORECASE):
-            return response
-
-    return None
+def match_output(llm_response: str) -> BackstopMatch | None:
+    """Return the output rule a complete response triggers, if any."""
+    return current_rules().output_matcher.match(llm_response)
 
 
 def check_output(llm_response: str, user_message: str) -> str | None:
@@ -113,21 +313,67 @@ def check_output(llm_response: str, user_message: str) -> str | None:
     Returns a corrected fallback if the model appears to have answered
     something it shouldn't. Returns None if output looks fine.
     """
+    rules = current_rules()
+    match = rules.output_matcher.match(llm_response)
+    if match:
+        return match.response
     msg_lower = user_message.lower()
-    response_lower = llm_response.lower()
 
-    # If user asked about non-coffee beverage but model didn't refuse
-    if re.search(r"\b(matcha|kombucha|beer|wine|cocktail)\b", msg_lower):
-        if not any(phrase in response_lower for phrase in REFUSAL_PHRASES):
-            return (
-                "BrewBot is a coffee specialist — other beverages fall outside my expertise. "
-                "Ask me anything coffee-related and I'm happy to help! ☕"
-            )
+    # If user asked about a topic it must refuse but the model didn't refuse
+    for pattern, response in rules.unrefused_topics:
+        if pattern.search(msg_lower) and not rules.is_refusal(llm_response):
+            return response
 
     return None
 
 
 def is_refusal(response: str) -> bool:
     """Return True if a response contains a recognizable refusal phrase."""
-    response_lower = response.lower()
-    return any(phrase in response_lower for phrase in REFUSAL_PHRASES)
+    return current_rules().is_refusal(response)
+
+
+class StreamCheck:
+    """
+    Output rules applied to a response as it streams. feed() each delta in
+    order; once it returns a match, the caller should stop the generation
+    and send the match's response instead.
+
+    Each delta is scanned together with the last OUTPUT_WINDOW characters
+    before it, cut back to a word boundary, so a match split across deltas
+    is still caught while the cost per delta stays flat however long the
+    response grows. A match longer than the window can be missed mid-stream;
+    check_output() on the complete text still sees it. Spans index the
+    whole response.
+    """
+
+    def __init__(self, rules: RuleSet | None = None, window: int = OUTPUT_WINDOW):
+        self.matcher = (rules or current_rules()).output_matcher
+        self.window = window
+        self.match: BackstopMatch | None = None
+        self._tail = ""
+        self._offset = 0  # position of _tail in the response
+
+    def feed(self, delta: str) -> BackstopMatch | None:
+        if self.match is None and delta:
+            text = self._tail + delta
+            match = self.matcher.match(text, partial=True)
+            if match:
+                start, end = match.span
+                self.match = match._replace(span=(start + self._offset, end + self._offset))
+            cut = max(len(text) - self.window, 0)
+            if cut:
+                # A \b at the start of the window must be a real word boundary
+                space = _WHITESPACE.search(text, cut)
+                cut = space.end() if space else len(text)
+            self._tail = text[cut:]
+            self._offset += cut
+        return self.match
+
+    def finish(self) -> BackstopMatch | None:
+        """The stream ended: report a match that ran to the end of the last delta."""
+        if self.match is None and self._tail:
+            match = self.matcher.match(self._tail)
+            if match:
+                start, end = match.span
+                self.match = match._replace(span=(start + self._offset, end + self._offset))
+        return self.match
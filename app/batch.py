@@ -0,0 +1,214 @@
+"""
+batch.py — Bulk question answering for /chat/batch, plus a CLI client.
+
+A batch is JSONL, one question per line: {"id": "...", "message": "..."}
+("id" is optional and echoed back). Every question is treated as a first
+turn: no session is read or written.
+
+The whole batch is screened up front (backstop, FAQ table, response cache),
+the remaining questions are deduplicated on their normalized text, and one
+model call per distinct question is dispatched through a pool of
+BATCH_CONCURRENCY workers. All batches together may hold at most
+BATCH_LLM_SHARE of the app's MAX_CONCURRENT_LLM_CALLS model-call slots
+(a quarter by default), and a batch's concurrency is capped at that too.
+Interactive requests always have the rest of the slots. Batch calls queue
+for their slots rather than being shed.
+
+Each model call also takes a token from the client's batch rate-limit
+budget (RATE_LIMIT_BATCH_RATE, see app/ratelimit.py) as it starts, waiting
+for one when it's spent, so a large batch is paced rather than refused.
+
+Results stream back as JSONL, either in input order or as they complete,
+one line per input line:
+    {"index": 0, "id": "q1", "ok": true, "source": "model", "response": "..."}
+    {"index": 1, "id": "q2", "ok": false, "error": "..."}
+followed by a final {"summary": {...}} line with counts by source and the
+number of failures. A failed question never aborts the rest of the batch.
+
+CLI:
+    uv run python -m app.batch questions.jsonl -o answers.jsonl
+    uv run python -m app.batch questions.jsonl --unordered --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+from app.cache import normalize
+from app.metrics import REGISTRY
+
+# --- Config ---
+# Distinct model calls in flight per batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Share of MAX_CONCURRENT_LLM_CALLS that all batches together may hold
+BATCH_LLM_SHARE = float(os.getenv("BATCH_LLM_SHARE", "0.25"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50000"))
+
+ITEMS = REGISTRY.counter("brewbot_batch_items_total", "Batch questions by how they were answered.")
+
+# (response, source) for a question answered without the model, else None
+Screen = Callable[[str], tuple[str, str] | None]
+Generate = Callable[[str], Awaitable[str]]
+
+
+def parse_line(index: int, line: str) -> tuple[object, str | None, str | None]:
+    """Return (id, message, error) for one input line."""
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, None, f"invalid JSON: {e}"
+    if not isinstance(item, dict):
+        return None, None, "each line must be a JSON object"
+    message = item.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return item.get("id"), None, "missing 'message'"
+    return item.get("id", index), message, None
+
+
+async def run_batch(
+    lines: list[str],
+    screen: Screen,
+    generate: Generate,
+    concurrency: int = BATCH_CONCURRENCY,
+    ordered: bool = True,
+) -> AsyncIterator[dict]:
+    """Answer every (non-blank) line of a batch, yielding result dicts then a summary."""
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    results: list[asyncio.Future] = []
+    pending: dict[str, tuple[str, asyncio.Future]] = {}  # normalized message -> (message, future)
+    sources: Counter[str] = Counter()
+    duplicates = 0
+
+    def resolved(result: dict) -> asyncio.Future:
+        future = loop.create_future()
+        future.set_result(result)
+        return future
+
+    # Screen the whole batch before any model call
+    for index, line in enumerate(lines):
+        item_id, message, error = parse_line(index, line)
+        if error:
+            results.append(resolved({"index": index, "id": item_id, "ok": False, "error": error}))
+            continue
+        screened = screen(message)
+        if screened is not None:
+            response, source = screened
+            results.append(resolved({"index": index, "id": item_id, "ok": True, "source": source, "response": response}))
+            continue
+        key = normalize(message)
+        if key in pending:
+            duplicates += 1
+        else:
+            pending[key] = (message, loop.create_future())
+        results.append(_answer_for(index, item_id, pending[key][1]))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for message, future in pending.values():
+        queue.put_nowait((message, future))
+
+    async def worker():
+        while not queue.empty():
+            message, future = queue.get_nowait()
+            try:
+                response = await generate(message)
+            except Exception as e:
+                future.set_result({"ok": False, "error": getattr(e, "detail", None) or str(e) or type(e).__name__})
+            else:
+                future.set_result({"ok": True, "source": "model", "response": response})
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(pending))))]
+    failed = 0
+    try:
+        stream = results if ordered else asyncio.as_completed(results)
+        for next_result in stream:
+            result = await next_result
+            if result["ok"]:
+                sources[result["source"]] += 1
+                ITEMS.inc(source=result["source"])
+            else:
+                failed += 1
+                ITEMS.inc(source="failed")
+            yield result
+    finally:
+        # Only does anything if the client went away mid-batch
+        for task in (*workers, *results):
+            task.cancel()
+
+    yield {"summary": {
+        "total": len(lines),
+        "ok": len(lines) - failed,
+        "failed": failed,
+        "by_source": dict(sources),
+        "model_calls": len(pending),
+        "deduplicated": duplicates,
+        "seconds": round(time.perf_counter() - start, 3),
+    }}
+
+
+def _answer_for(index: int, item_id, answer: asyncio.Future) -> asyncio.Future:
+    """A future for one line's result, built from its (possibly shared) answer."""
+    async def result() -> dict:
+        return {"index": index, "id": item_id, **await asyncio.shield(answer)}
+    return asyncio.ensure_future(result())
+
+
+# --- CLI ---
+
+async def submit(args) -> int:
+    """Post a JSONL file to /chat/batch and write the results as they stream in."""
+    with open(args.input, encoding="utf-8") as f:
+        body = f.read().encode()
+    params = {"order": "completion" if args.unordered else "input"}
+    if args.concurrency:
+        params["concurrency"] = args.concurrency
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    summary = None
+    try:
+        async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+            async with client.stream(
+                "POST", "/chat/batch", params=params, content=body,
+                headers={"Content-Type": "application/x-ndjson"},
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    print(f"Batch rejected ({response.status_code}): {response.text}", file=sys.stderr)
+                    return 2
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if "summary" in record:
+                        summary = record["summary"]
+                    else:
+                        out.write(line + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if summary is None:
+        print("Batch ended without a summary; results are incomplete", file=sys.stderr)
+        return 2
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Answer a JSONL batch of questions with BrewBot")
+    parser.add_argument("input", help='JSONL file, one {"id", "message"} per line')
+    parser.add_argument("-o", "--output", help="write result lines here (default: stdout)")
+    parser.add_argument("--url", default=os.getenv("BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--concurrency", type=int, help=f"model calls in flight (server default: {BATCH_CONCURRENCY})")
+    parser.add_argument("--unordered", action="store_true", help="emit results as they complete, tagged by id")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(submit(parse_args())))
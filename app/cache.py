@@ -0,0 +1,179 @@
+"""
+cache.py — Response cache for repeated first-turn questions.
+
+Most traffic is the same dozen questions asked slightly differently, so a
+first-turn answer is cached under a normalized form of the question. Lookups
+try an exact normalized match. Fuzzy matching is off by default: with
+RESPONSE_CACHE_SIMILARITY > 0, a cached question also matches if it has the
+same content words up to plural and verb endings, in any order and with
+any filler words. Questions differing in a content word never match: in a
+long question one changed word ("light" vs "dark" roast, "hot" vs "iced")
+barely moves a similarity score, and it's usually the word that changes
+the answer.
+
+The cache lives in process memory, so it holds answers from one prompt and
+model chain only; a new prompt or model means a restart and an empty
+cache. Only first turns are cached, so there is no conversation context to
+key on. Cached text is the raw model output: callers still run
+check_output() on it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# --- Config ---
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+# Min word-set Jaccard similarity for a fuzzy hit; 0 (the default) disables
+# fuzzy matching. Fuzzy hits also need the same content words (see above).
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+# Words that carry no meaning for matching
+STOPWORDS = frozenset(
+    "a an the i my me we our you your is are am be do does did to for of in on at "
+    "what whats which how hows why should can could would will it its this that "
+    "with and or so please best good ideal".split()
+)
+# Questions that differ in any of these are never treated as similar
+NEGATIONS = frozenset("not no never without dont doesnt cant isnt shouldnt".split())
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation (keeping ratios like 1:15), collapse spaces."""
+    text = re.sub(r"['’]", "", text.lower())
+    text = re.sub(r"[^\w\s:.]|(?<!\d)[:.]|[:.](?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def content_words(normalized: str) -> frozenset[str]:
+    return frozenset(w for w in normalized.split() if w not in STOPWORDS)
+
+
+def stem(word: str) -> str:
+    """Crude suffix strip, so "grinds"/"grinding"/"grind" compare equal."""
+    for suffix in ("ing", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def fingerprint(*parts) -> str:
+    """Short stable hash of JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    response: str
+    words: frozenset[str]
+    expires_at: float
+
+
+class ResponseCache:
+    """LRU + TTL cache of model responses keyed by normalized question."""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # word -> keys of entries containing it, for fuzzy candidate lookup
+        self._index: dict[str, set[str]] = {}
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def get(self, question: str) -> str | None:
+        """Return a cached response for `question`, or None."""
+        key = normalize(question)
+        entry = self._live(key)
+        if entry is not None:
+            self.exact_hits += 1
+            self._entries.move_to_end(key)
+            return entry.response
+
+        if self.similarity > 0:
+            key = self._most_similar(content_words(key))
+            if key is not None:
+                self.fuzzy_hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key].response
+
+        self.misses += 1
+        return None
+
+    def put(self, question: str, response: str):
+        key = normalize(question)
+        self._remove(key)
+        words = content_words(key)
+        self._entries[key] = _Entry(response, words, time.monotonic() + self.ttl)
+        for word in words:
+            self._index.setdefault(word, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.fuzzy_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    # --- Internals ---
+
+    def _live(self, key: str) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for word in entry.words:
+            keys = self._index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[word]
+
+    def _most_similar(self, words: frozenset[str]) -> str | None:
+        if not words:
+            return None
+        stems = {stem(w) for w in words}
+        candidates = set().union(*(self._index.get(w, ()) for w in words))
+        best_key, best_score = None, self.similarity
+        for key in candidates:
+            if self._live(key) is None:
+                continue
+            other = self._entries[key].words
+            # A differing content word may be the one that changes the answer
+            if (words ^ other) & NEGATIONS or {stem(w) for w in other} != stems:
+                continue
+            score = len(words & other) / len(words | other)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
@@ -0,0 +1,219 @@
+"""
+faq.py — Local fast-path answers for high-confidence FAQ intents.
+
+A handful of questions (French press grind, cold brew ratio, brewing
+temperature by roast, ...) have stable answers that don't need a model
+call. app/faq.json holds a curated table of intents, each with an answer,
+a few paraphrased questions and "require" keyword groups. At load, every
+paraphrase becomes a TF-IDF vector over content words and adjacent word
+pairs; a first-turn question is scored by cosine similarity against them
+and answered from the table when the best intent scores at least
+FAQ_THRESHOLD and beats the runner-up intent by FAQ_MARGIN.
+
+Similarity alone can't tell "how do I clean my burr grinder" from "what's a
+good burr grinder", so a question must also mention one keyword from each
+of the intent's require groups and none of its "exclude" keywords (so "is
+a French press grind good for espresso?" doesn't get the French press
+answer). It must contain no word the table has never seen (so "what does
+Kenyan coffee taste like?" doesn't borrow the Ethiopian answer) and no
+negation. Anything else goes to the model as before. Tune the thresholds
+with bench/faq_bench.py.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+from app.cache import NEGATIONS, STOPWORDS, normalize
+
+# --- Config ---
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "true").lower() in ("1", "true", "yes")
+FAQ_PATH = Path(os.getenv("FAQ_PATH", Path(__file__).parent / "faq.json"))
+# Min cosine similarity to the closest paraphrase for a local answer
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.4"))
+# Min lead of the best intent over the next-best one
+FAQ_MARGIN = float(os.getenv("FAQ_MARGIN", "0.1"))
+
+SCHEMA_VERSION = 1
+
+
+class FAQError(ValueError):
+    """The FAQ file is malformed."""
+
+
+class FAQMatch(NamedTuple):
+    intent: str
+    score: float
+    answer: str
+
+
+# Filler that says nothing about which answer fits
+FILLER = frozenset("need they them their there just really also some tell know want".split())
+
+
+def terms(text: str) -> list[str]:
+    """Content words (plural 's' stripped) plus adjacent pairs of them."""
+    words = []
+    for w in normalize(text).split():
+        if w in STOPWORDS or w in FILLER:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        words.append(w)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def compile_requirements(groups: list[list[str]]) -> list[re.Pattern]:
+    """One regex per group, matching any of its keywords (or their plurals) as whole words."""
+    return [
+        re.compile(r"\b(?:" + "|".join(re.escape(normalize(k)) for k in group) + r")s?\b")
+        for group in groups
+    ]
+
+
+def satisfies(normalized: str, requirements: list[re.Pattern], exclusion: re.Pattern | None = None) -> bool:
+    return all(r.search(normalized) for r in requirements) and not (exclusion and exclusion.search(normalized))
+
+
+class FAQIndex:
+    """TF-IDF index over the paraphrases of a curated FAQ table."""
+
+    def __init__(self, config: dict, threshold: float = FAQ_THRESHOLD, margin: float = FAQ_MARGIN):
+        self.version = str(config["version"])
+        self.threshold = threshold
+        self.margin = margin
+        self.answers = {intent["id"]: intent["answer"] for intent in config["intents"]}
+        self.requirements = {intent["id"]: compile_requirements(intent["require"]) for intent in config["intents"]}
+        self.exclusions = {
+            intent["id"]: compile_requirements([intent["exclude"]])[0]
+            for intent in config["intents"] if intent.get("exclude")
+        }
+
+        docs = [(intent["id"], Counter(terms(q))) for intent in config["intents"] for q in intent["questions"]]
+        df = Counter(term for _, counts in docs for term in counts)
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        # Weight for terms the index has never seen, as if they appeared nowhere
+        self.unknown_idf = math.log(1 + n) + 1
+        self.vocabulary = frozenset(t for t in self.idf if " " not in t)
+
+        self.doc_intents = [intent for intent, _ in docs]
+        # term -> [(doc index, normalized weight)]
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        for i, (_, counts) in enumerate(docs):
+            weights = {term: tf * self.idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            for term, w in weights.items():
+                self.postings.setdefault(term, []).append((i, w / norm))
+
+        self.hits: Counter[str] = Counter()
+        self.misses = 0
+
+    def scores(self, question: str) -> dict[str, float]:
+        """Best cosine similarity per intent (intents with no overlap omitted)."""
+        counts = Counter(terms(question))
+        if not counts:
+            return {}
+        weights = {term: tf * self.idf.get(term, self.unknown_idf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        dots: dict[int, float] = {}
+        for term, w in weights.items():
+            for doc, doc_w in self.postings.get(term, ()):
+                dots[doc] = dots.get(doc, 0.0) + w * doc_w
+        best: dict[str, float] = {}
+        for doc, dot in dots.items():
+            intent = self.doc_intents[doc]
+            best[intent] = max(best.get(intent, 0.0), dot / norm)
+        return best
+
+    def classify(self, question: str) -> tuple[str | None, float, float]:
+        """Return (best intent, its score, runner-up intent's score)."""
+        ranked = sorted(self.scores(question).items(), key=lambda kv: kv[1], reverse=True)
+        if not ranked:
+            return None, 0.0, 0.0
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][0], ranked[0][1], runner_up
+
+    def unknown_words(self, question: str) -> set[str]:
+        return {t for t in terms(question) if " " not in t and t not in self.vocabulary}
+
+    def match(self, question: str) -> FAQMatch | None:
+        """Return the curated answer if `question` confidently matches an intent."""
+        if NEGATIONS.intersection(normalize(question).split()) or self.unknown_words(question):
+            self.misses += 1
+            return None
+        intent, score, runner_up = self.classify(question)
+        if (
+            intent is None
+            or score < self.threshold
+            or score - runner_up < self.margin
+            or not satisfies(normalize(question), self.requirements[intent], self.exclusions.get(intent))
+        ):
+            self.misses += 1
+            return None
+        self.hits[intent] += 1
+        return FAQMatch(intent, score, self.answers[intent])
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "version": self.version,
+            "hits": hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "intents": dict(self.hits),
+        }
+
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise FAQError(message)
+
+
+def validate(config: dict):
+    """Raise FAQError unless `config` is a well-formed FAQ document."""
+    _require(isinstance(config, dict), "FAQ file must be a JSON object")
+    _require(config.get("schema") == SCHEMA_VERSION, f"unsupported schema (expected {SCHEMA_VERSION})")
+    _require("version" in config, "missing 'version'")
+    intents = config.get("intents")
+    _require(isinstance(intents, list) and intents, "'intents' must be a non-empty list")
+    seen = set()
+    for intent in intents:
+        intent_id = intent.get("id")
+        _require(isinstance(intent_id, str) and intent_id, "every intent needs an 'id'")
+        _require(intent_id not in seen, f"intents[{intent_id}]: duplicate id")
+        seen.add(intent_id)
+        _require(isinstance(intent.get("answer"), str) and intent["answer"], f"intents[{intent_id}]: missing answer")
+        groups = intent.get("require")
+        _require(isinstance(groups, list) and groups
+                 and all(isinstance(g, list) and g and all(isinstance(k, str) and k for k in g) for g in groups),
+                 f"intents[{intent_id}]: 'require' must be a non-empty list of non-empty keyword lists")
+        exclude = intent.get("exclude", [])
+        _require(isinstance(exclude, list) and all(isinstance(k, str) and k for k in exclude),
+                 f"intents[{intent_id}]: 'exclude' must be a list of non-empty keywords")
+        questions = intent.get("questions")
+        _require(isinstance(questions, list) and questions and all(terms(q) for q in questions),
+                 f"intents[{intent_id}]: 'questions' must be a non-empty list of non-trivial questions")
+        requirements = compile_requirements(groups)
+        exclusion = compile_requirements([exclude])[0] if exclude else None
+        for q in questions:
+            _require(satisfies(normalize(q), requirements),
+                     f"intents[{intent_id}]: question {q!r} doesn't mention a keyword from every 'require' group")
+            _require(not (exclusion and exclusion.search(normalize(q))),
+                     f"intents[{intent_id}]: question {q!r} mentions an 'exclude' keyword")
+
+
+def load_faq(path: Path = FAQ_PATH, **kwargs) -> FAQIndex:
+    """Read, validate and index an FAQ file."""
+    path = Path(path)
+    try:
+        config = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        raise FAQError(f"{path}: {e}") from e
+    validate(config)
+    return FAQIndex(config, **kwargs)
@@ -0,0 +1,122 @@
+"""
+history.py — Token-budgeted conversation windowing.
+
+Keeps the prompt sent to the model under HISTORY_TOKEN_BUDGET tokens. The
+system prompt and the newest turns are always kept; once the conversation
+outgrows the budget, the oldest turns are folded into a rolling summary
+message that sits at the start of the stored history.
+
+Token counts are estimated (≈4 characters per token) and cached per message
+text, so a long conversation isn't re-counted on every request.
+"""
+
+import os
+import re
+from collections.abc import Callable
+from functools import lru_cache
+
+# --- Config ---
+# Prompt budget: system prompt + history + the new user message
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+# Cap on the rolling summary of compacted turns
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+CHARS_PER_TOKEN = 4
+# Per-message framing (role markers etc.) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=65536)
+def count_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def is_summary(message: dict) -> bool:
+    return message["role"] == "system" and message["content"].startswith(SUMMARY_PREFIX)
+
+
+def _first_sentence(text: str, max_words: int = 25) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:max_words]) + ("…" if len(words) > max_words else "")
+
+
+def extractive_summary(previous: str, turns: list[dict], budget: int) -> str:
+    """
+    Fold `turns` into the previous summary, one line per turn, keeping the
+    newest lines that fit in `budget` tokens. Cheap and deterministic, so
+    compaction never costs an extra model call.
+    """
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        who = "User asked" if turn["role"] == "user" else "BrewBot answered"
+        lines.append(f"- {who}: {_first_sentence(turn['content'])}")
+
+    kept: list[str] = []
+    used = 0
+    for line in reversed(lines):
+        used += count_tokens(line)
+        if used > budget:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+class HistoryManager:
+    """
+    Fits stored history into the prompt budget.
+
+    `summarize(previous_summary, dropped_turns, budget) -> str` may be swapped
+    for an LLM-backed summarizer; the default is extractive_summary.
+    """
+
+    def __init__(
+        self,
+        system_message: dict,
+        budget: int = HISTORY_TOKEN_BUDGET,
+        summary_budget: int = SUMMARY_TOKEN_BUDGET,
+        summarize: Callable[[str, list[dict], int], str] = extractive_summary,
+    ):
+        self.system_tokens = message_tokens(system_message)
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summarize = summarize
+
+    def fit(self, history: list[dict], user_message: dict) -> tuple[list[dict], bool]:
+        """
+        Return (history, compacted). `history` fits the budget alongside the
+        system prompt and `user_message`; when `compacted` is True it differs
+        from the input and should replace the stored session.
+        """
+        available = self.budget - self.system_tokens - message_tokens(user_message)
+        if sum(map(message_tokens, history)) <= available:
+            return history, False
+
+        previous = ""
+        turns = history
+        if turns and is_summary(turns[0]):
+            previous = turns[0]["content"][len(SUMMARY_PREFIX):]
+            turns = turns[1:]
+
+        # Keep the newest turns that fit next to a full-size summary. Turns
+        # are dropped from the front in user/assistant pairs.
+        room = available - self.summary_budget - MESSAGE_OVERHEAD_TOKENS
+        used = 0
+        start = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            used += message_tokens(turns[i])
+            if used > room:
+                break
+            start = i
+        if start < len(turns) and turns[start]["role"] == "assistant":
+            start += 1
+
+        summary = self.summarize(previous, turns[:start], self.summary_budget)
+        summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+        return [summary_message, *turns[start:]], True
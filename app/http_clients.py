@@ -0,0 +1,156 @@
+"""
+http_clients.py — Shared, long-lived HTTP client for model calls.
+
+One httpx.AsyncClient per process, opened in the app's lifespan and closed
+on shutdown. Calls reuse its pooled keep-alive connections instead of each
+paying for a TCP and TLS handshake. The pool keeps up to HTTP_MAX_KEEPALIVE
+idle connections for HTTP_KEEPALIVE_EXPIRY seconds (httpx's defaults, 20
+for 5 s, drop them between bursts). With HTTP2=auto, HTTP/2 is used when the
+`h2` package is installed, so concurrent calls to one host share a
+connection.
+
+LiteLLM is pointed at the pool in two ways. Its OpenAI-compatible
+providers use litellm.aclient_session. Providers it drives with its own
+HTTP handler (Gemini, Vertex AI) take a `client` argument per call. See
+HttpPool.completion_kwargs().
+
+Every request is traced, so stats() reports how many opened a new
+connection and the time spent in TCP and TLS handshakes.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+import httpx
+
+# --- Config ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+# Idle connections kept open for reuse, and for how long (s)
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "64"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# auto (HTTP/2 if `h2` is installed), true or false
+HTTP2 = os.getenv("HTTP2", "auto")
+
+# LiteLLM providers that use its own HTTP handler, passed as `client`
+HANDLER_PROVIDERS = {"gemini", "vertex_ai", "vertex_ai_beta"}
+
+
+def http2_enabled(setting: str = HTTP2) -> bool:
+    if setting == "auto":
+        return importlib.util.find_spec("h2") is not None
+    if setting in ("1", "true", "yes"):
+        return True
+    if setting in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Unknown HTTP2: {setting!r} (expected auto, true or false)")
+
+
+class _TracedTransport(httpx.AsyncHTTPTransport):
+    """Counts requests, new connections and handshake time into `pool`."""
+
+    def __init__(self, pool: "HttpPool", **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self.pool
+        https = request.url.scheme == "https"
+        connected = "connection.start_tls.complete" if https else "connection.connect_tcp.complete"
+        connect_start = 0.0
+
+        # httpcore reports each step of a request; only a new connection connects
+        async def trace(event: str, info: dict):
+            nonlocal connect_start
+            if event == "connection.connect_tcp.started":
+                connect_start = time.perf_counter()
+                pool.counts["connections"] += 1
+            elif event == connected:
+                pool.handshake_seconds += time.perf_counter() - connect_start
+
+        pool.counts["requests"] += 1
+        request.extensions = {**request.extensions, "trace": trace}
+        return await super().handle_async_request(request)
+
+
+class HttpPool:
+    """The shared client: open() it at startup and aclose() it at shutdown."""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: str = HTTP2,
+        verify=True,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2_enabled(http2)
+        self.verify = verify
+        self.client: httpx.AsyncClient | None = None
+        self.counts = {"requests": 0, "connections": 0}
+        self.handshake_seconds = 0.0
+        self._handler = None  # LiteLLM's AsyncHTTPHandler, over self.client
+        self._discarded: asyncio.Task | None = None  # closing the handler's own client
+
+    def open(self) -> httpx.AsyncClient:
+        if self.client is None:
+            transport = _TracedTransport(self, http2=self.http2, limits=self.limits, verify=self.verify)
+            self.client = httpx.AsyncClient(
+                transport=transport, timeout=httpx.Timeout(60, connect=HTTP_CONNECT_TIMEOUT)
+            )
+        return self.client
+
+    async def aclose(self):
+        client, self.client, self._handler = self.client, None, None
+        if self._discarded is not None:
+            await self._discarded
+            self._discarded = None
+        if client is not None:
+            litellm = sys.modules.get("litellm")
+            if litellm is not None and litellm.aclient_session is client:
+                litellm.aclient_session = None
+            await client.aclose()
+
+    def completion_kwargs(self, model: str) -> dict:
+        """
+        Arguments that make a litellm.acompletion() call to `model` use the
+        pool. Call once litellm is imported. Also makes the pool LiteLLM's
+        aclient_session, which covers the OpenAI-compatible providers.
+        """
+        if self.client is None:
+            return {}
+        import litellm
+        litellm.aclient_session = self.client
+        if model.split("/", 1)[0] not in HANDLER_PROVIDERS:
+            return {}
+        if self._handler is None:
+            from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+            # It builds a client of its own, which has never sent anything:
+            # swap in ours and close that one. We're always called on the loop.
+            self._handler = AsyncHTTPHandler()
+            default, self._handler.client = self._handler.client, self.client
+            self._discarded = asyncio.ensure_future(default.aclose())
+        return {"client": self._handler}
+
+    def stats(self) -> dict:
+        requests, connections = self.counts["requests"], self.counts["connections"]
+        reused = requests - connections
+        handshake = self.handshake_seconds / connections if connections else 0.0
+        return {
+            "open": self.client is not None,
+            "http2": self.http2,
+            "requests": requests,
+            "connections": connections,
+            "reuse_rate": reused / requests if requests else 0.0,
+            "handshake_ms_mean": handshake * 1000,
+            # What the reused requests would have spent connecting
+            "handshake_seconds_saved": reused * handshake,
+        }
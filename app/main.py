@@ -2,46 +2,317 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+import json
 import uuid
+from collections.abc import AsyncIterator
+from contextlib import aclosing, asynccontextmanager
+from typing import Literal
 
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from litellm import completion
 from pydantic import BaseModel
 
-from app.backstop import check_input, check_output
-from app.prompt import SYSTEM_PROMPT
+from app.backstop import BackstopMatch, StreamCheck, check_input, check_output, match_input, rule_stats
+from app.batch import BATCH_CONCURRENCY, BATCH_LLM_SHARE, BATCH_MAX_ITEMS, run_batch
+from app.cache import ResponseCache
+from app.faq import FAQ_ENABLED, load_faq
+from app.history import HistoryManager
+from app.http_clients import HttpPool
+from app.metrics import LLM_STREAMS_STOPPED, REGISTRY, RequestTrace, model_health, record_usage
+from app.prompt import SYSTEM_PROMPT, trimmed_prompt
+from app.prompt_cache import PROMPT_CACHE_ENABLED, PrefixCache, prompt_savings
+from app.ratelimit import RATE_LIMIT_ENABLED, SHED, client_ip, create_rate_limiter
+from app.router import FALLBACK_MODELS, ModelRouter, RouterError
+from app.sessions import create_session_store
+from app.transcripts import TRANSCRIPT_ENABLED, TranscriptLog
 
 # --- Config ---
-MODEL = "vertex_ai/gemini-2.0-flash-lite"
+MODEL = os.getenv("MODEL", "vertex_ai/gemini-2.0-flash-lite")
+# Max model calls in flight per worker; further calls queue for a free slot
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "64"))
+# Seconds a call may wait in that queue before the request fails with a 503
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Max calls waiting in that queue; beyond it requests fail with a 503 at once
+LLM_MAX_QUEUED = int(os.getenv("LLM_MAX_QUEUED", os.getenv("MAX_CONCURRENT_LLM_CALLS", "64")))
 
 # --- Session Management ---
-# Each session stores a list of messages in OpenAI format:
+# Each session stores its user/assistant turns in OpenAI format:
 # [
-#     {"role": "system", "content": "..."},
 #     {"role": "user", "content": "Hello!"},
 #     {"role": "assistant", "content": "Hi there!"},
 #     ...
 # ]
-sessions: dict[str, list[dict]] = {}
+# The system prompt is shared and prepended when building each model request
+# (see build_messages). The backend (memory, sqlite or redis) is chosen by
+# SESSION_BACKEND.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+sessions = create_session_store()
+# Keeps each prompt within HISTORY_TOKEN_BUDGET by summarizing old turns
+history_manager = HistoryManager(SYSTEM_MESSAGE)
+
+
+async def load_history(session_id: str | None, user_message: dict) -> tuple[list[dict], bool]:
+    """
+    Return (history, compacted): the session's turns, windowed to fit the
+    prompt budget next to `user_message`. A new session has none.
+    """
+    history = await sessions.aget(session_id) if session_id else []
+    return history_manager.fit(history, user_message)
+
+
+# --- Response Cache ---
+# First-turn answers are reused for repeated questions. The cache is in
+# memory, so a changed prompt or model chain starts from an empty one.
+response_cache = ResponseCache()
+
+
+# --- FAQ Fast Path ---
+# First-turn questions that confidently match a curated FAQ intent are
+# answered from app/faq.json without a model call.
+faq = load_faq() if FAQ_ENABLED else None
+
+
+def faq_answer(question: str, history: list[dict]) -> str | None:
+    """Return a curated answer for a first-turn FAQ question, if one fits."""
+    if faq is None or history:
+        return None
+    match = faq.match(question)
+    return match.answer if match else None
+
+
+async def save_exchange(session_id: str, history: list[dict], compacted: bool, *messages: dict):
+    """Store a completed exchange, rewriting the session if it was compacted."""
+    if compacted:
+        await sessions.areplace(session_id, [*history, *messages])
+    else:
+        await sessions.aappend(session_id, *messages)
+
+
+# --- Admission Control ---
+# Per-session, per-IP and optional global token buckets (app/ratelimit.py),
+# checked before any work is done for a request.
+rate_limiter = create_rate_limiter() if RATE_LIMIT_ENABLED else None
+
+
+def request_ip(request: Request) -> str | None:
+    return client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+
+
+def admit(request: Request, session_id: str | None = None):
+    """Take a rate-limit token for this request, or refuse it with 429/503 + Retry-After."""
+    if rate_limiter is None:
+        return
+    refusal = rate_limiter.check(session_id, request_ip(request))
+    if refusal is not None:
+        raise HTTPException(
+            status_code=refusal.status_code,
+            detail="Too many requests, please slow down." if refusal.status_code == 429
+            else "BrewBot is busy, please try again shortly.",
+            headers=refusal.headers,
+        )
+
+
+# --- LLM Concurrency ---
+# Outbound model calls are awaited on the event loop, so a slow call no longer
+# pins a threadpool thread. The semaphore caps how many run at once per worker;
+# callers beyond the cap wait in FIFO order for a free slot. At most
+# LLM_MAX_QUEUED may wait: past that, waiting would only build a backlog no
+# call could clear within its deadline, so requests are shed immediately.
+llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+llm_queued = 0
+# Batch calls take one of these before a global slot, so batches together
+# never hold more than BATCH_LLM_SHARE of the slots or their queue
+BATCH_LLM_SLOTS = max(1, int(MAX_CONCURRENT_LLM_CALLS * BATCH_LLM_SHARE))
+batch_slots = asyncio.Semaphore(BATCH_LLM_SLOTS)
+
+
+async def pace_batch_call(ip: str | None):
+    """Wait until the client's batch budget and the global bucket have a token for one more model call."""
+    if rate_limiter is None:
+        return
+    while (refusal := rate_limiter.check_batch_call(ip)) is not None:
+        await asyncio.sleep(refusal.retry_after)
+
+
+def busy(reason: str) -> HTTPException:
+    SHED.inc(reason=reason)
+    return HTTPException(
+        status_code=503,
+        detail="BrewBot is busy, please try again shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+
+@asynccontextmanager
+async def llm_slot(shed: bool = True):
+    """
+    Hold one model-call slot, queueing for up to LLM_QUEUE_TIMEOUT seconds.
+    With `shed`, fail at once if LLM_MAX_QUEUED calls are already waiting.
+    """
+    global llm_queued
+    if llm_slots.locked() and shed and llm_queued >= LLM_MAX_QUEUED:
+        raise busy("queue_full")
+    llm_queued += 1
+    try:
+        await asyncio.wait_for(llm_slots.acquire(), LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise busy("queue_timeout")
+    finally:
+        llm_queued -= 1
+    try:
+        yield
+    finally:
+        llm_slots.release()
+
+
+# --- Prompt ---
+# Requests carry the trimmed system prompt: persona and guardrails plus the
+# few-shot examples most relevant to the question. With PROMPT_CACHE_ENABLED,
+# the router swaps it for a provider-side cache of the full SYSTEM_PROMPT on
+# models that have one (app/prompt_cache.py).
+prefix_cache = PrefixCache(SYSTEM_PROMPT) if PROMPT_CACHE_ENABLED else None
+
+
+def build_messages(history: list[dict], user_message: dict) -> list[dict]:
+    """The model request for `user_message` after `history`."""
+    system = {"role": "system", "content": trimmed_prompt(user_message["content"])}
+    return [system, *history, user_message]
+
+
+def record_prompt(messages: list[dict], usage, trace: RequestTrace | None):
+    """Count the prompt tokens this call saved against sending the full SYSTEM_PROMPT."""
+    mode, saved = prompt_savings(SYSTEM_PROMPT, messages[0]["content"], usage)
+    if trace is not None:
+        trace.set("brewbot.prompt_mode", mode)
+        trace.set("brewbot.prompt_tokens_saved", saved)
 
 
 # --- LLM Call ---
-def generate_response(messages: list[dict]) -> str:
-    """Generate a response using LiteLLM with Gemini on Vertex AI."""
-    response = completion(
-        model=MODEL,
-        messages=messages,
-        temperature=0.4,
-        max_tokens=512,
+# Calls go through the router: MODEL first, then FALLBACK_MODELS, with
+# per-attempt deadlines, retries, optional hedging and circuit breakers.
+# Every call's outcome feeds model_health (readiness on /health) and the
+# brewbot_llm_calls_total counter; token usage comes from the response.
+# Calls share one pool of keep-alive connections, opened in the lifespan.
+http_pool = HttpPool()
+router = ModelRouter([MODEL, *FALLBACK_MODELS], rewriter=prefix_cache, http=http_pool)
+
+
+def unavailable() -> HTTPException:
+    """Every model failed or timed out; ask the client to back off."""
+    return HTTPException(
+        status_code=503,
+        detail="BrewBot can't reach its model right now, please try again shortly.",
+        headers={"Retry-After": "5"},
     )
+
+
+async def generate_response(messages: list[dict], trace: RequestTrace | None = None, shed: bool = True) -> str:
+    """Generate a response using LiteLLM with Gemini on Vertex AI."""
+    async with llm_slot(shed):
+        try:
+            response = await router.complete(messages, temperature=0.4, max_tokens=512)
+        except Exception as e:
+            model_health.record(ok=False)
+            if isinstance(e, RouterError):
+                raise unavailable() from e
+            raise
+    model_health.record(ok=True)
+    usage = getattr(response, "usage", None)
+    record_usage(usage)
+    record_prompt(messages, usage, trace)
+    if trace is not None:
+        trace.usage(getattr(response, "model", None), usage)
     return response.choices[0].message.content
 
 
+async def stream_response(messages: list[dict], trace: RequestTrace | None = None) -> AsyncIterator[str]:
+    """
+    Stream a response from LiteLLM, yielding text deltas as they arrive.
+    Closing the generator early (aclose) closes the upstream stream too.
+    """
+    chunks = router.stream(messages, temperature=0.4, max_tokens=512, stream_options={"include_usage": True})
+    async with llm_slot(), aclosing(chunks):
+        try:
+            async for chunk in chunks:
+                # The final chunk carries the usage for the whole stream
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    record_usage(usage)
+                    record_prompt(messages, usage, trace)
+                    if trace is not None:
+                        trace.usage(getattr(chunk, "model", None), usage)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except Exception as e:
+            model_health.record(ok=False)
+            if isinstance(e, RouterError):
+                raise unavailable() from e
+            raise
+    model_health.record(ok=True)
+
+
+# --- Transcripts ---
+# Every completed /chat and /chat/stream turn is queued for the append-only
+# log in app/transcripts.py. The writer runs for the app's lifetime.
+transcripts = TranscriptLog() if TRANSCRIPT_ENABLED else None
+
+
+def log_turn(
+    trace: RequestTrace,
+    session_id: str,
+    question: str,
+    answer: str,
+    source: str,
+    backstop: BackstopMatch | None = None,
+    replaced: bool = False,
+):
+    """Queue a finished turn for the transcript log; never blocks the request."""
+    if transcripts is None:
+        return
+    attributes = trace.attributes
+    transcripts.log_turn(
+        session_id=session_id,
+        endpoint=trace.endpoint,
+        question=question,
+        answer=answer,
+        source=source,
+        input_verdict=f"{backstop.category}:{backstop.rule}" if backstop else "pass",
+        replaced=replaced,
+        model=attributes.get("gen_ai.response.model"),
+        latency=trace.elapsed(),
+        prompt_tokens=attributes.get("gen_ai.usage.input_tokens"),
+        completion_tokens=attributes.get("gen_ai.usage.output_tokens"),
+        prompt_tokens_saved=attributes.get("brewbot.prompt_tokens_saved"),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if transcripts is not None:
+        transcripts.start()
+    if prefix_cache is not None:
+        prefix_cache.prime(router.models)
+    http_pool.open()
+    # LiteLLM loads in the background; requests that need it wait for it
+    warmup = router.warm_up()
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        await http_pool.aclose()
+        if prefix_cache is not None:
+            await prefix_cache.close()
+        if transcripts is not None:
+            await transcripts.stop()
+
+
 # --- FastAPI App ---
-app = FastAPI(title="BrewBot", description="Specialty coffee Q&A chatbot")
+app = FastAPI(title="BrewBot", description="Specialty coffee Q&A chatbot", lifespan=lifespan)
 
 
 class ChatRequest(BaseModel):
@@ -60,48 +331,326 @@ def index():
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
-    session_id = request.session_id or str(uuid.uuid4())
+async def chat(request: ChatRequest, response: Response, http_request: Request):
+    admit(http_request, request.session_id)
+    trace = RequestTrace("/chat")
+    try:
+        return await handle_chat(request, trace)
+    finally:
+        # Per-stage durations, visible in the browser's network panel
+        response.headers["Server-Timing"] = trace.finish()
+        # Tokens the model call used, if there was one (the eval tracks cost with it)
+        tokens = [trace.attributes.get(f"gen_ai.usage.{key}_tokens") for key in ("input", "output")]
+        if any(tokens):
+            response.headers["X-Token-Usage"] = f"prompt={tokens[0] or 0}, completion={tokens[1] or 0}"
 
-    # Initialize session with system prompt
-    if session_id not in sessions:
-        sessions[session_id] = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+async def handle_chat(request: ChatRequest, trace: RequestTrace) -> ChatResponse:
+    session_id = request.session_id or str(uuid.uuid4())
+    user_message = {"role": "user", "content": request.message}
 
     # --- Backstop: check input BEFORE LLM ---
-    backstop_response = check_input(request.message)
-    if backstop_response:
+    with trace.stage("check_input"):
+        backstop = match_input(request.message)
+    if backstop:
+        trace.set("brewbot.backstop", True)
         # Still log to history for continuity
-        sessions[session_id].append({"role": "user", "content": request.message})
-        sessions[session_id].append({"role": "assistant", "content": backstop_response})
-        return ChatResponse(response=backstop_response, session_id=session_id)
+        with trace.stage("save"):
+            await sessions.aappend(session_id, user_message, {"role": "assistant", "content": backstop.response})
+        log_turn(trace, session_id, request.message, backstop.response, "backstop", backstop)
+        return ChatResponse(response=backstop.response, session_id=session_id)
 
-    # Add user message
-    sessions[session_id].append({"role": "user", "content": request.message})
+    # Generate LLM response. The user message is only committed to the
+    # session alongside the reply, so a failed or shed call leaves no
+    # dangling user turn behind.
+    with trace.stage("load_history"):
+        history, compacted = await load_history(request.session_id, user_message)
 
-    # Generate LLM response
-    response_text = generate_response(sessions[session_id])
+    # Curated FAQ answers and cached answers both skip the model. Only first
+    # turns use either: later answers depend on the conversation.
+    with trace.stage("faq"):
+        local = faq_answer(request.message, history)
+    trace.set("brewbot.faq_hit", local is not None)
+    cached = response_cache.get(request.message) if not history and local is None else None
+    trace.set("brewbot.cache_hit", cached is not None)
+    if local is not None:
+        response_text, source = local, "faq"
+    elif cached is not None:
+        response_text, source = cached, "cache"
+    else:
+        with trace.stage("generate"):
+            response_text = await generate_response(build_messages(history, user_message), trace)
+        source = "model"
+        if not history:
+            response_cache.put(request.message, response_text)
 
     # --- Backstop: check output AFTER LLM ---
-    corrected = check_output(response_text, request.message)
+    with trace.stage("check_output"):
+        corrected = check_output(response_text, request.message)
     if corrected:
         response_text = corrected
 
-    # Add assistant response to history
-    sessions[session_id].append({"role": "assistant", "content": response_text})
+    # Add the exchange to history
+    with trace.stage("save"):
+        await save_exchange(session_id, history, compacted, user_message, {"role": "assistant", "content": response_text})
+    log_turn(trace, session_id, request.message, response_text, source, replaced=bool(corrected))
 
     return ChatResponse(response=response_text, session_id=session_id)
 
 
+def sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Stream the assistant's reply as Server-Sent Events.
+
+    Events, in order:
+      - ``session``: ``{"session_id"}``, sent first so the client can keep it
+      - ``delta``:   ``{"text"}``, one per generated chunk
+      - ``replace``: ``{"response"}``, sent if check_output() rejects the
+        streamed answer, or an output rule stops it part-way; the client
+        must discard what it rendered and show this text instead
+      - ``done``:    ``{"session_id", "response"}`` with the final text
+      - ``error``:   ``{"detail"}`` if generation fails mid-stream
+
+    A rate-limited request gets a plain 429/503 response instead.
+    """
+    admit(http_request, request.session_id)
+    session_id = request.session_id or str(uuid.uuid4())
+    user_message = {"role": "user", "content": request.message}
+
+    async def events() -> AsyncIterator[str]:
+        trace = RequestTrace("/chat/stream")
+        try:
+            async for event in stream_events(trace):
+                yield event
+        finally:
+            trace.finish()
+
+    async def stream_events(trace: RequestTrace) -> AsyncIterator[str]:
+        yield sse_event("session", {"session_id": session_id})
+
+        # --- Backstop: check input BEFORE LLM ---
+        with trace.stage("check_input"):
+            backstop = match_input(request.message)
+        if backstop:
+            trace.set("brewbot.backstop", True)
+            await sessions.aappend(session_id, user_message, {"role": "assistant", "content": backstop.response})
+            log_turn(trace, session_id, request.message, backstop.response, "backstop", backstop)
+            yield sse_event("delta", {"text": backstop.response})
+            yield sse_event("done", {"session_id": session_id, "response": backstop.response})
+            return
+
+        # Send the history *before* this turn plus the new message, and only
+        # commit the user message once the full exchange has completed, so an
+        # aborted stream doesn't leave a dangling user turn in the session.
+        with trace.stage("load_history"):
+            history, compacted = await load_history(request.session_id, user_message)
+        messages = build_messages(history, user_message)
+        with trace.stage("faq"):
+            local = faq_answer(request.message, history)
+        trace.set("brewbot.faq_hit", local is not None)
+        cached = response_cache.get(request.message) if not history and local is None else None
+        trace.set("brewbot.cache_hit", cached is not None)
+        stopped = None
+        if local is not None or cached is not None:
+            response_text, source = (local, "faq") if local is not None else (cached, "cache")
+            yield sse_event("delta", {"text": response_text})
+        else:
+            parts: list[str] = []
+            # Output rules run on each delta before it is sent. On a hit the
+            # generation is abandoned: closing the stream cancels the model
+            # call, and the rule's response replaces the partial answer.
+            check = StreamCheck()
+            try:
+                # The stage includes time the client spends reading deltas
+                with trace.stage("generate"):
+                    async with aclosing(stream_response(messages, trace)) as deltas:
+                        async for delta in deltas:
+                            if check.feed(delta):
+                                break
+                            parts.append(delta)
+                            yield sse_event("delta", {"text": delta})
+            except HTTPException as e:
+                yield sse_event("error", {"detail": e.detail})
+                return
+            except Exception as e:
+                yield sse_event("error", {"detail": str(e)})
+                return
+
+            response_text = "".join(parts)
+            source = "model"
+            stopped = check.match
+            if stopped:
+                LLM_STREAMS_STOPPED.inc(category=stopped.category)
+                trace.set("brewbot.output_rule", stopped.rule)
+            elif not history:
+                response_cache.put(request.message, response_text)
+
+        # --- Backstop: check output AFTER LLM ---
+        with trace.stage("check_output"):
+            corrected = stopped.response if stopped else check_output(response_text, request.message)
+        if corrected:
+            response_text = corrected
+            yield sse_event("replace", {"response": response_text})
+
+        with trace.stage("save"):
+            await save_exchange(session_id, history, compacted, user_message, {"role": "assistant", "content": response_text})
+        log_turn(trace, session_id, request.message, response_text, source, replaced=bool(corrected))
+        yield sse_event("done", {"session_id": session_id, "response": response_text})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- Batch ---
+# Batch questions are independent first turns: no session is read or saved.
+
+def screen_question(message: str) -> tuple[str, str] | None:
+    """Answer a batch question without the model if possible: (response, source)."""
+    backstop_response = check_input(message)
+    if backstop_response:
+        return backstop_response, "backstop"
+    local = faq_answer(message, [])
+    if local is not None:
+        return check_output(local, message) or local, "faq"
+    cached = response_cache.get(message)
+    if cached is not None:
+        return check_output(cached, message) or cached, "cache"
+    return None
+
+
+async def answer_question(message: str) -> str:
+    """Answer a batch question with the model. Batch calls are bounded by batch_slots, so they queue rather than shed."""
+    async with batch_slots:
+        response_text = await generate_response(build_messages([], {"role": "user", "content": message}), shed=False)
+    response_cache.put(message, response_text)
+    return check_output(response_text, message) or response_text
+
+
+@app.post("/chat/batch")
+async def chat_batch(
+    request: Request,
+    order: Literal["input", "completion"] = "input",
+    concurrency: int = BATCH_CONCURRENCY,
+):
+    """
+    Answer a JSONL batch of ``{"id"?, "message"}`` lines, streaming JSONL
+    results (in input order, or as they complete with ``order=completion``)
+    and a final summary line. See app/batch.py.
+    """
+    admit(request)
+    try:
+        lines = [line for line in (await request.body()).decode().splitlines() if line.strip()]
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch must be UTF-8 JSONL")
+    if len(lines) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(lines)} items; the limit is {BATCH_MAX_ITEMS}")
+    concurrency = max(1, min(concurrency, BATCH_LLM_SLOTS))
+    ip = request_ip(request)
+
+    async def answer(message: str) -> str:
+        # Each model call draws on the client's batch budget as it starts
+        await pace_batch_call(ip)
+        return await answer_question(message)
+
+    trace = RequestTrace("/chat/batch")
+
+    async def results() -> AsyncIterator[str]:
+        try:
+            async for result in run_batch(lines, screen_question, answer, concurrency, order == "input"):
+                yield json.dumps(result) + "\n"
+        finally:
+            trace.finish()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/clear")
-def clear(session_id: str | None = None):
-    if session_id and session_id in sessions:
-        del sessions[session_id]
+async def clear(session_id: str | None = None):
+    if session_id:
+        await sessions.adelete(session_id)
     return {"status": "ok"}
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    """
+    Readiness: 503 while the model-call error rate over the last
+    READINESS_WINDOW seconds is above READINESS_MAX_ERROR_RATE, so a load
+    balancer can route around a worker whose backend is failing.
+    """
+    error_rate, calls = model_health.error_rate()
+    ready = model_health.ready()
+    body = {"status": "ok" if ready else "degraded", "ready": ready, "model_error_rate": error_rate, "model_calls": calls}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "sessions": sessions.stats(),
+        "response_cache": response_cache.stats(),
+        "backstop": rule_stats(),
+        "models": router.stats(),
+        "faq": faq.stats() if faq else None,
+        "transcripts": transcripts.stats() if transcripts else None,
+        "prompt_cache": prefix_cache.stats() if prefix_cache else None,
+        "rate_limit": rate_limiter.stats() if rate_limiter else None,
+        "http": http_pool.stats(),
+    }
+
+
+# --- Metrics ---
+# Store, cache and backstop counters already exist; they are read at scrape time.
+
+def _session_metrics(*fields: str):
+    stats = sessions.stats()
+    return [({"result": f}, stats[f]) for f in fields]
+
+
+REGISTRY.callback("brewbot_sessions", "Sessions currently stored.", "gauge",
+                  lambda: [({}, len(sessions))] if sessions.cheap_len else [])
+REGISTRY.callback("brewbot_session_lookups_total", "Session store lookups by result.", "counter",
+                  lambda: _session_metrics("hits", "misses"))
+REGISTRY.callback("brewbot_session_removals_total", "Sessions evicted (LRU/size) or expired (TTL).", "counter",
+                  lambda: _session_metrics("evictions", "expirations"))
+REGISTRY.callback("brewbot_response_cache_lookups_total", "Response cache lookups by result.", "counter",
+                  lambda: [({"result": f}, response_cache.stats()[f]) for f in ("exact_hits", "fuzzy_hits", "misses")])
+REGISTRY.callback("brewbot_response_cache_entries", "Entries in the response cache.", "gauge",
+                  lambda: [({}, response_cache.stats()["entries"])])
+REGISTRY.callback("brewbot_llm_breaker_open", "1 while a model's circuit breaker is open or half-open.", "gauge",
+                  lambda: [({"model": m}, int(s["breaker"] != "closed")) for m, s in router.stats().items()])
+REGISTRY.callback("brewbot_faq_answers_total", "First-turn questions answered from the FAQ table, by intent.", "counter",
+                  lambda: [({"intent": intent}, n) for intent, n in (faq.stats()["intents"] if faq else {}).items()])
+REGISTRY.callback("brewbot_transcript_records_total", "Transcript log records written or dropped.", "counter",
+                  lambda: [({"result": f}, transcripts.stats()[f]) for f in ("written", "dropped")] if transcripts else [])
+REGISTRY.callback("brewbot_llm_queued", "Model calls waiting for a concurrency slot.", "gauge",
+                  lambda: [({}, llm_queued)])
+REGISTRY.callback("brewbot_rate_limit_admitted_total", "Requests admitted by the rate limiter.", "counter",
+                  lambda: [({}, rate_limiter.counts["admitted"])] if rate_limiter else [])
+REGISTRY.callback("brewbot_http_requests_total", "Model HTTP requests, by whether they opened a new connection.",
+                  "counter", lambda: [({"connection": "new"}, http_pool.counts["connections"]),
+                                      ({"connection": "reused"},
+                                       http_pool.counts["requests"] - http_pool.counts["connections"])])
+REGISTRY.callback("brewbot_http_handshake_seconds_total", "Time spent opening model connections (TCP + TLS).",
+                  "counter", lambda: [({}, http_pool.handshake_seconds)])
+REGISTRY.callback("brewbot_backstop_hits_total", "Backstop rule hits.", "counter",
+                  lambda: [({"rule": rule, "category": s["category"]}, s["hits"])
+                           for rule, s in rule_stats()["rules"].items()])
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
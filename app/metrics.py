@@ -0,0 +1,280 @@
+"""
+metrics.py — Prometheus metrics, request tracing and model-call health.
+
+A small in-process registry rendered in the Prometheus text format at
+/metrics. Counters and histograms are updated on the hot path; values that
+already live elsewhere (session store, response cache, backstop rule hits)
+are registered as callbacks and only read at scrape time.
+
+Each request gets a RequestTrace that times its stages (check_input,
+generate, check_output, ...) into the brewbot_stage_seconds histogram and
+reports them in a Server-Timing header. With OTEL_ENABLED=true every stage
+is also exported as an OpenTelemetry span; when disabled (the default) the
+tracer is never imported and a stage costs two perf_counter() calls.
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+
+# --- Config ---
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() in ("1", "true", "yes")
+# /health reports not-ready when the model-call error rate over the window
+# exceeds this, once at least READINESS_MIN_CALLS calls have been made
+READINESS_MAX_ERROR_RATE = float(os.getenv("READINESS_MAX_ERROR_RATE", "0.5"))
+READINESS_WINDOW = float(os.getenv("READINESS_WINDOW", "60"))
+READINESS_MIN_CALLS = int(os.getenv("READINESS_MIN_CALLS", "10"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    """A named metric rendered as a HELP/TYPE header plus its sample lines."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        """Sample lines in the Prometheus text format."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+
+class Callback(Metric):
+    """A gauge or counter whose samples are computed at scrape time."""
+
+    def __init__(self, name: str, help: str, type: str, fn: Callable[[], Iterable[tuple[dict, float]]]):
+        super().__init__(name, help)
+        self.type = type
+        self.fn = fn
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.fn():
+            yield f"{self.name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def callback(self, name: str, help: str, type: str, fn) -> Callback:
+        return self.register(Callback(name, help, type, fn))
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram("brewbot_request_seconds", "End-to-end request latency by endpoint.")
+STAGE_SECONDS = REGISTRY.histogram("brewbot_stage_seconds", "Time spent in each request stage.")
+LLM_CALLS = REGISTRY.counter("brewbot_llm_calls_total", "Model calls by outcome (ok, error).")
+LLM_TOKENS = REGISTRY.counter(
+    "brewbot_llm_tokens_total", "Tokens reported by the model, by kind (prompt, completion, cached)."
+)
+LLM_REQUEST_TOKENS = REGISTRY.histogram(
+    "brewbot_llm_request_tokens", "Tokens per model call, by kind.", buckets=TOKEN_BUCKETS
+)
+LLM_STREAMS_STOPPED = REGISTRY.counter(
+    "brewbot_llm_streams_stopped_total", "Model streams cancelled early by an output rule, by category."
+)
+
+
+def record_usage(usage) -> None:
+    """Count token usage from a LiteLLM response (or final stream chunk)."""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            LLM_TOKENS.inc(tokens, kind=kind)
+            LLM_REQUEST_TOKENS.observe(tokens, kind=kind)
+    # Prompt tokens served from a provider-side context cache (a subset of prompt)
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    if cached:
+        LLM_TOKENS.inc(cached, kind="cached")
+
+
+# --- Model-Call Health ---
+
+class ModelHealth:
+    """Sliding window of model-call outcomes, for readiness."""
+
+    def __init__(self, window: float = READINESS_WINDOW):
+        self.window = window
+        self._outcomes: deque[tuple[float, bool]] = deque()
+
+    def record(self, ok: bool):
+        LLM_CALLS.inc(outcome="ok" if ok else "error")
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        self._trim(now)
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> tuple[float, int]:
+        """Return (error rate, number of calls) over the window."""
+        self._trim(time.monotonic())
+        calls = len(self._outcomes)
+        if not calls:
+            return 0.0, 0
+        return sum(1 for _, ok in self._outcomes if not ok) / calls, calls
+
+    def ready(self) -> bool:
+        rate, calls = self.error_rate()
+        return calls < READINESS_MIN_CALLS or rate <= READINESS_MAX_ERROR_RATE
+
+
+model_health = ModelHealth()
+
+
+# --- Tracing ---
+_tracer = None
+if OTEL_ENABLED:
+    from opentelemetry import trace as otel_trace
+
+    _tracer = otel_trace.get_tracer("brewbot")
+
+
+class RequestTrace:
+    """
+    Per-request stage timings. Spans are started with an explicit parent
+    rather than made "current", so a trace can safely span the yields of a
+    streaming response.
+    """
+
+    __slots__ = ("endpoint", "stages", "attributes", "start", "_root", "_parent")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stages: dict[str, float] = {}
+        self.attributes: dict[str, object] = {}
+        self.start = time.perf_counter()
+        self._root = None
+        self._parent = None
+        if _tracer is not None:
+            self._root = _tracer.start_span(endpoint)
+            self._parent = otel_trace.set_span_in_context(self._root)
+
+    @contextmanager
+    def stage(self, name: str):
+        span = _tracer.start_span(name, context=self._parent) if _tracer is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            if span is not None:
+                span.end()
+
+    def set(self, key: str, value):
+        """Record a request attribute, also on the request span if tracing is on."""
+        self.attributes[key] = value
+        if self._root is not None:
+            self._root.set_attribute(key, value)
+
+    def usage(self, model: str | None, usage) -> None:
+        """Record which model answered and its token usage (OTel gen_ai names)."""
+        if model:
+            self.set("gen_ai.response.model", model)
+        for kind, key in (("prompt", "input"), ("completion", "output")):
+            tokens = getattr(usage, f"{kind}_tokens", None) if usage is not None else None
+            if tokens:
+                self.set(f"gen_ai.usage.{key}_tokens", tokens)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def finish(self) -> str:
+        """Record the request latency and return a Server-Timing header value."""
+        total = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint)
+        if self._root is not None:
+            self._root.end()
+        timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        timings.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(timings)
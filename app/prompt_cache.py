@@ -0,0 +1,396 @@
+"""
+prompt_cache.py — Provider-side context caching of the static system prompt.
+
+Gemini (AI Studio and Vertex AI) can hold a prompt prefix server-side as a
+`cachedContents` resource. A request that names it with `cached_content`
+doesn't resend the prefix, and those tokens are billed at the cached rate.
+PrefixCache keeps one such handle per model for SYSTEM_PROMPT:
+
+  - It is created in the background the first time a model is used (or at
+    startup, via prime()), so no request ever waits for it. Until it
+    exists, requests go out with the trimmed prompt.
+  - It is named brewbot-<prompt fingerprint>. Before creating one, a live
+    handle with that name (from another worker or an earlier run) is
+    reused. Handles this process created for an older prompt are deleted;
+    any others are left to expire, since another revision in a rolling
+    deploy may still be using them.
+  - Its TTL (PROMPT_CACHE_TTL) is extended once less than
+    PROMPT_CACHE_REFRESH seconds remain.
+  - If the provider rejects it (expired or deleted underneath us), the
+    handle is dropped, that attempt is resent with the trimmed prompt, and
+    the next request recreates it.
+
+Models on other providers, and models where creation fails (no explicit
+caching support, or a prefix under the provider's minimum size), keep
+using the trimmed prompt; creation is retried every PROMPT_CACHE_RETRY
+seconds. Every model call reports how many prompt tokens it saved against
+sending the full SYSTEM_PROMPT.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+
+import httpx
+
+from app.cache import fingerprint
+from app.history import count_tokens
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Lifetime of a cache handle, and how long before expiry it is extended (s)
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_REFRESH = int(os.getenv("PROMPT_CACHE_REFRESH", "300"))
+# Seconds to wait before trying again after a handle couldn't be created
+PROMPT_CACHE_RETRY = float(os.getenv("PROMPT_CACHE_RETRY", "300"))
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+VERTEX_PROJECT = os.getenv("VERTEX_PROJECT") or os.getenv("VERTEXAI_PROJECT")
+VERTEX_LOCATION = os.getenv("VERTEX_LOCATION") or os.getenv("VERTEXAI_LOCATION") or "us-central1"
+
+NAME_PREFIX = "brewbot-"
+
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "brewbot_prompt_tokens_saved_total",
+    "Prompt tokens not sent in full versus the full system prompt, by mode (cached, trimmed).",
+)
+
+
+@dataclass
+class Handle:
+    name: str            # provider resource name, passed as cached_content
+    display_name: str
+    model: str           # provider model path
+    expires_at: float    # unix time
+
+
+def _parse_time(value: str) -> float:
+    """RFC 3339 with up to nanosecond precision (as the APIs return it) to unix time."""
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value).replace("Z", "+00:00")
+    return datetime.fromisoformat(value).timestamp()
+
+
+# --- Provider APIs ---
+
+class CacheAPI(ABC):
+    """A provider's cachedContents API, for one model family."""
+
+    @abstractmethod
+    def model_path(self, model: str) -> str:
+        """The provider's name for a LiteLLM model, as cachedContents reports it."""
+
+    @abstractmethod
+    async def create(self, model: str, prompt: str, display_name: str, ttl: int) -> Handle: ...
+
+    @abstractmethod
+    async def extend(self, handle: Handle, ttl: int) -> Handle: ...
+
+    @abstractmethod
+    async def list(self) -> list[Handle]: ...
+
+    @abstractmethod
+    async def delete(self, name: str) -> None: ...
+
+    async def close(self) -> None:
+        pass
+
+
+class RestCacheAPI(CacheAPI):
+    """cachedContents over REST; subclasses supply the base URL, collection and auth."""
+
+    base_url: str
+    collection: str  # path of the cachedContents collection, relative to base_url
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+
+    @abstractmethod
+    async def headers(self) -> dict[str, str]: ...
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=10)
+        response = await self._client.request(method, path, headers=await self.headers(), **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    @staticmethod
+    def _handle(data: dict) -> Handle:
+        return Handle(data["name"], data.get("displayName", ""), data.get("model", ""), _parse_time(data["expireTime"]))
+
+    async def create(self, model: str, prompt: str, display_name: str, ttl: int) -> Handle:
+        body = {
+            "model": self.model_path(model),
+            "displayName": display_name,
+            "systemInstruction": {"parts": [{"text": prompt}]},
+            "ttl": f"{ttl}s",
+        }
+        return self._handle(await self._request("POST", self.collection, json=body))
+
+    async def extend(self, handle: Handle, ttl: int) -> Handle:
+        data = await self._request("PATCH", handle.name, params={"updateMask": "ttl"}, json={"ttl": f"{ttl}s"})
+        return self._handle(data)
+
+    async def list(self) -> list[Handle]:
+        handles, page = [], None
+        while True:
+            data = await self._request("GET", self.collection,
+                                       params={"pageSize": 100, **({"pageToken": page} if page else {})})
+            handles += [self._handle(item) for item in data.get("cachedContents", [])]
+            page = data.get("nextPageToken")
+            if not page:
+                return handles
+
+    async def delete(self, name: str) -> None:
+        await self._request("DELETE", name)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GeminiCacheAPI(RestCacheAPI):
+    """Gemini API (AI Studio), for gemini/* models. Authenticates with GEMINI_API_KEY."""
+
+    base_url = "https://generativelanguage.googleapis.com/v1beta/"
+    collection = "cachedContents"
+
+    def __init__(self, api_key: str):
+        super().__init__()
+        self.api_key = api_key
+
+    def model_path(self, model: str) -> str:
+        return f"models/{model.split('/', 1)[1]}"
+
+    async def headers(self) -> dict[str, str]:
+        return {"x-goog-api-key": self.api_key}
+
+
+class VertexCacheAPI(RestCacheAPI):
+    """
+    Vertex AI, for vertex_ai/* models. Authenticates with Application
+    Default Credentials, like LiteLLM (requires the `google-auth` package).
+    """
+
+    def __init__(self, project: str, location: str):
+        super().__init__()
+        self.base_url = f"https://{location}-aiplatform.googleapis.com/v1/"
+        self.parent = f"projects/{project}/locations/{location}"
+        self.collection = f"{self.parent}/cachedContents"
+        self._credentials = None
+
+    def model_path(self, model: str) -> str:
+        return f"{self.parent}/publishers/google/models/{model.split('/', 1)[1]}"
+
+    async def headers(self) -> dict[str, str]:
+        if self._credentials is None:
+            import google.auth
+
+            self._credentials, _ = await asyncio.to_thread(
+                google.auth.default, scopes=["https://www.googleapis.com/auth/cloud-platform"]
+            )
+        if not self._credentials.valid:
+            from google.auth.transport.requests import Request
+
+            await asyncio.to_thread(self._credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+
+
+def default_api(model: str) -> CacheAPI | None:
+    """The cache API for a LiteLLM model name, or None if its provider has none configured."""
+    provider = model.split("/", 1)[0]
+    if provider == "gemini" and GEMINI_API_KEY:
+        return GeminiCacheAPI(GEMINI_API_KEY)
+    if provider == "vertex_ai" and VERTEX_PROJECT:
+        return VertexCacheAPI(VERTEX_PROJECT, VERTEX_LOCATION)
+    return None
+
+
+# --- Handle Lifecycle ---
+
+class PrefixCache:
+    """
+    One provider cache handle per model for `prompt`. Passed to ModelRouter
+    as its rewriter: rewrite() swaps a request's leading system message for
+    the model's handle when there is a live one.
+    """
+
+    def __init__(
+        self,
+        prompt: str,
+        api_for=default_api,
+        ttl: int = PROMPT_CACHE_TTL,
+        refresh: int = PROMPT_CACHE_REFRESH,
+        retry: float = PROMPT_CACHE_RETRY,
+    ):
+        self.api_for = api_for
+        self.ttl = ttl
+        self.refresh = refresh
+        self.retry = retry
+        self._apis: dict[str, CacheAPI | None] = {}
+        self._handles: dict[str, Handle] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._retry_at: dict[str, float] = {}
+        # Names of the handles this instance created, the only ones it deletes
+        self._created: set[str] = set()
+        self.counts = dict.fromkeys(("hits", "misses", "created", "reused", "extended", "deleted", "failures", "rejected"), 0)
+        self.set_prompt(prompt)
+
+    def set_prompt(self, prompt: str):
+        """Cache a new prefix; handles created for the old one are replaced (and deleted) on next use."""
+        self.prompt = prompt
+        self.display_name = f"{NAME_PREFIX}{fingerprint(prompt)}"
+        self._handles.clear()
+        self._retry_at.clear()
+
+    # --- Request path ---
+
+    def handle(self, model: str) -> str | None:
+        """The live handle for `model`, if any; starts creating or extending one if due."""
+        api = self._api(model)
+        if api is None:
+            return None
+        now = time.time()
+        current = self._handles.get(model)
+        due = current is None or current.expires_at - now < self.refresh
+        if due and model not in self._refreshing and now >= self._retry_at.get(model, 0.0):
+            self._refreshing[model] = asyncio.get_running_loop().create_task(self._refresh(model, api, current))
+        # Leave a little slack so a request doesn't race the expiry
+        if current is not None and current.expires_at - now > 5:
+            return current.name
+        return None
+
+    def rewrite(self, model: str, messages: list[dict], kwargs: dict) -> tuple[list[dict], dict]:
+        if not messages or messages[0]["role"] != "system":
+            return messages, kwargs
+        name = self.handle(model)
+        if name is None:
+            self.counts["misses"] += 1
+            return messages, kwargs
+        self.counts["hits"] += 1
+        return messages[1:], {**kwargs, "cached_content": name}
+
+    def rejected(self, model: str, kwargs: dict, error: Exception) -> bool:
+        """
+        A rewritten call failed. If the provider refused the handle itself
+        (gone or not usable), drop it and return True so the call is resent
+        with the original prompt.
+        """
+        name = kwargs.get("cached_content")
+        if name is None or getattr(error, "status_code", None) not in (400, 403, 404):
+            return False
+        self.counts["rejected"] += 1
+        current = self._handles.get(model)
+        if current is not None and current.name == name:
+            del self._handles[model]
+        logger.warning("Prompt cache handle %s rejected for %s: %r", name, model, error)
+        return True
+
+    # --- Lifecycle ---
+
+    def prime(self, models: list[str]):
+        """Start creating handles for `models` before any traffic arrives."""
+        for model in models:
+            self.handle(model)
+
+    async def close(self):
+        """Stop refreshes and close API clients. Handles are left to expire, since other workers may share them."""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        for api in {id(a): a for a in self._apis.values() if a is not None}.values():
+            await api.close()
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            **self.counts,
+            "display_name": self.display_name,
+            "handles": {m: {"name": h.name, "expires_in": round(h.expires_at - now)} for m, h in self._handles.items()},
+        }
+
+    # --- Internals ---
+
+    def _api(self, model: str) -> CacheAPI | None:
+        if model not in self._apis:
+            self._apis[model] = self.api_for(model)
+        return self._apis[model]
+
+    async def _refresh(self, model: str, api: CacheAPI, current: Handle | None):
+        display_name = self.display_name
+        try:
+            if current is not None:
+                handle = await api.extend(current, self.ttl)
+                self.counts["extended"] += 1
+            else:
+                handle = await self._create_or_reuse(model, api)
+            if self.display_name == display_name:  # unless the prompt changed meanwhile
+                self._handles[model] = handle
+        except Exception as e:
+            self.counts["failures"] += 1
+            if current is None:
+                self._retry_at[model] = time.time() + self.retry
+                logger.warning("Couldn't create prompt cache for %s (retrying in %.0fs): %r", model, self.retry, e)
+            else:
+                # Recreated on next use
+                if self._handles.get(model) is current:
+                    del self._handles[model]
+                logger.warning("Couldn't extend prompt cache %s for %s: %r", current.name, model, e)
+        finally:
+            self._refreshing.pop(model, None)
+
+    async def _create_or_reuse(self, model: str, api: CacheAPI) -> Handle:
+        display_name, path, now = self.display_name, api.model_path(model), time.time()
+        live = await api.list()
+        self._created &= {h.name for h in live}  # forget the ones that expired
+        for stale in live:
+            if stale.name in self._created and stale.display_name != display_name:
+                await api.delete(stale.name)
+                self._created.discard(stale.name)
+                self.counts["deleted"] += 1
+        reusable = [
+            h for h in live
+            if h.display_name == display_name and h.model == path and h.expires_at - now > self.refresh
+        ]
+        if reusable:
+            self.counts["reused"] += 1
+            return max(reusable, key=lambda h: h.expires_at)
+        handle = await api.create(model, self.prompt, display_name, self.ttl)
+        self._created.add(handle.name)
+        self.counts["created"] += 1
+        return handle
+
+
+# --- Savings ---
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens the provider served from its cache, per the response usage."""
+    details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def prompt_savings(full_prompt: str, sent_prompt: str, usage) -> tuple[str, int]:
+    """
+    Return (mode, tokens saved) for one model call against sending
+    `full_prompt` uncached: the provider-reported cached tokens if the
+    prefix came from a cache handle, else the size difference between the
+    full and the trimmed prompt actually sent.
+    """
+    cached = cached_tokens(usage)
+    if cached:
+        mode, saved = "cached", cached
+    else:
+        saved = max(count_tokens(full_prompt) - count_tokens(sent_prompt), 0)
+        mode = "trimmed" if saved else "full"
+    if saved:
+        PROMPT_TOKENS_SAVED.inc(saved, mode=mode)
+    return mode, saved
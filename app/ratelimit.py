@@ -0,0 +1,257 @@
+"""
+ratelimit.py — Per-client rate limits for the chat endpoints.
+
+Each request takes one token from up to three token buckets:
+
+  - its session id    RATE_LIMIT_SESSION_RATE/s, bursts of RATE_LIMIT_SESSION_BURST
+  - its client IP     RATE_LIMIT_IP_RATE/s, bursts of RATE_LIMIT_IP_BURST
+  - a global bucket   RATE_LIMIT_GLOBAL_RATE/s (0 = off), to keep the sum of
+                      all clients under the model quota
+
+/chat/batch takes one token per request like the others, and then one per
+model call as the call starts, from its own per-IP bucket
+
+  - its client IP     RATE_LIMIT_BATCH_RATE/s, bursts of RATE_LIMIT_BATCH_BURST
+
+and the global bucket. A batch call that finds them empty waits for a
+token rather than failing, so a large batch is paced instead of refused.
+
+A request is admitted only if every bucket it touches has a token, and then
+takes one from each, so a refused request costs the client nothing. A
+refusal carries the wait until the emptiest bucket has a token again, which
+the app returns as Retry-After: 429 for a session or IP bucket, 503 for the
+global one.
+
+Bucket state is per process by default (MemoryBuckets). With
+RATE_LIMIT_BACKEND=redis it lives in Redis (RedisBuckets), so every
+instance behind a load balancer enforces the same limits. Pick one with
+create_rate_limiter().
+"""
+
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.metrics import REGISTRY
+from app.sessions import REDIS_URL
+
+# --- Config ---
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Sustained requests/s and burst size per session, per client IP, and overall
+RATE_LIMIT_SESSION_RATE = float(os.getenv("RATE_LIMIT_SESSION_RATE", "1"))
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "10"))
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "5"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "60"))
+RATE_LIMIT_GLOBAL_RATE = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", "0"))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "100"))
+# Sustained model calls/s and burst size per client IP for /chat/batch
+RATE_LIMIT_BATCH_RATE = float(os.getenv("RATE_LIMIT_BATCH_RATE", "20"))
+RATE_LIMIT_BATCH_BURST = float(os.getenv("RATE_LIMIT_BATCH_BURST", "100"))
+# Proxies in front of the app that append to X-Forwarded-For (1 on Cloud
+# Run); 0 uses the socket peer address
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))
+# Max buckets kept per process by the memory backend (least recently used go first)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+SHED = REGISTRY.counter(
+    "brewbot_requests_shed_total",
+    "Requests refused by admission control, by reason (session, ip, global, queue_full, queue_timeout).",
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float   # tokens added per second
+    burst: float  # bucket capacity
+
+
+@dataclass(frozen=True)
+class Refusal:
+    scope: str          # "session", "ip", "batch" or "global"
+    retry_after: float  # seconds until the request would be admitted
+
+    @property
+    def status_code(self) -> int:
+        # Global exhaustion is the server's problem, not the client's
+        return 503 if self.scope == "global" else 429
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+# --- Bucket Stores ---
+
+class Buckets(ABC):
+    """Token bucket state for a set of keys."""
+
+    @abstractmethod
+    def take(self, keys: list[str], limits: list[Limit]) -> tuple[int, float] | None:
+        """
+        Take one token from every bucket in `keys` if each has one. Otherwise
+        take nothing and return (index of the bucket with the longest wait,
+        seconds until it has a token).
+        """
+
+
+class MemoryBuckets(Buckets):
+    """Per-process buckets, least recently used dropped beyond `max_keys` (they refill to full)."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [tokens, monotonic time of that count]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def take(self, keys: list[str], limits: list[Limit]) -> tuple[int, float] | None:
+        now = time.monotonic()
+        levels, worst = [], None
+        for i, (key, limit) in enumerate(zip(keys, limits)):
+            bucket = self._buckets.get(key)
+            tokens = limit.burst if bucket is None else min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            levels.append(tokens)
+            if tokens < 1:
+                wait = (1 - tokens) / limit.rate
+                if worst is None or wait > worst[1]:
+                    worst = (i, wait)
+        if worst is not None:
+            return worst
+        for key, tokens in zip(keys, levels):
+            self._buckets[key] = [tokens - 1, now]
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Checks and updates every bucket in one round trip, atomically. Buckets are
+# hashes {tokens, ts}, timed by the server clock so instances agree, and
+# expire once they would have refilled.
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels, worst, wait = {}, 0, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = burst
+    if bucket[1] then
+        tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+    end
+    levels[i] = tokens
+    if tokens < 1 and (1 - tokens) / rate > wait then
+        worst, wait = i, (1 - tokens) / rate
+    end
+end
+if worst > 0 then
+    return {worst, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return {0, '0'}
+"""
+
+
+class RedisBuckets(Buckets):
+    """
+    Buckets shared by every instance, in Redis. `client` may be any
+    redis-py compatible client; when omitted one is created from REDIS_URL.
+    Requires the `redis` package.
+    """
+
+    def __init__(self, client=None, prefix: str = "brewbot:ratelimit:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, keys: list[str], limits: list[Limit]) -> tuple[int, float] | None:
+        args = [x for limit in limits for x in (limit.rate, limit.burst)]
+        index, wait = self._take(keys=[self.prefix + key for key in keys], args=args)
+        return None if index == 0 else (index - 1, float(wait))
+
+
+# --- Limiter ---
+
+class RateLimiter:
+    """Admits or refuses requests against the session, IP and global buckets, and batch model calls."""
+
+    def __init__(
+        self,
+        buckets: Buckets,
+        session: Limit | None = Limit(RATE_LIMIT_SESSION_RATE, RATE_LIMIT_SESSION_BURST),
+        ip: Limit | None = Limit(RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST),
+        global_: Limit | None = Limit(RATE_LIMIT_GLOBAL_RATE, RATE_LIMIT_GLOBAL_BURST),
+        batch: Limit | None = Limit(RATE_LIMIT_BATCH_RATE, RATE_LIMIT_BATCH_BURST),
+    ):
+        self.buckets = buckets
+        # A limit with no rate is off
+        self.limits = {
+            scope: limit
+            for scope, limit in (("session", session), ("ip", ip), ("batch", batch), ("global", global_))
+            if limit is not None and limit.rate > 0
+        }
+        self.counts = {"admitted": 0, **dict.fromkeys(self.limits, 0)}
+
+    def check(self, session_id: str | None = None, ip: str | None = None) -> Refusal | None:
+        """Take a token for this request, or return why it must wait. Unknown ids aren't limited."""
+        return self._take({"session": session_id, "ip": ip, "global": "all"})
+
+    def check_batch_call(self, ip: str | None) -> Refusal | None:
+        """Take a token for one /chat/batch model call from the batch and global buckets, or return the wait."""
+        return self._take({"batch": ip, "global": "all"}, shed=False)
+
+    def _take(self, ids: dict[str, str | None], shed: bool = True) -> Refusal | None:
+        scopes = [scope for scope in self.limits if ids.get(scope)]
+        if not scopes:
+            return None
+        refused = self.buckets.take(
+            [f"{scope}:{ids[scope]}" for scope in scopes], [self.limits[scope] for scope in scopes]
+        )
+        if refused is None:
+            self.counts["admitted"] += 1
+            return None
+        scope = scopes[refused[0]]
+        self.counts[scope] += 1
+        if shed:  # a batch call waits and retries instead
+            SHED.inc(reason=scope)
+        return Refusal(scope, refused[1])
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.buckets).__name__,
+            "limits": {scope: {"rate": l.rate, "burst": l.burst} for scope, l in self.limits.items()},
+            **self.counts,
+        }
+
+
+def client_ip(peer: str | None, forwarded_for: str | None, hops: int = RATE_LIMIT_PROXY_HOPS) -> str | None:
+    """
+    The client address: the socket peer, or with `hops` trusted proxies the
+    X-Forwarded-For entry the outermost one added. Entries further left are
+    client-supplied and can't be trusted.
+    """
+    if hops <= 0 or not forwarded_for:
+        return peer
+    entries = [e.strip() for e in forwarded_for.split(",") if e.strip()]
+    return entries[-hops] if len(entries) >= hops else entries[0] if entries else peer
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    """Build the limiter selected by RATE_LIMIT_BACKEND."""
+    if backend == "memory":
+        return RateLimiter(MemoryBuckets())
+    if backend == "redis":
+        return RateLimiter(RedisBuckets())
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend!r} (expected memory or redis)")
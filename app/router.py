@@ -0,0 +1,444 @@
+"""
+router.py — Model routing over LiteLLM: fallbacks, deadlines, retries,
+hedging and per-backend circuit breakers.
+
+A ModelRouter works down an ordered list of models (MODEL, then
+FALLBACK_MODELS). Each attempt has its own deadline (LLM_ATTEMPT_TIMEOUT,
+measured to the first token when streaming), and the whole call is bounded
+by LLM_REQUEST_TIMEOUT. Transient errors (timeouts, connection errors, 429s,
+5xx) are retried on the same model with full-jitter backoff, up to
+LLM_RETRIES times, before falling through to the next model. Other backend
+errors (bad credentials, unknown model) skip straight to the next model;
+errors in the request itself (bad request, context too long) are raised at
+once, since no backend would accept it.
+
+With LLM_HEDGE_AFTER set (ideally near the observed p95 time to first
+token), an attempt that hasn't produced a token by then is raced against a
+second one, on the next healthy model if there is one, and whichever
+answers first wins; the loser is cancelled. Each model has a circuit breaker: after LLM_BREAKER_FAILURES
+consecutive failures it is skipped for LLM_BREAKER_COOLDOWN seconds, then a
+single probe call decides whether it closes again.
+
+A router may be given a rewriter (app/prompt_cache.PrefixCache) that
+adapts each attempt's messages and arguments to its model, e.g. to use a
+provider-side cache of the system prompt. If the backend rejects the
+rewritten call, the rewriter decides whether to resend it unchanged. Given
+an app/http_clients.HttpPool, every call goes out over its pooled
+connections.
+
+LiteLLM takes seconds to import, so it isn't imported with this module: the
+first call loads it in a worker thread, or warm_up() does at startup, so the
+server can listen (and answer FAQ, cached and backstop replies) meanwhile.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from typing import Any
+
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# Models tried, in order, after MODEL (comma-separated LiteLLM model names)
+FALLBACK_MODELS = [m.strip() for m in os.getenv("FALLBACK_MODELS", "").split(",") if m.strip()]
+# Seconds one attempt may take: to the full response, or to the first token when streaming
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "15"))
+# Seconds a stream may go quiet between chunks once it has started
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "10"))
+# Seconds for the whole call, across all retries, fallbacks and hedges
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+# Extra attempts per model on transient errors, and the base backoff (s)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "1"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.25"))
+# Seconds without a first token before a hedged attempt is fired; 0 disables
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# At startup, in the background: "call" imports LiteLLM and makes a one-token
+# call to MODEL, so its client, credentials and connection pool are ready;
+# "import" only imports LiteLLM; "off" leaves both to the first request
+LLM_WARMUP = os.getenv("LLM_WARMUP", "call")
+WARMUP_MODES = ("call", "import", "off")
+
+ATTEMPTS = REGISTRY.counter(
+    "brewbot_llm_attempts_total", "Model call attempts by model and outcome (ok, error, timeout, cancelled)."
+)
+HEDGES = REGISTRY.counter("brewbot_llm_hedges_total", "Hedged attempts fired, by model.")
+
+
+# --- Lazy LiteLLM ---
+# Filled in by _import_litellm(); before that no LiteLLM call can have raised.
+_litellm = None
+_import_lock = threading.Lock()
+# Worth retrying on the same backend. asyncio.TimeoutError only became the
+# builtin TimeoutError in Python 3.11.
+TRANSIENT_ERRORS: tuple[type[Exception], ...] = (TimeoutError, asyncio.TimeoutError)
+# The request itself is at fault; no backend will do better
+REQUEST_ERRORS: tuple[type[Exception], ...] = ()
+
+
+def _import_litellm():
+    global _litellm, TRANSIENT_ERRORS, REQUEST_ERRORS
+    with _import_lock:
+        if _litellm is None:
+            start = time.perf_counter()
+            import litellm
+            errors = litellm.exceptions
+            TRANSIENT_ERRORS = (
+                TimeoutError,
+                asyncio.TimeoutError,
+                errors.Timeout,
+                errors.APIConnectionError,
+                errors.RateLimitError,
+                errors.ServiceUnavailableError,
+                errors.InternalServerError,
+            )
+            REQUEST_ERRORS = (errors.BadRequestError,)
+            _litellm = litellm
+            logger.info("Imported litellm in %.2fs", time.perf_counter() - start)
+    return _litellm
+
+
+async def load_litellm():
+    """The litellm module, imported on first use without blocking the event loop."""
+    return _litellm or await asyncio.to_thread(_import_litellm)
+
+
+class RouterError(Exception):
+    """No model produced an answer: all failed, were open, or time ran out."""
+
+
+class CircuitBreaker:
+    """
+    Closed until `failures` consecutive failures, then open for `cooldown`
+    seconds. After that it is half-open: one probe call is let through, and
+    its outcome closes the breaker or opens it for another cooldown.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return True if a call may go through (claiming the probe if half-open)."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.consecutive += 1
+        self.probing = False
+        if self.opened_at is not None or self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """The call was cancelled before it finished; it counts as neither."""
+        self.probing = False
+
+
+class ModelRouter:
+    """
+    Routes completion calls across `models`; see the module docstring.
+
+    `rewriter`, if given, has rewrite(model, messages, kwargs) -> (messages,
+    kwargs), called per attempt, and rejected(model, kwargs, error) -> bool,
+    which returns True if a failed rewritten call should be resent as is.
+    `http`, if given, is the HttpPool calls are made through.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+        idle_timeout: float = LLM_STREAM_IDLE_TIMEOUT,
+        request_timeout: float = LLM_REQUEST_TIMEOUT,
+        retries: int = LLM_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF,
+        hedge_after: float = LLM_HEDGE_AFTER,
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_cooldown: float = LLM_BREAKER_COOLDOWN,
+        rewriter=None,
+        http=None,
+    ):
+        self.models = list(dict.fromkeys(models))
+        self.rewriter = rewriter
+        self.http = http
+        self.attempt_timeout = attempt_timeout
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.breakers = {m: CircuitBreaker(breaker_failures, breaker_cooldown) for m in self.models}
+
+    # --- Public API ---
+
+    async def complete(self, messages: list[dict], **kwargs) -> Any:
+        """Return the first successful (non-streaming) LiteLLM response."""
+        litellm = await load_litellm()
+
+        async def attempt(model: str, timeout: float):
+            return await self._rewritten(model, messages, kwargs, lambda m, kw: asyncio.wait_for(
+                litellm.acompletion(model=model, messages=m, timeout=timeout, **kw, **self._pooled(model)), timeout
+            ))
+
+        response, _ = await self._route(attempt)
+        return response
+
+    async def stream(self, messages: list[dict], **kwargs) -> AsyncIterator[Any]:
+        """
+        Yield LiteLLM stream chunks from the first model to produce a token.
+        Retries and hedges only happen before that; once chunks are flowing,
+        a failure is raised to the caller.
+        """
+        await load_litellm()
+
+        async def attempt(model: str, timeout: float):
+            return await self._rewritten(model, messages, kwargs, lambda m, kw: asyncio.wait_for(
+                self._open_stream(model, m, {**kw, **self._pooled(model)}), timeout
+            ))
+
+        (stream, buffered), model = await self._route(attempt, discard=self._close_stream)
+        try:
+            for chunk in buffered:
+                yield chunk
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), self.idle_timeout)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except TRANSIENT_ERRORS as e:
+            self.breakers[model].failure()
+            raise RouterError(f"{model} failed mid-stream: {e!r}") from e
+        finally:
+            await self._close_stream((stream, buffered))
+
+    def warm_up(self, mode: str = LLM_WARMUP) -> asyncio.Task | None:
+        """
+        Start getting ready for the first request in the background (see
+        LLM_WARMUP). Returns the task, or None if warm-up is off. A failed
+        warm-up call is logged; it doesn't count against the breaker.
+        """
+        if mode not in WARMUP_MODES:
+            raise ValueError(f"Unknown LLM_WARMUP: {mode!r} (expected call, import or off)")
+        if mode == "off":
+            return None
+        return asyncio.create_task(self._warm_up(call=mode == "call"))
+
+    def stats(self) -> dict:
+        return {m: {"breaker": b.state, "consecutive_failures": b.consecutive} for m, b in self.breakers.items()}
+
+    # --- Internals ---
+
+    def _pooled(self, model: str) -> dict:
+        """acompletion() arguments that send the call through the shared HTTP pool."""
+        return self.http.completion_kwargs(model) if self.http is not None else {}
+
+    async def _warm_up(self, call: bool):
+        litellm = await load_litellm()
+        if not call:
+            return
+        model = self.models[0]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(litellm.acompletion(
+                model=model, messages=[{"role": "user", "content": "ping"}], max_tokens=1, timeout=self.attempt_timeout,
+                **self._pooled(model),
+            ), self.attempt_timeout)
+        except Exception as e:
+            logger.warning("Warm-up call to %s failed: %r", model, e)
+        else:
+            logger.info("Warm-up call to %s took %.2fs", model, time.perf_counter() - start)
+
+    def _plan(self) -> Iterator[str]:
+        for model in self.models:
+            for _ in range(self.retries + 1):
+                yield model
+
+    async def _route(
+        self,
+        attempt: Callable[[str, float], Awaitable[Any]],
+        discard: Callable[[Any], Awaitable[None]] | None = None,
+    ) -> tuple[Any, str]:
+        """
+        Run attempts down the plan until one succeeds, hedging and retrying
+        as configured. Returns (result, model).
+        """
+        deadline = time.monotonic() + self.request_timeout
+        plan = self._plan()
+        running: dict[asyncio.Task, str] = {}
+        failures = 0
+        last_error: BaseException | None = None
+        skip: set[str] = set()  # models that failed non-transiently: don't retry them
+
+        def start(model: str):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            running[asyncio.ensure_future(self._attempt(model, attempt, timeout))] = model
+
+        def launch() -> bool:
+            """Start the next planned attempt; False once the plan is exhausted."""
+            for model in plan:
+                if model not in skip and self.breakers[model].allow():
+                    start(model)
+                    return True
+            return False
+
+        def hedge():
+            # A straggler's backend is likely slow for its twin too, so hedge
+            # to another model if there is one; it doesn't use up the plan.
+            busy = set(running.values())
+            for model in self.models:
+                if model not in busy and model not in skip and self.breakers[model].allow():
+                    start(model)
+                    HEDGES.inc(model=model)
+                    return
+            if len(self.models) == 1 and launch():
+                HEDGES.inc(model=self.models[0])
+
+        try:
+            launch()
+            while running:
+                remaining = deadline - time.monotonic()
+                wait = remaining
+                can_hedge = self.hedge_after and len(running) == 1
+                if can_hedge:
+                    wait = min(wait, self.hedge_after)
+                done, _ = await asyncio.wait(running, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if time.monotonic() >= deadline:
+                        break
+                    if can_hedge:
+                        hedge()
+                    continue
+
+                winner = None
+                for task in done:
+                    model = running.pop(task)
+                    try:
+                        result = task.result()
+                    except REQUEST_ERRORS:
+                        raise
+                    except Exception as e:
+                        last_error = e
+                        failures += 1
+                        if not isinstance(e, TRANSIENT_ERRORS):
+                            skip.add(model)
+                        logger.info("Model attempt on %s failed: %r", model, e)
+                        continue
+                    if winner is None:
+                        winner = (result, model)
+                    elif discard is not None:
+                        await discard(result)
+                if winner is not None:
+                    return winner
+
+                if not running:
+                    # Full-jitter backoff before the next attempt, within the deadline
+                    delay = random.uniform(0, self.backoff * 2 ** (failures - 1))
+                    if time.monotonic() + delay >= deadline:
+                        break
+                    await asyncio.sleep(delay)
+                    if not launch():
+                        break
+        finally:
+            for task in running:
+                task.cancel()
+
+        if last_error is None:
+            raise RouterError("No model available: all circuit breakers are open or the deadline passed")
+        raise RouterError(f"All model attempts failed; last error: {last_error!r}") from last_error
+
+    async def _rewritten(
+        self,
+        model: str,
+        messages: list[dict],
+        kwargs: dict,
+        call: Callable[[list[dict], dict], Awaitable[Any]],
+    ) -> Any:
+        """Make `call` with the rewriter's messages and kwargs for `model`, falling back to the originals."""
+        if self.rewriter is None:
+            return await call(messages, kwargs)
+        new_messages, new_kwargs = self.rewriter.rewrite(model, messages, kwargs)
+        if new_messages is messages and new_kwargs is kwargs:
+            return await call(messages, kwargs)
+        try:
+            return await call(new_messages, new_kwargs)
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if not self.rewriter.rejected(model, new_kwargs, e):
+                raise
+        return await call(messages, kwargs)
+
+    async def _attempt(self, model: str, attempt: Callable[[str, float], Awaitable[Any]], timeout: float) -> Any:
+        breaker = self.breakers[model]
+        try:
+            result = await attempt(model, timeout)
+        except asyncio.CancelledError:
+            breaker.abandon()
+            ATTEMPTS.inc(model=model, outcome="cancelled")
+            raise
+        except REQUEST_ERRORS:
+            # The backend is fine; the request isn't
+            breaker.abandon()
+            ATTEMPTS.inc(model=model, outcome="error")
+            raise
+        except Exception as e:
+            breaker.failure()
+            ATTEMPTS.inc(model=model, outcome="timeout" if isinstance(e, TimeoutError) else "error")
+            raise
+        breaker.success()
+        ATTEMPTS.inc(model=model, outcome="ok")
+        return result
+
+    @staticmethod
+    async def _open_stream(model: str, messages: list[dict], kwargs: dict) -> tuple[Any, list]:
+        """Start a stream and read up to its first token, so it can be raced."""
+        stream = await _litellm.acompletion(model=model, messages=messages, stream=True, **kwargs)
+        buffered = []
+        try:
+            async for chunk in stream:
+                buffered.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+        except BaseException:
+            await ModelRouter._close_stream((stream, buffered))
+            raise
+        return stream, buffered
+
+    @staticmethod
+    async def _close_stream(opened: tuple[Any, list]):
+        aclose = getattr(opened[0], "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
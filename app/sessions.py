@@ -0,0 +1,465 @@
+"""
+sessions.py — Conversation storage.
+
+A session is the list of user/assistant turns exchanged so far, in OpenAI
+message format. The system prompt is NOT stored per session; callers prepend
+it when building the model request.
+
+Backends:
+  - MemorySessionStore  per-process LRU with a sliding TTL and hard caps on
+                        session count and total bytes (default); turns are
+                        held compactly (see Turns)
+  - SQLiteSessionStore  a file shared by every worker on one node
+  - RedisSessionStore   shared across instances; any redis-py compatible
+                        client works (e.g. fakeredis for local runs)
+
+Pick one with SESSION_BACKEND=memory|sqlite|redis (see create_session_store).
+
+Async code (the request handlers) uses aget/aappend/areplace/adelete. For
+the SQLite and Redis stores these run the call in a worker thread, so disk
+and network I/O never block the event loop; the memory store answers
+inline.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+# --- Config ---
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Rough per-message bookkeeping cost on top of the content itself
+MESSAGE_OVERHEAD_BYTES = 64
+
+
+def message_size(message: dict) -> int:
+    """Approximate in-memory footprint of one message, in bytes."""
+    return len(message["content"].encode()) + MESSAGE_OVERHEAD_BYTES
+
+
+@dataclass
+class StoreStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0      # dropped to stay under the count/byte caps
+    expirations: int = 0    # dropped because their TTL lapsed
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SessionStore(ABC):
+    """Interface every session backend implements."""
+
+    # Whether len() is cheap enough for stats() and every metrics scrape
+    cheap_len = True
+    # Whether calls do disk or network I/O, so the async methods run them in a thread
+    blocking = True
+
+    def __init__(self):
+        self._stats = StoreStats()
+
+    @abstractmethod
+    def get(self, session_id: str) -> list[dict]:
+        """Return the stored turns for a session, or [] if unknown or expired."""
+
+    @abstractmethod
+    def append(self, session_id: str, *messages: dict) -> None:
+        """Append turns to a session, creating it if needed."""
+
+    @abstractmethod
+    def replace(self, session_id: str, messages: list[dict]) -> None:
+        """Overwrite a session's turns, e.g. after history compaction."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Drop a session. Unknown ids are ignored."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions."""
+
+    # --- Async interface ---
+
+    async def aget(self, session_id: str) -> list[dict]:
+        return await self._run(self.get, session_id)
+
+    async def aappend(self, session_id: str, *messages: dict) -> None:
+        await self._run(self.append, session_id, *messages)
+
+    async def areplace(self, session_id: str, messages: list[dict]) -> None:
+        await self._run(self.replace, session_id, messages)
+
+    async def adelete(self, session_id: str) -> None:
+        await self._run(self.delete, session_id)
+
+    async def _run(self, method, *args):
+        return await asyncio.to_thread(method, *args) if self.blocking else method(*args)
+
+    def stats(self) -> dict:
+        """Hit/miss and eviction counters, plus backend-specific sizes. `sessions` is None if not cheap_len."""
+        sessions = len(self) if self.cheap_len else None
+        return {"backend": type(self).__name__, "sessions": sessions, **self._stats.as_dict()}
+
+
+# --- Compact turns ---
+
+# Roles a stored turn can have; Turns keeps each as its index in this tuple
+ROLES = ("user", "assistant", "system", "tool", "developer")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+class Turns:
+    """
+    A conversation's turns without a dict per turn: role codes in a
+    bytearray and contents in a list, about 9 bytes a turn besides the text
+    instead of about 190. Only role and content are kept. The message dicts
+    a request needs are built by messages() when the session is read.
+    """
+
+    __slots__ = ("roles", "contents")
+
+    def __init__(self, messages: Iterable[dict] = ()):
+        self.roles = bytearray()
+        self.contents: list[str] = []
+        self.extend(messages)
+
+    def extend(self, messages: Iterable[dict]):
+        messages = list(messages)
+        try:
+            codes = [_ROLE_CODES[m["role"]] for m in messages]
+        except KeyError as e:
+            raise ValueError(f"Unknown message role: {e.args[0]!r}") from None
+        self.roles.extend(codes)
+        self.contents.extend(m["content"] for m in messages)
+
+    def popleft(self) -> dict:
+        """Remove and return the oldest turn."""
+        role = ROLES[self.roles.pop(0)]
+        return {"role": role, "content": self.contents.pop(0)}
+
+    def messages(self) -> list[dict]:
+        """The turns as OpenAI messages, freshly built."""
+        return [{"role": ROLES[code], "content": content} for code, content in zip(self.roles, self.contents)]
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+
+# --- In-memory LRU + TTL ---
+
+@dataclass(slots=True)
+class _Entry:
+    turns: Turns = field(default_factory=Turns)
+    size: int = 0
+    expires_at: float = 0.0
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Per-process store. Entries are kept in least-recently-used order and
+    every access slides the TTL, so expired sessions always sit at the front
+    and can be swept without scanning the whole map.
+
+    When a cap is exceeded the least recently used sessions are evicted. If a
+    single session alone exceeds max_bytes, its oldest turns are dropped.
+
+    Not thread-safe: the async methods call it inline on the event loop.
+    """
+
+    blocking = False
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX_COUNT,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        super().__init__()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+
+    def get(self, session_id: str) -> list[dict]:
+        self._sweep()
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self._stats.misses += 1
+            return []
+        self._stats.hits += 1
+        self._touch(session_id, entry)
+        return entry.turns.messages()
+
+    def append(self, session_id: str, *messages: dict) -> None:
+        self._sweep()
+        entry = self._entries.get(session_id) or _Entry()
+        entry.turns.extend(messages)  # raises on an unknown role before anything is stored
+        self._entries[session_id] = entry
+        size = sum(map(message_size, messages))
+        entry.size += size
+        self._bytes += size
+        self._touch(session_id, entry)
+        self._enforce_caps(session_id)
+
+    def replace(self, session_id: str, messages: list[dict]) -> None:
+        self.delete(session_id)
+        self.append(session_id, *messages)
+
+    def delete(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "bytes": self._bytes}
+
+    # --- Internals ---
+
+    def _touch(self, session_id: str, entry: _Entry):
+        entry.expires_at = time.monotonic() + self.ttl
+        self._entries.move_to_end(session_id)
+
+    def _sweep(self):
+        now = time.monotonic()
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self.delete(session_id)
+            self._stats.expirations += 1
+
+    def _enforce_caps(self, current_id: str):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            oldest_id = next(iter(self._entries))
+            if oldest_id == current_id:
+                break
+            self.delete(oldest_id)
+            self._stats.evictions += 1
+
+        # A single oversized conversation loses its oldest turns instead
+        entry = self._entries[current_id]
+        while self._bytes > self.max_bytes and len(entry.turns) > 2:
+            size = message_size(entry.turns.popleft())
+            entry.size -= size
+            self._bytes -= size
+
+
+# --- SQLite (single node, multiple workers) ---
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in one SQLite file, so every uvicorn worker on a node shares
+    them. Pass path=":memory:" for a throwaway store.
+
+    Expired sessions and anything over max_sessions are pruned every
+    `prune_every` writes rather than on every request.
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_SQLITE_PATH,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX_COUNT,
+        prune_every: int = 100,
+    ):
+        super().__init__()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " messages TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def get(self, session_id: str) -> list[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT messages FROM sessions WHERE id = ? AND expires_at > ?",
+                (session_id, now),
+            ).fetchone()
+            if row is None:
+                self._stats.misses += 1
+                return []
+            self._db.execute(
+                "UPDATE sessions SET expires_at = ? WHERE id = ?", (now + self.ttl, session_id)
+            )
+        self._stats.hits += 1
+        return json.loads(row[0])
+
+    def append(self, session_id: str, *messages: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT messages FROM sessions WHERE id = ? AND expires_at > ?",
+                    (session_id, now),
+                ).fetchone()
+                stored = json.loads(row[0]) if row else []
+                stored.extend(messages)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (id, messages, size, expires_at) VALUES (?, ?, ?, ?)",
+                    (session_id, json.dumps(stored), sum(map(message_size, stored)), now + self.ttl),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(now)
+
+    def replace(self, session_id: str, messages: list[dict]) -> None:
+        stored = list(messages)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, messages, size, expires_at) VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(stored), sum(map(message_size, stored)), time.time() + self.ttl),
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        return {**super().stats(), "bytes": total}
+
+    def _prune(self, now: float):
+        expired = self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+        self._stats.expirations += expired
+        overflow = self._db.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        ).rowcount
+        self._stats.evictions += overflow
+
+
+# --- Redis (shared across instances) ---
+
+class RedisSessionStore(SessionStore):
+    """
+    Each session is a Redis list of JSON-encoded messages with a sliding
+    TTL. Count and byte caps are enforced by the server: run Redis with
+    `maxmemory` and `maxmemory-policy allkeys-lru` (or volatile-lru), and the
+    eviction/expiry counters below are read back from INFO.
+
+    `client` may be any redis-py compatible client; when omitted one is
+    created from REDIS_URL. Requires the `redis` package.
+
+    len() scans the whole keyspace, so stats() and /metrics leave the
+    session count out; Redis' own INFO keyspace reports it.
+    """
+
+    cheap_len = False
+
+    def __init__(self, client=None, ttl: float = SESSION_TTL, prefix: str = "brewbot:session:"):
+        super().__init__()
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL)
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def get(self, session_id: str) -> list[dict]:
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, self.ttl)
+        raw, _ = pipe.execute()
+        if not raw:
+            self._stats.misses += 1
+            return []
+        self._stats.hits += 1
+        return [json.loads(m) for m in raw]
+
+    def append(self, session_id: str, *messages: dict) -> None:
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *(json.dumps(m) for m in messages))
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def replace(self, session_id: str, messages: list[dict]) -> None:
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.rpush(key, *(json.dumps(m) for m in messages))
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(self._key(session_id))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        try:
+            info = self.client.info("stats")
+        except Exception:
+            # Local stand-ins (e.g. fakeredis) may not implement INFO
+            return stats
+        stats["evictions"] = info.get("evicted_keys", 0)
+        stats["expirations"] = info.get("expired_keys", 0)
+        return stats
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Build the store selected by SESSION_BACKEND."""
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected memory, sqlite or redis)")
@@ -0,0 +1,432 @@
+"""
+transcripts.py — Append-only conversation transcript log.
+
+With TRANSCRIPT_ENABLED (off by default: it stores what users type),
+every /chat and /chat/stream turn is appended to a JSONL log, one record
+per message (the user's, then the assistant's), with the session id, the
+text, the backstop verdict, how the answer was produced, the model, the
+latency and the token counts. It's the raw material for tuning prompts and
+backstop rules, and bench/replay.py feeds it back into the benchmarks and
+the eval harness.
+
+Requests never touch the disk. log_turn() builds two dicts, drops them on
+a bounded asyncio queue and returns. A background task takes everything
+queued at once (up to TRANSCRIPT_BATCH_SIZE records) and writes it from a
+worker thread, so records that arrive during a write go out together in
+the next one. If the queue fills up because the disk can't keep up,
+records are dropped and counted rather than making requests wait.
+
+The log is a directory of segments named
+transcript-<UTC start>-<pid>-<seq>.jsonl, so workers sharing a directory
+never write to the same file. The active segment is rotated after
+TRANSCRIPT_SEGMENT_MB or TRANSCRIPT_SEGMENT_SECONDS, and closed segments are
+gzipped (TRANSCRIPT_COMPRESS) and never written again. Retention keeps at
+most TRANSCRIPT_MAX_SEGMENTS closed segments and TRANSCRIPT_MAX_MB of them
+in the directory, deleting the oldest first. TRANSCRIPT_FSYNC sets
+durability: "batch" fsyncs after every write, "interval" at most every
+TRANSCRIPT_FSYNC_INTERVAL seconds, "never" leaves it to the OS. A crash
+loses at most the unsynced tail; readers skip a torn last line.
+
+CLI:
+    uv run python -m app.transcripts stats transcripts/
+    uv run python -m app.transcripts export transcripts/ -o turns.parquet   # needs pyarrow
+    uv run python -m app.transcripts export transcripts/ -o turns.json.gz   # column arrays, no deps
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import IO
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+TRANSCRIPT_ENABLED = os.getenv("TRANSCRIPT_ENABLED", "false").lower() in ("1", "true", "yes")
+TRANSCRIPT_DIR = Path(os.getenv("TRANSCRIPT_DIR", "transcripts"))
+TRANSCRIPT_SEGMENT_MB = float(os.getenv("TRANSCRIPT_SEGMENT_MB", "64"))
+TRANSCRIPT_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPT_SEGMENT_SECONDS", "3600"))
+# Closed segments kept in the directory, by count and total size (0: no limit)
+TRANSCRIPT_MAX_SEGMENTS = int(os.getenv("TRANSCRIPT_MAX_SEGMENTS", "168"))
+TRANSCRIPT_MAX_MB = float(os.getenv("TRANSCRIPT_MAX_MB", "1024"))
+TRANSCRIPT_COMPRESS = os.getenv("TRANSCRIPT_COMPRESS", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_FSYNC = os.getenv("TRANSCRIPT_FSYNC", "interval")
+TRANSCRIPT_FSYNC_INTERVAL = float(os.getenv("TRANSCRIPT_FSYNC_INTERVAL", "1"))
+# Max records per write, and max records waiting for the writer before new ones are dropped
+TRANSCRIPT_BATCH_SIZE = int(os.getenv("TRANSCRIPT_BATCH_SIZE", "512"))
+TRANSCRIPT_QUEUE_SIZE = int(os.getenv("TRANSCRIPT_QUEUE_SIZE", "10000"))
+
+FSYNC_POLICIES = ("batch", "interval", "never")
+
+# Every record has exactly these fields (None where they don't apply), in
+# this order; they are also the columns of an export.
+FIELDS = (
+    "ts",                 # unix time the turn finished
+    "session_id",
+    "turn",               # shared by a turn's user and assistant records
+    "endpoint",           # /chat or /chat/stream
+    "role",               # user | assistant
+    "content",
+    "source",             # assistant: model | faq | cache | backstop
+    "backstop",           # user: "pass" or "<category>:<rule>"; assistant: "pass" or "replaced"
+    "model",              # assistant, source=model: the model that answered
+    "latency_ms",         # assistant: request start to answer ready
+    "prompt_tokens",      # assistant, source=model
+    "completion_tokens",  # assistant, source=model
+    "prompt_tokens_saved",  # assistant, source=model: vs. sending the full system prompt
+)
+
+_STOP = object()
+
+# Turn ids: unique per process start, then a counter (cheaper than uuid4)
+_TURN_PREFIX = f"{int(time.time()):x}.{os.getpid():x}."
+_turn_ids = itertools.count(1)
+
+
+def turn_records(
+    *,
+    session_id: str,
+    endpoint: str,
+    question: str,
+    answer: str,
+    source: str,
+    input_verdict: str = "pass",
+    replaced: bool = False,
+    model: str | None = None,
+    latency: float | None = None,
+    prompt_tokens: int | None = None,
+    completion_tokens: int | None = None,
+    prompt_tokens_saved: int | None = None,
+) -> tuple[dict, dict]:
+    """The user and assistant records for one completed turn."""
+    ts = round(time.time(), 3)
+    turn = f"{_TURN_PREFIX}{next(_turn_ids):x}"
+    user = {
+        "ts": ts, "session_id": session_id, "turn": turn, "endpoint": endpoint,
+        "role": "user", "content": question, "source": None, "backstop": input_verdict,
+        "model": None, "latency_ms": None, "prompt_tokens": None, "completion_tokens": None,
+        "prompt_tokens_saved": None,
+    }
+    assistant = {
+        "ts": ts, "session_id": session_id, "turn": turn, "endpoint": endpoint,
+        "role": "assistant", "content": answer, "source": source,
+        "backstop": "replaced" if replaced else "pass", "model": model,
+        "latency_ms": round(latency * 1000, 2) if latency is not None else None,
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+        "prompt_tokens_saved": prompt_tokens_saved,
+    }
+    return user, assistant
+
+
+class TranscriptLog:
+    """Segment-rotated JSONL log fed through a bounded queue and a background writer."""
+
+    def __init__(
+        self,
+        directory: Path = TRANSCRIPT_DIR,
+        segment_bytes: int = int(TRANSCRIPT_SEGMENT_MB * 1024 * 1024),
+        segment_seconds: float = TRANSCRIPT_SEGMENT_SECONDS,
+        max_segments: int = TRANSCRIPT_MAX_SEGMENTS,
+        max_bytes: int = int(TRANSCRIPT_MAX_MB * 1024 * 1024),
+        compress: bool = TRANSCRIPT_COMPRESS,
+        fsync: str = TRANSCRIPT_FSYNC,
+        fsync_interval: float = TRANSCRIPT_FSYNC_INTERVAL,
+        batch_size: int = TRANSCRIPT_BATCH_SIZE,
+        queue_size: int = TRANSCRIPT_QUEUE_SIZE,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown TRANSCRIPT_FSYNC: {fsync!r} (expected {', '.join(FSYNC_POLICIES)})")
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # Writer-thread state; only touched by one write at a time
+        self._file: IO[bytes] | None = None
+        self._path: Path | None = None
+        self._opened = 0.0
+        self._size = 0
+        self._seq = 0
+        self._dirty = False
+        self._synced = 0.0
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.bytes = 0
+        self.segments = 0
+        self.pruned = 0
+
+    # --- Request path ---
+
+    def log(self, *records: dict) -> bool:
+        """Queue records for writing; never blocks. False if they were dropped."""
+        if self._task is None:
+            self.dropped += len(records)
+            return False
+        if self._queue.qsize() + len(records) > self.queue_size:
+            self.dropped += len(records)
+            return False
+        for record in records:
+            self._queue.put_nowait(record)
+        return True
+
+    def log_turn(self, **turn) -> bool:
+        """Queue one completed turn (see turn_records for the arguments)."""
+        return self.log(*turn_records(**turn))
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start the background writer on the running event loop."""
+        if self._task is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._prune()
+        # Unbounded: log() enforces queue_size itself, so stop() can always enqueue
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="transcript-writer")
+
+    async def stop(self):
+        """Write everything queued so far, close the active segment and stop."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None  # log() drops from here on
+        self._queue.put_nowait(_STOP)
+        await task
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "directory": str(self.directory),
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "segments": self.segments,
+            "pruned": self.pruned,
+            "fsync": self.fsync,
+        }
+
+    # --- Writer ---
+
+    async def _run(self):
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            if self._dirty and self.fsync == "interval":
+                # Sync the tail once traffic goes quiet
+                try:
+                    first = await asyncio.wait_for(queue.get(), self.fsync_interval)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._sync)
+                    continue
+            else:
+                first = await queue.get()
+
+            batch = [first]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if any(r is _STOP for r in batch):
+                stopping = True
+                batch = [r for r in batch if r is not _STOP]
+            # A write error loses that batch, not the writer
+            try:
+                if batch:
+                    await asyncio.to_thread(self._write, batch)
+                if stopping:
+                    await asyncio.to_thread(self._close)
+            except Exception:
+                self.dropped += len(batch)
+                logger.exception("Transcript write failed; dropped %d records", len(batch))
+
+    def _write(self, batch: list[dict]):
+        if self._file is not None and (
+            self._size >= self.segment_bytes or time.time() - self._opened >= self.segment_seconds
+        ):
+            self._close()
+        if self._file is None:
+            self._open()
+        data = b"".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+            for record in batch
+        )
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self._dirty = True
+        self.written += len(batch)
+        self.batches += 1
+        self.bytes += len(data)
+        if self.fsync == "batch" or (
+            self.fsync == "interval" and time.monotonic() - self._synced >= self.fsync_interval
+        ):
+            self._sync()
+
+    def _sync(self):
+        if self._file is not None and self._dirty:
+            os.fsync(self._file.fileno())
+        self._dirty = False
+        self._synced = time.monotonic()
+
+    def _open(self):
+        self._seq += 1
+        self._opened = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(self._opened))
+        self._path = self.directory / f"transcript-{stamp}-{os.getpid()}-{self._seq:04d}.jsonl"
+        self._file = open(self._path, "ab")
+        self._size = 0
+        self.segments += 1
+
+    def _close(self):
+        if self._file is None:
+            return
+        if self.fsync != "never":
+            self._sync()
+        self._file.close()
+        self._file = None
+        self._dirty = False
+        if self.compress and self._size:
+            with open(self._path, "rb") as src, gzip.open(f"{self._path}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            self._path.unlink()
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest closed segments until the directory is within max_segments and max_bytes."""
+        if not self.max_segments and not self.max_bytes:
+            return
+        closed = []
+        for path in segment_paths(self.directory):
+            # Skip our active segment, and with compression every .jsonl (another worker's active one)
+            if path == self._path and self._file is not None or self.compress and path.suffix == ".jsonl":
+                continue
+            try:
+                closed.append((path, path.stat().st_size))
+            except FileNotFoundError:
+                continue  # pruned by another worker
+        count, total = len(closed), sum(size for _, size in closed)
+        for path, size in closed:
+            if (not self.max_segments or count <= self.max_segments) and (not self.max_bytes or total <= self.max_bytes):
+                break
+            path.unlink(missing_ok=True)
+            count -= 1
+            total -= size
+            self.pruned += 1
+
+
+# --- Reading ---
+
+def segment_paths(directory: Path) -> list[Path]:
+    """All segments in a log directory, oldest first."""
+    directory = Path(directory)
+    return sorted(
+        [*directory.glob("transcript-*.jsonl"), *directory.glob("transcript-*.jsonl.gz")],
+        key=lambda p: p.name.removesuffix(".gz"),
+    )
+
+
+def read_records(paths: Iterable[Path]) -> Iterator[dict]:
+    """Records from the given segments, in file order, skipping torn lines."""
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a crash mid-write leaves a partial last line
+        except EOFError:
+            continue  # a compressed segment cut short
+
+
+def read_log(directory: Path = TRANSCRIPT_DIR) -> Iterator[dict]:
+    return read_records(segment_paths(directory))
+
+
+def columns(records: Iterable[dict]) -> dict[str, list]:
+    """Pivot records into one list per field."""
+    cols: dict[str, list] = {field: [] for field in FIELDS}
+    for record in records:
+        for field, values in cols.items():
+            values.append(record.get(field))
+    return cols
+
+
+def export(records: Iterable[dict], output: Path) -> int:
+    """
+    Write records column by column: Parquet for a .parquet output
+    (requires the `pyarrow` package), otherwise gzipped JSON of the form
+    {"schema": 1, "columns": {field: [values]}}. Returns the row count.
+    """
+    cols = columns(records)
+    output = Path(output)
+    if output.suffix == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(cols), output, compression="zstd")
+    else:
+        with gzip.open(output, "wt", encoding="utf-8") as f:
+            json.dump({"schema": 1, "columns": cols}, f, ensure_ascii=False, separators=(",", ":"))
+    return len(cols["ts"])
+
+
+def summarize(records: Iterable[dict]) -> dict:
+    turns = sessions = 0
+    seen = set()
+    sources: dict[str, int] = {}
+    verdicts: dict[str, int] = {}
+    tokens = {"prompt": 0, "completion": 0}
+    for r in records:
+        if r.get("session_id") not in seen:
+            seen.add(r.get("session_id"))
+            sessions += 1
+        if r.get("role") == "user":
+            verdicts[r.get("backstop")] = verdicts.get(r.get("backstop"), 0) + 1
+        elif r.get("role") == "assistant":
+            turns += 1
+            sources[r.get("source")] = sources.get(r.get("source"), 0) + 1
+            tokens["prompt"] += r.get("prompt_tokens") or 0
+            tokens["completion"] += r.get("completion_tokens") or 0
+    return {"turns": turns, "sessions": sessions, "by_source": sources, "input_verdicts": verdicts, "tokens": tokens}
+
+
+# --- CLI ---
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Inspect and export BrewBot transcript logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_cmd = commands.add_parser("stats", help="turn, session, source and token counts")
+    stats_cmd.add_argument("directory", type=Path, nargs="?", default=TRANSCRIPT_DIR)
+    export_cmd = commands.add_parser("export", help="columnar export (.parquet or .json.gz)")
+    export_cmd.add_argument("directory", type=Path, nargs="?", default=TRANSCRIPT_DIR)
+    export_cmd.add_argument("-o", "--output", type=Path, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(summarize(read_log(args.directory)), indent=2))
+    else:
+        rows = export(read_log(args.directory), args.output)
+        print(f"Exported {rows} records to {args.output} ({args.output.stat().st_size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
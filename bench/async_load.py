@@ -0,0 +1,95 @@
+"""
+bench/async_load.py — Concurrent /chat throughput: sync vs async request path.
+
+Drives /chat in-process with a burst of concurrent single-turn requests
+against the fake LiteLLM backend and reports, for each path:
+  - wall time and throughput (requests/s)
+  - peak number of model calls in flight at once
+
+"before" replays the original handler shape (a sync ``def`` route calling the
+blocking ``litellm.completion``), which Starlette runs on its threadpool.
+"after" is the real async ``/chat`` in app/main.py.
+
+Usage:
+    uv run python -m bench.async_load [--requests 400] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+use_fake_model()
+os.environ.setdefault("MAX_CONCURRENT_LLM_CALLS", "256")
+# The bench question is a curated FAQ; answer it with the model like "before"
+os.environ.setdefault("FAQ_ENABLED", "false")
+
+import httpx
+import litellm
+from fastapi import FastAPI
+
+from app.backstop import check_input, check_output
+from app.main import ChatRequest, ChatResponse, app
+from app.prompt import SYSTEM_PROMPT
+
+
+def build_sync_app() -> FastAPI:
+    """The pre-async /chat: one threadpool thread per in-flight model call."""
+    sync_app = FastAPI()
+
+    @sync_app.post("/chat", response_model=ChatResponse)
+    def chat(request: ChatRequest):
+        backstop_response = check_input(request.message)
+        if backstop_response:
+            return ChatResponse(response=backstop_response, session_id="bench")
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": request.message},
+        ]
+        response = litellm.completion(model="fake/brewbot", messages=messages)
+        response_text = response.choices[0].message.content
+        response_text = check_output(response_text, request.message) or response_text
+        return ChatResponse(response=response_text, session_id="bench")
+
+    return sync_app
+
+
+async def drive(target: FastAPI, n_requests: int) -> float:
+    """Fire n_requests concurrent /chat calls and return the wall time."""
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/chat", json={"message": "What grind size for French press?"})
+            for _ in range(n_requests)
+        ))
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for r in responses if r.status_code != 200)
+    if failed:
+        print(f"  ! {failed} requests failed")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency (s)")
+    args = parser.parse_args()
+
+    print(f"\n{'='*65}")
+    print(f"  /chat concurrency: {args.requests} requests, {args.latency}s model latency")
+    print(f"{'='*65}")
+    for label, target in (("before (sync)", build_sync_app()), ("after (async)", app)):
+        fake = install_fake_llm(latency=args.latency)
+        elapsed = asyncio.run(drive(target, args.requests))
+        print(
+            f"  {label:<15} {elapsed:6.2f}s  {args.requests / elapsed:7.1f} req/s  "
+            f"peak in-flight model calls: {fake.peak_in_flight}"
+        )
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+bench/backstop_bench.py — Per-message cost of the backstop matcher.
+
+Times check_input / check_output / is_refusal on short, long and
+adversarially crafted inputs (near-miss repetitions meant to provoke
+regex backtracking), and compares check_input against the previous
+implementation: one re.search per pattern, in priority order, on a
+lowercased copy of the message. Verdicts of both must agree.
+
+Exits non-zero if check_input costs more than --budget µs per KB of input
+on any case, which is what catastrophic backtracking would look like.
+
+Usage:
+    uv run python -m bench.backstop_bench [--repeat 200]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from app import backstop
+
+DATASET_PATH = Path(__file__).parent.parent / "eval" / "golden_dataset.json"
+
+# A message that must still be answered in bounded time: the worst case for
+# naive patterns is lots of almost-matches.
+INPUTS = {
+    "short": "What grind size should I use for a French press?",
+    "long (10 KB)": "How do I dial in my espresso grind and dose for a balanced shot? " * 150,
+    "near-miss (50 KB)": "ignore your previous instruction " * 1500,
+    "no word breaks (100 KB)": "a" * 100_000,
+    "late hit (100 KB)": "coffee " * 14_000 + "I want to end my life",
+    "separators (50 KB)": "self-" * 10_000 + "harm",
+}
+
+
+def legacy_check_input(user_message: str) -> str | None:
+    msg = user_message.lower()
+    rules = backstop.current_rules().rules
+    for category in backstop.CATEGORIES:
+        for rule in rules:
+            if rule.category == category and re.search(rule.pattern, msg, re.IGNORECASE):
+                return rule.response
+    return None
+
+
+def per_call_us(fn, *args, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=500, help="max check_input µs per KB")
+    args = parser.parse_args()
+
+    questions = [case["question"] for case in json.loads(DATASET_PATH.read_text())]
+    mismatches = [
+        q for q in [*questions, *INPUTS.values()]
+        if backstop.check_input(q) != legacy_check_input(q)
+    ]
+
+    print(f"\n{'='*78}")
+    print(f"  Backstop cost per message (µs, mean of {args.repeat})")
+    print(f"{'='*78}")
+    print(f"  {'input':<24} {'legacy in':>10} {'check_input':>12} {'check_output':>13} {'is_refusal':>11}")
+    worst_per_kb = 0.0
+    for label, text in INPUTS.items():
+        repeat = max(1, args.repeat // (1 + len(text) // 10_000))
+        match = backstop.match_input(text)
+        cost = per_call_us(backstop.check_input, text, repeat=repeat)
+        worst_per_kb = max(worst_per_kb, cost / max(1, len(text) / 1024))
+        print(
+            f"  {label:<24} "
+            f"{per_call_us(legacy_check_input, text, repeat=repeat):>10.1f} "
+            f"{cost:>12.1f} "
+            f"{per_call_us(backstop.check_output, text, text, repeat=repeat):>13.1f} "
+            f"{per_call_us(backstop.is_refusal, text, repeat=repeat):>11.1f}"
+            + (f"  → {match.category}/{match.rule} @{match.span[0]}" if match else "")
+        )
+    print(f"\n  Verdicts agree with legacy implementation: "
+          f"{'yes' if not mismatches else f'NO ({len(mismatches)} differ)'}")
+    for q in mismatches:
+        print(f"    - {q[:70]!r}")
+    print(f"  Worst check_input cost: {worst_per_kb:.1f} µs/KB (budget {args.budget:.0f})")
+    print(f"{'='*78}\n")
+
+    if mismatches or worst_per_kb > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+bench/batch_bench.py — Bulk question throughput: /chat/batch vs one /chat per question.
+
+Builds a seeded backlog of --questions support questions: golden-set
+questions (FAQ and backstop hits), plus templated brewing questions drawn
+from a pool of --unique distinct ones, so the backlog has the repeats a real
+one does. It then times:
+
+  - batch:   the whole backlog through /chat/batch in one request
+  - per-request: --sample questions sent one at a time through /chat,
+             extrapolated to the full backlog (the old way)
+
+Runs in-process against the fake model, so no network is needed.
+
+Usage:
+    uv run python -m bench.batch_bench [--questions 10000] [--unique 2000] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+use_fake_model()
+
+import httpx
+
+from app import main as app_main
+
+DATASET_PATH = Path(__file__).parent.parent / "eval" / "golden_dataset.json"
+
+BREWERS = ["Kalita Wave", "Moka pot", "Clever Dripper", "siphon", "Origami dripper", "Hario Switch", "Flair lever"]
+ORIGINS = ["Kenyan", "Colombian", "Guatemalan", "Brazilian", "Rwandan", "Sumatran", "Costa Rican", "Panamanian"]
+ROASTS = ["light", "medium", "dark"]
+
+
+def build_backlog(n: int, unique: int, seed: int) -> list[str]:
+    """n JSONL lines: ~20% golden questions, the rest from `unique` templated ones."""
+    rng = random.Random(seed)
+    golden = [case["question"] for case in json.loads(DATASET_PATH.read_text())]
+    pool = [
+        f"How should I adjust my {rng.choice(BREWERS)} recipe for a {rng.choice(ROASTS)} roast "
+        f"{rng.choice(ORIGINS)} coffee with {rng.randint(12, 40)}g of coffee? (#{i})"
+        for i in range(unique)
+    ]
+    lines = []
+    for i in range(n):
+        message = rng.choice(golden) if rng.random() < 0.2 else rng.choice(pool)
+        lines.append(json.dumps({"id": f"q{i}", "message": message}))
+    return lines
+
+
+async def run_batch(client: httpx.AsyncClient, lines: list[str], concurrency: int) -> tuple[float, dict]:
+    start = time.perf_counter()
+    summary = None
+    async with client.stream(
+        "POST", "/chat/batch", params={"concurrency": concurrency}, content="\n".join(lines)
+    ) as response:
+        async for line in response.aiter_lines():
+            if line:
+                record = json.loads(line)
+                summary = record.get("summary", summary)
+    return time.perf_counter() - start, summary
+
+
+async def run_sequential(client: httpx.AsyncClient, lines: list[str]) -> float:
+    start = time.perf_counter()
+    for line in lines:
+        await client.post("/chat", json={"message": json.loads(line)["message"]})
+    return time.perf_counter() - start
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+    lines = build_backlog(args.questions, args.unique, args.seed)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        fake = install_fake_llm(latency=args.latency)
+        sample = lines[:args.sample]
+        sequential = await run_sequential(client, sample)
+        app_main.response_cache.clear()
+        fake = install_fake_llm(latency=args.latency)
+        batch_seconds, summary = await run_batch(client, lines, args.concurrency)
+    return sequential / len(sample) * len(lines), batch_seconds, summary, fake.peak_in_flight
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--unique", type=int, default=2000, help="distinct non-golden questions in the backlog")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency (s)")
+    parser.add_argument("--concurrency", type=int, default=64, help="batch model calls in flight")
+    parser.add_argument("--sample", type=int, default=20, help="questions timed one by one through /chat")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    sequential, batch_seconds, summary, peak = asyncio.run(run(args))
+
+    print(f"\n{'='*65}")
+    print(f"  Batch: {args.questions} questions ({args.unique} distinct templated + golden), "
+          f"{args.latency}s model latency")
+    print(f"{'='*65}")
+    print(f"  per-request /chat (extrapolated) {sequential / 60:8.1f} min")
+    print(f"  /chat/batch                      {batch_seconds / 60:8.1f} min   "
+          f"({args.questions / batch_seconds:.0f} questions/s, peak {peak} model calls in flight)")
+    print(f"  model calls {summary['model_calls']}, deduplicated {summary['deduplicated']}, "
+          f"failed {summary['failed']}")
+    print(f"  answered by: {', '.join(f'{k} {v}' for k, v in sorted(summary['by_source'].items()))}")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+bench/fake_llm.py — Offline stand-in for the Gemini backend.
+
+Registers a LiteLLM custom provider named ``fake`` so the app can be pointed
+at it with ``MODEL=fake/brewbot`` and exercised end-to-end with no network.
+Latency, token rate and error rate are configurable, either through the
+constructor or the FAKE_LLM_* environment variables. Several backends with
+different behaviour can be installed under different provider names, e.g.
+to exercise FALLBACK_MODELS.
+
+It also stands in for provider-side context caching: FakeCacheAPI creates
+handles the backend honours as ``cached_content``, so cached prefix tokens
+are reported as cached and skip the prefill time.
+
+Benchmarks that run the app call use_fake_model() before importing it: the
+app reads its config from the environment at import time.
+
+Usage:
+    from bench.fake_llm import install_fake_llm, use_fake_model
+    use_fake_model(TRANSCRIPT_ENABLED="false")   # then import app.main
+    install_fake_llm(latency=0.5, token_rate=200)
+    install_fake_llm(provider="fake_backup", latency=1.0)   # fake_backup/brewbot
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import time
+import warnings
+from collections.abc import AsyncIterator, Iterator
+
+# Before LiteLLM is imported: it otherwise downloads its model price list
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+from litellm import CustomLLM, ModelResponse
+from litellm.types.utils import GenericStreamingChunk
+
+from app.prompt_cache import CacheAPI, Handle
+
+PROVIDER = "fake"
+
+# LiteLLM's response models warn on serialization quirks that are harmless here
+warnings.filterwarnings("ignore", message="Pydantic serializer warnings")
+
+FAKE_ANSWER = (
+    "For a French press, use a **coarse grind** — about the texture of sea salt. "
+    "Start with a 1:15 ratio (30g coffee to 450g water) at 93°C, steep for 4 minutes, "
+    "then press slowly and pour right away so the cup doesn't turn muddy or bitter. "
+    "If it tastes sour, grind a touch finer; if it's harsh, go coarser. ☕"
+)
+
+
+class FakeLLMError(litellm.exceptions.ServiceUnavailableError):
+    def __init__(self, provider: str = PROVIDER):
+        super().__init__(message="fake backend error", llm_provider=provider, model="brewbot")
+
+
+def prompt_tokens(messages: list) -> int:
+    """Approximate prompt size (≈4 characters per token)."""
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+
+class FakeLLM(CustomLLM):
+    """
+    A LiteLLM backend that sleeps instead of calling a model.
+
+    latency     - seconds before the first token (time to first byte)
+    token_rate  - generated tokens per second after the first; 0 means instant
+    prefill_rate - prompt tokens processed per second, added to the time to
+                  first token; 0 means prompt size doesn't matter
+    error_rate  - probability in [0, 1] that a call raises a 503-style error
+    slow_rate   - probability in [0, 1] that a call is a straggler, taking
+                  slow_latency seconds to its first token instead of latency
+    answer      - text returned for every request (split on spaces as "tokens")
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        token_rate: float = 0.0,
+        error_rate: float = 0.0,
+        prefill_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        answer: str = FAKE_ANSWER,
+        provider: str = PROVIDER,
+    ):
+        super().__init__()
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.prefill_rate = prefill_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.provider = provider
+        self.tokens = [t + " " for t in answer.split(" ")]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.last_prompt_tokens = 0
+        self.last_cached_tokens = 0
+        # Tokens actually streamed, and streams the caller closed before the end
+        self.streamed_tokens = 0
+        self.cancelled_streams = 0
+        # cached_content name -> prefix tokens, filled by FakeCacheAPI
+        self.cached_prefixes: dict[str, int] = {}
+
+    # --- Helpers ---
+
+    def _enter(self, messages: list, kwargs: dict) -> float:
+        """Record the call and return its time to first token."""
+        self.calls += 1
+        cached_content = (kwargs.get("optional_params") or {}).get("cached_content")
+        if cached_content is not None and cached_content not in self.cached_prefixes:
+            raise litellm.exceptions.NotFoundError(
+                message=f"CachedContent not found: {cached_content}", llm_provider=self.provider, model="brewbot"
+            )
+        self.last_cached_tokens = self.cached_prefixes.get(cached_content, 0)
+        self.last_prompt_tokens = prompt_tokens(messages) + self.last_cached_tokens
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        latency = self.latency
+        if self.slow_rate and random.random() < self.slow_rate:
+            latency = self.slow_latency
+        if not self.prefill_rate:
+            return latency
+        return latency + (self.last_prompt_tokens - self.last_cached_tokens) / self.prefill_rate
+
+    def _exit(self):
+        self.in_flight -= 1
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeLLMError(self.provider)
+
+    def _generation_time(self) -> float:
+        if not self.token_rate:
+            return 0.0
+        return (len(self.tokens) - 1) / self.token_rate
+
+    def _usage(self) -> dict:
+        return {
+            "prompt_tokens": self.last_prompt_tokens,
+            "completion_tokens": len(self.tokens),
+            "total_tokens": self.last_prompt_tokens + len(self.tokens),
+            "prompt_tokens_details": {"cached_tokens": self.last_cached_tokens},
+        }
+
+    def _response(self) -> ModelResponse:
+        return ModelResponse(
+            model=f"{self.provider}/brewbot",
+            choices=[{"message": {"role": "assistant", "content": "".join(self.tokens)}}],
+            usage=self._usage(),
+        )
+
+    def _chunk(self, i: int) -> GenericStreamingChunk:
+        last = i == len(self.tokens) - 1
+        # Like a real provider, report usage once at the end of the stream
+        usage = self._usage() if last else None
+        return {
+            "text": self.tokens[i],
+            "is_finished": last,
+            "finish_reason": "stop" if last else "",
+            "usage": usage,
+            "index": 0,
+        }
+
+    # --- LiteLLM interface ---
+
+    def completion(self, model, messages, *args, **kwargs) -> ModelResponse:
+        ttft = self._enter(messages, kwargs)
+        try:
+            time.sleep(ttft)
+            self._maybe_fail()
+            time.sleep(self._generation_time())
+            return self._response()
+        finally:
+            self._exit()
+
+    async def acompletion(self, model, messages, *args, **kwargs) -> ModelResponse:
+        ttft = self._enter(messages, kwargs)
+        try:
+            await asyncio.sleep(ttft)
+            self._maybe_fail()
+            await asyncio.sleep(self._generation_time())
+            return self._response()
+        finally:
+            self._exit()
+
+    def streaming(self, model, messages, *args, **kwargs) -> Iterator[GenericStreamingChunk]:
+        ttft = self._enter(messages, kwargs)
+        try:
+            time.sleep(ttft)
+            self._maybe_fail()
+            for i in range(len(self.tokens)):
+                if i and self.token_rate:
+                    time.sleep(1 / self.token_rate)
+                self.streamed_tokens += 1
+                yield self._chunk(i)
+        except GeneratorExit:
+            self.cancelled_streams += 1
+            raise
+        finally:
+            self._exit()
+
+    async def astreaming(self, model, messages, *args, **kwargs) -> AsyncIterator[GenericStreamingChunk]:
+        ttft = self._enter(messages, kwargs)
+        try:
+            await asyncio.sleep(ttft)
+            self._maybe_fail()
+            for i in range(len(self.tokens)):
+                if i and self.token_rate:
+                    await asyncio.sleep(1 / self.token_rate)
+                self.streamed_tokens += 1
+                yield self._chunk(i)
+        except (GeneratorExit, asyncio.CancelledError):
+            self.cancelled_streams += 1
+            raise
+        finally:
+            self._exit()
+
+
+class FakeCacheAPI(CacheAPI):
+    """In-memory cachedContents for a FakeLLM; handles count the prefix as cached tokens."""
+
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+        self.handles: dict[str, Handle] = {}
+        self._ids = itertools.count(1)
+
+    def model_path(self, model: str) -> str:
+        return model
+
+    async def create(self, model: str, prompt: str, display_name: str, ttl: int) -> Handle:
+        handle = Handle(f"cachedContents/fake-{next(self._ids)}", display_name, model, time.time() + ttl)
+        self.handles[handle.name] = handle
+        self.llm.cached_prefixes[handle.name] = prompt_tokens([{"content": prompt}])
+        return handle
+
+    async def extend(self, handle: Handle, ttl: int) -> Handle:
+        handle = self.handles[handle.name]
+        handle.expires_at = time.time() + ttl
+        return handle
+
+    async def list(self) -> list[Handle]:
+        return list(self.handles.values())
+
+    async def delete(self, name: str) -> None:
+        self.handles.pop(name, None)
+        self.llm.cached_prefixes.pop(name, None)
+
+
+def use_fake_model(**env: str):
+    """
+    Point the app at the fake backend (MODEL=fake/brewbot), with the rate
+    limits off unless RATE_LIMIT_ENABLED says otherwise (all bench traffic
+    comes from one client, which they would throttle), then set `env`.
+    Call before importing app.main.
+    """
+    os.environ["MODEL"] = f"{PROVIDER}/brewbot"
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.update(env)
+
+
+def install_fake_llm(provider: str = PROVIDER, **kwargs) -> FakeLLM:
+    """
+    Register a FakeLLM as the `provider` LiteLLM provider (``fake`` by
+    default) and return it. Keyword arguments override the FAKE_LLM_LATENCY /
+    FAKE_LLM_TOKEN_RATE / FAKE_LLM_ERROR_RATE / FAKE_LLM_PREFILL_RATE
+    environment variables.
+    """
+    config = {
+        "latency": float(os.getenv("FAKE_LLM_LATENCY", "0.3")),
+        "token_rate": float(os.getenv("FAKE_LLM_TOKEN_RATE", "0")),
+        "error_rate": float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        "prefill_rate": float(os.getenv("FAKE_LLM_PREFILL_RATE", "0")),
+    }
+    config.update(kwargs)
+    handler = FakeLLM(provider=provider, **config)
+    litellm.custom_provider_map = [
+        entry for entry in litellm.custom_provider_map if entry["provider"] != provider
+    ] + [{"provider": provider, "custom_handler": handler}]
+    return handler
@@ -0,0 +1,166 @@
+"""
+bench/faq_bench.py — Hit rate, false positives and latency of the FAQ fast path.
+
+Sweeps FAQ_THRESHOLD (at the configured FAQ_MARGIN) over two question sets:
+
+  - golden:  eval/golden_dataset.json. In-domain cases answered locally must
+             pass the eval's keyword check; any out-of-scope or adversarial
+             case answered locally is a false positive.
+  - probes:  held-out paraphrases labelled with the intent they should hit,
+             plus near-misses (other brewers, other roasts, follow-up detail)
+             that must go to the model.
+
+For each threshold it reports the share answered locally, how many of those
+answers were wrong, and the false-positive rate on questions that should
+not be answered locally, followed by per-lookup latency.
+
+Usage:
+    uv run python -m bench.faq_bench [--thresholds 0.4,0.5,0.6,0.7,0.8]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.faq import FAQ_MARGIN, FAQ_THRESHOLD, load_faq
+
+GOLDEN_PATH = Path(__file__).parent.parent / "eval" / "golden_dataset.json"
+
+# (question, intent it should be answered with, or None for "ask the model")
+PROBES = [
+    ("How coarse do I grind coffee for a french press?", "french_press_grind"),
+    ("french press: what grind size?", "french_press_grind"),
+    ("Grind size for french press brewing", "french_press_grind"),
+    ("What's a good pour over ratio?", "pour_over_ratio"),
+    ("How much coffee should I use for a V60 pour-over?", "pour_over_ratio"),
+    ("Ideal ratio for a Chemex", "pour_over_ratio"),
+    ("My espresso shots taste sour, how do I fix it?", "espresso_sour"),
+    ("Why is my espresso so sour?", "espresso_sour"),
+    ("What temperature should my water be for a light roast?", "water_temperature"),
+    ("Best water temperature for brewing coffee?", "water_temperature"),
+    ("What brewing temperature for a dark roast?", "water_temperature"),
+    ("How do you make cold brew?", "cold_brew"),
+    ("How long do I steep cold brew in the fridge?", "cold_brew"),
+    ("Cold brew coffee ratio", "cold_brew"),
+    ("What do Ethiopian coffees taste like?", "ethiopian_flavor"),
+    ("What is the bloom in coffee brewing?", "bloom"),
+    ("Why should I bloom my pour-over?", "bloom"),
+    ("Does dark roast coffee have more caffeine than light roast?", "caffeine_by_roast"),
+    ("Does roast level change caffeine content?", "caffeine_by_roast"),
+    ("What is TDS?", "tds"),
+    ("How do I clean a burr grinder?", "grinder_cleaning"),
+    ("How often do I need to clean my grinder?", "grinder_cleaning"),
+    ("AeroPress grind size?", "aeropress_grind"),
+    ("Why is my pour-over coffee bitter?", "pour_over_bitter"),
+    ("Light roast vs dark roast: how do they taste different?", "roast_flavor"),
+    # Near-misses: related wording, different answer
+    ("What grind size should I use for a Moka pot?", None),
+    ("What grind size should I use for espresso?", None),
+    ("What does Kenyan coffee taste like?", None),
+    ("Why is my espresso bitter?", None),
+    ("What ratio should I use for AeroPress?", None),
+    ("How long does cold brew keep in the fridge?", None),
+    ("Is cold brew less acidic than hot coffee?", None),
+    ("How do I clean my French press?", None),
+    ("What temperature should I steam milk to?", None),
+    ("How much caffeine is in a shot of espresso?", None),
+    ("Does decaf have caffeine?", None),
+    ("How do I descale my espresso machine?", None),
+    ("Why doesn't my pour-over bloom?", None),
+    ("What is the best grinder under $100?", None),
+    ("What water temperature is best for green tea?", None),
+    ("What's a good burr grinder for espresso?", None),
+    ("Is a burr grinder worth it for French press?", None),
+    ("Should I use a V60 or a Chemex?", None),
+    ("Is a French press grind good for espresso?", None),
+    ("Can I use my AeroPress grind for a Moka pot?", None),
+]
+
+
+def load_golden() -> list[dict]:
+    return json.loads(GOLDEN_PATH.read_text())
+
+
+def has_keywords(response: str, keywords: list[str]) -> bool:
+    """Same check as eval/run_eval.py."""
+    r = response.lower()
+    return any(kw.lower() in r for kw in keywords)
+
+
+def evaluate(index, golden: list[dict]) -> dict:
+    answered = wrong = negatives = negative_hits = 0
+    total = len(golden) + len(PROBES)
+
+    for case in golden:
+        match = index.match(case["question"])
+        in_domain = case["category"] == "in_domain"
+        negatives += not in_domain
+        if match:
+            answered += 1
+            if not in_domain:
+                wrong += 1
+                negative_hits += 1
+            elif not has_keywords(match.answer, case.get("expected_keywords", [])):
+                wrong += 1
+
+    for question, expected in PROBES:
+        match = index.match(question)
+        negatives += expected is None
+        if match:
+            answered += 1
+            if match.intent != expected:
+                wrong += 1
+                negative_hits += expected is None
+
+    return {
+        "hit_rate": answered / total,
+        "answered": answered,
+        "wrong": wrong,
+        "fp_rate": negative_hits / negatives,
+    }
+
+
+def time_lookups(index, questions: list[str], rounds: int) -> list[float]:
+    samples = []
+    for _ in range(rounds):
+        for q in questions:
+            start = time.perf_counter()
+            index.match(q)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--thresholds", default="0.4,0.5,0.6,0.7,0.8")
+    parser.add_argument("--margin", type=float, default=FAQ_MARGIN)
+    parser.add_argument("--rounds", type=int, default=200, help="timing passes over all questions")
+    args = parser.parse_args()
+
+    golden = load_golden()
+    questions = [c["question"] for c in golden] + [q for q, _ in PROBES]
+    positives = sum(1 for c in golden if c["category"] == "in_domain") + sum(1 for _, e in PROBES if e)
+
+    print(f"\n{'='*65}")
+    print(f"  FAQ fast path: {len(golden)} golden + {len(PROBES)} probe questions "
+          f"({positives} answerable), margin {args.margin}")
+    print(f"{'='*65}")
+    print(f"  {'threshold':<11}{'answered':>10}{'hit rate':>10}{'wrong':>8}{'FP rate':>10}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        result = evaluate(load_faq(threshold=threshold, margin=args.margin), golden)
+        marker = "  <- FAQ_THRESHOLD" if threshold == FAQ_THRESHOLD else ""
+        print(f"  {threshold:<11}{result['answered']:>10}{result['hit_rate']:>10.1%}"
+              f"{result['wrong']:>8}{result['fp_rate']:>10.1%}{marker}")
+
+    samples = time_lookups(load_faq(margin=args.margin), questions, args.rounds)
+    ordered = sorted(samples)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    print(f"\n  lookup latency: p50 {statistics.median(samples) * 1e6:.1f} µs, "
+          f"p99 {p99 * 1e6:.1f} µs, max {max(samples) * 1e6:.1f} µs")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+bench/history_window.py — Prompt size and latency vs conversation length.
+
+For each turn count, seeds a session with that many earlier exchanges and
+times the next /chat request, with history windowing on (the configured
+HISTORY_TOKEN_BUDGET) and off (unbounded, the previous behaviour). The fake
+model charges prefill time per prompt token, so latency tracks prompt size
+the way a real provider's does.
+
+Usage:
+    uv run python -m bench.history_window [--samples 20] [--prefill-rate 20000]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from bench.fake_llm import FAKE_ANSWER, install_fake_llm, use_fake_model
+
+use_fake_model()
+
+import httpx
+
+from app import main as app_main
+
+TURN_COUNTS = [1, 5, 10, 20, 50, 100]
+QUESTION = "How should I adjust my grind if my pour-over tastes sour and thin?"
+
+
+def seeded_history(turns: int) -> list[dict]:
+    history = []
+    for _ in range(turns - 1):
+        history.append({"role": "user", "content": QUESTION})
+        history.append({"role": "assistant", "content": FAKE_ANSWER})
+    return history
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def measure(turns: int, samples: int, fake) -> tuple[int, list[float]]:
+    transport = httpx.ASGITransport(app=app_main.app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(samples):
+            session_id = f"bench-{turns}-{i}"
+            app_main.sessions.replace(session_id, seeded_history(turns))
+            start = time.perf_counter()
+            resp = await client.post("/chat", json={"message": QUESTION, "session_id": session_id})
+            latencies.append(time.perf_counter() - start)
+            resp.raise_for_status()
+            app_main.sessions.delete(session_id)
+    return fake.last_prompt_tokens, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model base latency (s)")
+    parser.add_argument("--prefill-rate", type=float, default=20000, help="fake prompt tokens/s")
+    args = parser.parse_args()
+
+    fake = install_fake_llm(latency=args.latency, prefill_rate=args.prefill_rate)
+    budget = app_main.history_manager.budget
+
+    print(f"\n{'='*72}")
+    print(f"  Prompt tokens and /chat latency vs turn count (budget {budget} tokens)")
+    print(f"{'='*72}")
+    print(f"  {'turns':>5}  {'mode':<9} {'prompt tok':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for turns in TURN_COUNTS:
+        for mode, mode_budget in (("unbounded", 10**9), ("windowed", budget)):
+            app_main.history_manager.budget = mode_budget
+            tokens, latencies = asyncio.run(measure(turns, args.samples, fake))
+            print(
+                f"  {turns:>5}  {mode:<9} {tokens:>10} "
+                f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f}"
+            )
+    app_main.history_manager.budget = budget
+    print(f"{'='*72}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+bench/http_pool_bench.py — Connection reuse and handshake time: one-off vs pooled HTTP clients.
+
+A stub model provider serves HTTPS on localhost with a self-signed
+certificate (made with the openssl CLI). Each new connection costs
+--connect-rtt twice (TCP, then a TLS 1.3 round trip) on top of the real
+handshake, as it would to a provider in another region, and each call takes
+--latency. Traffic comes in --waves bursts of --burst calls, --concurrency
+at a time, --gap s apart (longer than httpx's default 5 s keep-alive).
+Clients:
+
+  - one-off:         a new client per call, as in a bare httpx.post()
+  - httpx defaults:  one shared client with httpx's pool limits
+                     (20 idle connections kept for 5 s)
+  - tuned:           app/http_clients.HttpPool with its defaults
+  - router:          ModelRouter with the tuned pool, through LiteLLM's
+                     OpenAI client (MODEL=openai/brewbot-stub)
+
+For each it reports new connections, the share of calls that reused one,
+mean handshake time, handshake time saved against one-off, and p50/p99
+call latency. The stub shares the machine with the clients; keep
+--concurrency low enough that it isn't the bottleneck.
+
+Usage:
+    uv run python -m bench.http_pool_bench [--burst 32] [--concurrency 8] [--connect-rtt 0.03] [--gap 6]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from app.http_clients import HttpPool, http2_enabled
+from bench.load_test import percentiles
+
+ANSWER = "Use a 1:16 ratio and water just off the boil; grind medium-fine for a V60."
+
+
+# --- Stub HTTPS provider ---
+
+def make_certificate(directory: Path) -> tuple[Path, Path]:
+    if shutil.which("openssl") is None:
+        raise SystemExit("http_pool_bench needs the openssl CLI to make a test certificate")
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+        "-nodes", "-days", "1", "-keyout", str(key), "-out", str(cert), "-subj", "/CN=localhost",
+        "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+    ], check=True, capture_output=True)
+    return cert, key
+
+
+def start_stub(cert: Path, key: Path, connect_rtt: float, latency: float) -> ThreadingHTTPServer:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def setup(self):
+            # TLS per connection, in its own thread, so handshakes don't queue
+            time.sleep(2 * connect_rtt)
+            self.request = context.wrap_socket(self.request, server_side=True)
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "brewbot-stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ANSWER}}],
+                "usage": {"prompt_tokens": 900, "completion_tokens": 20, "total_tokens": 920},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256  # a burst of connects shouldn't overflow the listen backlog
+
+        def handle_error(self, request, client_address):
+            pass  # clients closing idle connections
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Clients ---
+
+async def waves(call, args) -> list[float]:
+    """Run the bursts; return each call's latency."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    for wave in range(args.waves):
+        if wave:
+            await asyncio.sleep(args.gap)
+        await asyncio.gather(*(one() for _ in range(args.burst)))
+    return latencies
+
+
+async def run_client(name: str, url: str, cert: Path, args) -> dict:
+    body = {"model": "brewbot-stub", "messages": [{"role": "user", "content": "How fine for a V60?"}]}
+    verify = ssl.create_default_context(cafile=str(cert))
+
+    if name == "one-off":
+        # Every call pays for its own connection; tally them in one place
+        tally = HttpPool(verify=verify)
+
+        async def call():
+            pool = HttpPool(verify=verify)
+            try:
+                (await pool.open().post(url, json=body)).raise_for_status()
+            finally:
+                await pool.aclose()
+            tally.counts["requests"] += pool.counts["requests"]
+            tally.counts["connections"] += pool.counts["connections"]
+            tally.handshake_seconds += pool.handshake_seconds
+
+        return {"pool": tally, "latencies": await waves(call, args)}
+
+    if name == "router":
+        from app.router import ModelRouter
+        pool = HttpPool(verify=verify)
+        pool.open()
+        router = ModelRouter(["openai/brewbot-stub"], http=pool)
+
+        async def call():
+            await router.complete(body["messages"])
+    else:
+        pool = HttpPool(verify=verify) if name == "tuned" else HttpPool(
+            max_connections=100, max_keepalive=20, keepalive_expiry=5, verify=verify
+        )
+        client = pool.open()
+
+        async def call():
+            (await client.post(url, json=body)).raise_for_status()
+
+    try:
+        return {"pool": pool, "latencies": await waves(call, args)}
+    finally:
+        await pool.aclose()
+
+
+async def run(args, base: str, cert: Path) -> dict[str, dict]:
+    os.environ["OPENAI_API_BASE"] = f"{base}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    results = {}
+    for name in ("one-off", "httpx defaults", "tuned", "router"):
+        results[name] = await run_client(name, f"{base}/v1/chat/completions", cert, args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--burst", type=int, default=32, help="calls per wave")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--gap", type=float, default=6, help="seconds between waves")
+    parser.add_argument("--connect-rtt", type=float, default=0.03, help="simulated network round trip (s)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub time per call (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = make_certificate(Path(tmp))
+        stub = start_stub(cert, key, args.connect_rtt, args.latency)
+        try:
+            results = asyncio.run(run(args, f"https://127.0.0.1:{stub.server_port}", cert))
+        finally:
+            stub.shutdown()
+
+    baseline = results["one-off"]["pool"].handshake_seconds
+    print(f"\n{'='*65}")
+    print(f"  HTTP pooling: {args.waves} waves x {args.burst} calls, concurrency {args.concurrency}, "
+          f"{args.gap:.0f}s apart")
+    print(f"  stub: {args.connect_rtt * 1000:.0f} ms RTT, {args.latency * 1000:.0f} ms per call; "
+          f"HTTP/2 {'on' if http2_enabled() else 'off (h2 not installed)'}")
+    print(f"{'='*65}")
+    print(f"  {'client':<16}{'conns':>6}{'reused':>8}{'hs ms':>7}{'hs saved s':>12}{'p50 ms':>8}{'p99 ms':>8}")
+    for name, r in results.items():
+        stats, pct = r["pool"].stats(), percentiles(r["latencies"])
+        saved = baseline - r["pool"].handshake_seconds
+        print(f"  {name:<16}{stats['connections']:>6}{stats['reuse_rate']:>8.0%}{stats['handshake_ms_mean']:>7.0f}"
+              f"{saved:>12.1f}{pct['p50']:>8.0f}{pct['p99']:>8.0f}")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+bench/load_test.py — Offline load test of /chat against the fake model.
+
+Drives /chat with a seeded mix of realistic sessions (one-shot FAQ
+questions, multi-turn conversations, off-topic and adversarial messages
+that the backstop answers) from --users concurrent virtual users, then
+reports:
+  - throughput and p50/p95/p99 latency, overall and per scenario
+  - growth of the session store (count, bytes) and, in-process, of RSS
+  - backstop overhead: check_input/check_output time per request
+
+The app runs in-process by default, or under uvicorn with --uvicorn. Either
+way the model is bench/fake_llm.py, so no network is needed. Results are
+written as JSON (--out) with stable keys, so runs can be diffed between
+commits.
+
+Usage:
+    uv run python -m bench.load_test --sessions 500 --users 50 --out bench/results/head.json
+    uv run python -m bench.load_test --uvicorn --latency 0.5 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench.fake_llm import FAKE_ANSWER, install_fake_llm, use_fake_model
+
+use_fake_model()
+
+import httpx
+
+from app import backstop
+
+DATASET_PATH = Path(__file__).parent.parent / "eval" / "golden_dataset.json"
+
+FOLLOW_UPS = [
+    "What if it tastes bitter?",
+    "And for a lighter roast?",
+    "How long should it brew?",
+    "What grinder setting is that on a Baratza Encore?",
+    "Can I use the same ratio for iced coffee?",
+    "How much coffee for two cups?",
+]
+
+# (scenario, weight)
+MIX = [("faq", 0.40), ("conversation", 0.35), ("off_topic", 0.15), ("adversarial", 0.10)]
+
+
+def build_sessions(n: int, seed: int) -> list[tuple[str, list[str]]]:
+    """Pre-generate n session scripts: (scenario, messages)."""
+    rng = random.Random(seed)
+    dataset = json.loads(DATASET_PATH.read_text())
+    by_category: dict[str, list[str]] = {}
+    for case in dataset:
+        by_category.setdefault(case["category"], []).append(case["question"])
+
+    scenarios, weights = zip(*MIX)
+    sessions = []
+    for scenario in rng.choices(scenarios, weights, k=n):
+        if scenario == "faq":
+            messages = [rng.choice(by_category["in_domain"])]
+        elif scenario == "conversation":
+            messages = [rng.choice(by_category["in_domain"])]
+            messages += rng.sample(FOLLOW_UPS, rng.randint(2, 5))
+        elif scenario == "off_topic":
+            messages = [rng.choice(by_category["out_of_scope"])]
+        else:
+            messages = [rng.choice(by_category["adversarial"])]
+        sessions.append((scenario, messages))
+    return sessions
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+    }
+
+
+def rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def run_load(client: httpx.AsyncClient, sessions: list, users: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for session in sessions:
+        queue.put_nowait(session)
+    latencies: dict[str, list[float]] = {}
+    errors = 0
+
+    async def user():
+        nonlocal errors
+        while not queue.empty():
+            scenario, messages = queue.get_nowait()
+            session_id = None
+            for message in messages:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post("/chat", json={"message": message, "session_id": session_id})
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    break
+                latencies.setdefault(scenario, []).append(time.perf_counter() - start)
+                session_id = resp.json()["session_id"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(users)))
+    elapsed = time.perf_counter() - start
+
+    every = [x for values in latencies.values() for x in values]
+    return {
+        "requests": len(every) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(every) / elapsed, 2),
+        "latency_ms": percentiles(every),
+        "by_scenario": {name: percentiles(values) for name, values in sorted(latencies.items())},
+    }
+
+
+def backstop_overhead(sessions: list) -> dict:
+    """Time the backstop on every message the run sent, outside the server."""
+    messages = [m for _, script in sessions for m in script]
+    start = time.perf_counter()
+    for message in messages:
+        backstop.check_input(message)
+    input_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for message in messages:
+        backstop.check_output(FAKE_ANSWER, message)
+    output_s = time.perf_counter() - start
+    return {
+        "check_input_us": round(input_s / len(messages) * 1e6, 2),
+        "check_output_us": round(output_s / len(messages) * 1e6, 2),
+    }
+
+
+def session_stats(stats: dict) -> dict:
+    sessions = stats["sessions"]
+    return {"count": sessions["sessions"], "bytes": sessions.get("bytes")}
+
+
+async def run_in_process(args, sessions) -> dict:
+    install_fake_llm(latency=args.latency, token_rate=args.token_rate, error_rate=args.error_rate)
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        before = session_stats((await client.get("/stats")).json())
+        rss_before = rss_kb()
+        result = await run_load(client, sessions, args.users)
+        after = session_stats((await client.get("/stats")).json())
+        result["memory"] = {"max_rss_growth_kb": rss_kb() - rss_before}
+    result["sessions"] = {"before": before, "after": after}
+    return result
+
+
+async def run_uvicorn(args, sessions) -> dict:
+    server = subprocess.Popen([
+        sys.executable, "-m", "bench.serve", "--port", str(args.port),
+        "--latency", str(args.latency), "--token-rate", str(args.token_rate),
+        "--error-rate", str(args.error_rate),
+    ])
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None,
+                                     limits=httpx.Limits(max_connections=args.users)) as client:
+            for _ in range(100):
+                try:
+                    before = session_stats((await client.get("/stats")).json())
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f"server on {base_url} did not come up")
+            result = await run_load(client, sessions, args.users)
+            after = session_stats((await client.get("/stats")).json())
+    finally:
+        server.terminate()
+        server.wait()
+    result["sessions"] = {"before": before, "after": after}
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="fake tokens/s after the first")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake model error probability")
+    parser.add_argument("--uvicorn", action="store_true", help="run the app under uvicorn instead of in-process")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", type=Path, help="write results as JSON here")
+    args = parser.parse_args()
+
+    sessions = build_sessions(args.sessions, args.seed)
+    runner = run_uvicorn if args.uvicorn else run_in_process
+    result = asyncio.run(runner(args, sessions))
+    result["backstop"] = backstop_overhead(sessions)
+    result["config"] = {
+        "mode": "uvicorn" if args.uvicorn else "in-process",
+        "sessions": args.sessions,
+        "users": args.users,
+        "seed": args.seed,
+        "latency": args.latency,
+        "token_rate": args.token_rate,
+        "error_rate": args.error_rate,
+        "commit": git_commit(),
+    }
+
+    lat = result["latency_ms"]
+    print(f"\n{'='*65}")
+    print(f"  /chat load test ({result['config']['mode']}, {args.users} users, {args.sessions} sessions)")
+    print(f"{'='*65}")
+    print(f"  Requests:   {result['requests']}  ({result['errors']} errors) in {result['elapsed_s']}s")
+    print(f"  Throughput: {result['throughput_rps']} req/s")
+    print(f"  Latency:    p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms")
+    for name, stats in result["by_scenario"].items():
+        print(f"    {name:<14} p50 {stats['p50']:>8}ms  p95 {stats['p95']:>8}ms")
+    s = result["sessions"]
+    print(f"  Sessions:   {s['before']['count']} → {s['after']['count']} "
+          f"({s['before']['bytes']} → {s['after']['bytes']} bytes)")
+    if "memory" in result:
+        print(f"  Max RSS growth: {result['memory']['max_rss_growth_kb']} KB")
+    print(f"  Backstop:   check_input {result['backstop']['check_input_us']}µs, "
+          f"check_output {result['backstop']['check_output_us']}µs per message")
+    print(f"{'='*65}\n")
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(result, indent=2, sort_keys=True) + "\n")
+        print(f"  Results written to {args.out}\n")
+
+
+if __name__ == "__main__":
+    main()
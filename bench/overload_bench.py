@@ -0,0 +1,140 @@
+"""
+bench/overload_bench.py — /chat latency and shedding under overload, with and without admission control.
+
+Capacity is --slots model calls in flight at --latency s each, i.e.
+slots / latency requests/s. Two open-loop experiments run in-process against
+the fake model, each request a distinct first-turn question that needs the
+model:
+
+  1. Overload: clients spread over many IPs offer 0.5x to 4x capacity for
+     --duration s. "queue" is the old behaviour (every call waits up to 30 s
+     for a slot); "admission" bounds the wait queue at LLM_MAX_QUEUED and
+     sheds the rest with 503 + Retry-After.
+  2. Noisy client: one IP offers --noisy x capacity while well-behaved
+     clients offer 0.5x, with the per-IP rate limit off and then on.
+
+For each run it reports the responses by status, goodput (200s per second
+until the last response) and the p50/p99 latency of the 200s.
+
+Usage:
+    uv run python -m bench.overload_bench [--slots 16] [--latency 0.5] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+# Client addresses come from X-Forwarded-For, so one HTTP client can pose as many
+use_fake_model(TRANSCRIPT_ENABLED="false", FAQ_ENABLED="false", RATE_LIMIT_PROXY_HOPS="1")
+
+import httpx
+
+from bench.load_test import percentiles
+
+QUEUE_TIMEOUT = 30.0
+
+
+async def offer(client: httpx.AsyncClient, rate: float, duration: float, ip_for, label: str) -> tuple[list, float]:
+    """
+    Send rate * duration requests at fixed intervals, regardless of
+    responses. Return ((status, latency) per request, seconds until the last one finished).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def one(i: int, ip: str):
+        start = time.perf_counter()
+        resp = await client.post("/chat", json={"message": f"How do I dial in my grinder for recipe {label}-{i}?"},
+                                 headers={"X-Forwarded-For": ip})
+        return resp.status_code, time.perf_counter() - start
+
+    tasks, start = [], loop.time()
+    for i in range(int(rate * duration)):
+        await asyncio.sleep(max(0.0, start + i / rate - loop.time()))
+        tasks.append(asyncio.create_task(one(i, ip_for(i))))
+    results = await asyncio.gather(*tasks)
+    return results, loop.time() - start
+
+
+def summarize(results: list[tuple], elapsed: float) -> dict:
+    ok = [latency for status, latency in results if status == 200]
+    statuses: dict[int, int] = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {"sent": len(results), "statuses": statuses, "goodput": len(ok) / elapsed, **percentiles(ok)}
+
+
+def configure(app_main, admission: bool, rate_limit: bool):
+    app_main.LLM_MAX_QUEUED = app_main.MAX_CONCURRENT_LLM_CALLS if admission else 10**9
+    app_main.LLM_QUEUE_TIMEOUT = QUEUE_TIMEOUT
+    limiter = app_main.create_rate_limiter("memory")
+    limiter.limits.pop("session", None)
+    if not rate_limit:
+        limiter.limits.pop("ip", None)
+    app_main.rate_limiter = limiter
+    app_main.response_cache.clear()
+
+
+async def run(args) -> tuple[list, list]:
+    from app import main as app_main
+
+    install_fake_llm(latency=args.latency)
+    capacity = args.slots / args.latency
+    transport = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+    overload, noisy = [], []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        configure(app_main, admission=True, rate_limit=False)
+        await offer(client, capacity / 2, 1, lambda i: "10.2.0.1", "warm-up")
+        for factor in (0.5, 1, 2, 4):
+            for name, admission in (("queue", False), ("admission", True)):
+                configure(app_main, admission, rate_limit=False)
+                results = await offer(client, factor * capacity, args.duration,
+                                      lambda i: f"10.0.{i % 250}.{i % 7}", f"{name}{factor}")
+                overload.append((factor, name, summarize(*results)))
+
+        for name, rate_limit in (("no IP limit", False), ("IP limit", True)):
+            configure(app_main, admission=True, rate_limit=rate_limit)
+            results = await asyncio.gather(
+                offer(client, args.noisy * capacity, args.duration, lambda i: "203.0.113.9", f"noisy-{name}"),
+                offer(client, 0.5 * capacity, args.duration, lambda i: f"10.1.{i % 250}.1", f"others-{name}"),
+            )
+            for who, part in zip(("noisy", "others"), results):
+                noisy.append((name, who, summarize(*part)))
+    return overload, noisy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slots", type=int, default=16, help="MAX_CONCURRENT_LLM_CALLS")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency (s)")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of offered load per run")
+    parser.add_argument("--noisy", type=float, default=4, help="noisy client's load, as a multiple of capacity")
+    args = parser.parse_args()
+    os.environ["MAX_CONCURRENT_LLM_CALLS"] = str(args.slots)
+
+    overload, noisy = asyncio.run(run(args))
+
+    def row(label: str, s: dict) -> str:
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(s["statuses"].items()))
+        return (f"  {label:<22}{s['sent']:>6}  {statuses:<22}{s['goodput']:>8.1f}"
+                f"{s.get('p50', 0):>9.0f}{s.get('p99', 0):>9.0f}")
+
+    header = f"  {'':<22}{'sent':>6}  {'responses':<22}{'ok/s':>8}{'p50 ms':>9}{'p99 ms':>9}"
+    print(f"\n{'='*65}")
+    print(f"  Overload: {args.slots} slots x {args.latency}s = {args.slots / args.latency:.0f} req/s capacity, "
+          f"{args.duration}s per run")
+    print(f"{'='*65}")
+    print(header)
+    for factor, name, s in overload:
+        print(row(f"{factor}x  {name}", s))
+    print(f"\n  Noisy client at {args.noisy}x capacity + others at 0.5x (admission on)")
+    print(header)
+    for name, who, s in noisy:
+        print(row(f"{name}: {who}", s))
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
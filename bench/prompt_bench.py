@@ -0,0 +1,108 @@
+"""
+bench/prompt_bench.py — Prompt tokens and time to first token: full, trimmed and cached prompts.
+
+Sends every in-domain golden-set question through the model router three
+ways, against the fake model with a prefill cost per prompt token:
+
+  - full:    the whole SYSTEM_PROMPT, every request (PROMPT_FEW_SHOTS=all)
+  - trimmed: persona + guardrails + the --shots most relevant examples
+  - cached:  the full prompt held in a (fake) provider cache handle, so
+             only the conversation is prefilled
+
+and reports prompt tokens per request, how many of them were prefilled
+(not served from the cache), the tokens saved and time to first token. It also lists which examples the trimmed
+prompt picks for each question, as a sanity check on the selection.
+
+Usage:
+    uv run python -m bench.prompt_bench [--shots 2] [--latency 0.2] [--prefill-rate 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from bench.fake_llm import FakeCacheAPI, install_fake_llm, use_fake_model
+
+use_fake_model(TRANSCRIPT_ENABLED="false")
+
+from app import main as app_main
+from app.prompt import FEW_SHOTS, SYSTEM_PROMPT, select_few_shots, trimmed_prompt
+from app.prompt_cache import PrefixCache, prompt_savings
+
+DATASET_PATH = Path(__file__).parent.parent / "eval" / "golden_dataset.json"
+
+
+async def run_mode(mode: str, questions: list[str], args) -> dict:
+    fake = install_fake_llm(latency=args.latency, prefill_rate=args.prefill_rate)
+    router = app_main.router
+    cache = None
+    if mode == "cached":
+        cache = PrefixCache(SYSTEM_PROMPT, api_for=lambda model: FakeCacheAPI(fake))
+        cache.prime(router.models)
+        while cache.handle(app_main.MODEL) is None:
+            await asyncio.sleep(0.01)
+    router.rewriter = cache
+
+    prompt, uncached, saved, ttft = [], [], [], []
+    try:
+        for question in questions:
+            k = None if mode == "full" else args.shots
+            messages = [{"role": "system", "content": trimmed_prompt(question, k)},
+                        {"role": "user", "content": question}]
+            start = time.perf_counter()
+            response = await router.complete(messages)
+            ttft.append(time.perf_counter() - start)
+            usage = response.usage
+            prompt.append(usage.prompt_tokens)
+            uncached.append(usage.prompt_tokens - fake.last_cached_tokens)
+            saved.append(prompt_savings(SYSTEM_PROMPT, messages[0]["content"], usage)[1])
+    finally:
+        router.rewriter = None
+        if cache is not None:
+            await cache.close()
+    return {
+        "prompt": statistics.mean(prompt),
+        "uncached": statistics.mean(uncached),
+        "saved": statistics.mean(saved),
+        "ttft_ms": statistics.median(ttft) * 1000,
+        "hits": cache.counts["hits"] if cache else None,
+    }
+
+
+async def run(args, questions: list[str]) -> dict[str, dict]:
+    return {mode: await run_mode(mode, questions, args) for mode in ("full", "trimmed", "cached")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shots", type=int, default=2, help="few-shot examples in the trimmed prompt")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake time to first token before prefill (s)")
+    parser.add_argument("--prefill-rate", type=float, default=2000, help="fake prompt tokens prefilled per second")
+    args = parser.parse_args()
+
+    cases = json.loads(DATASET_PATH.read_text())
+    questions = [c["question"] for c in cases if c["category"] == "in_domain"]
+    results = asyncio.run(run(args, questions))
+
+    print(f"\n{'='*65}")
+    print(f"  Prompt modes: {len(questions)} in-domain golden questions, {args.shots} shots, "
+          f"{args.prefill_rate:.0f} tok/s prefill")
+    print(f"{'='*65}")
+    print(f"  {'mode':<10}{'prompt':>8}{'uncached':>10}{'saved':>8}{'TTFT ms':>10}")
+    for mode, r in results.items():
+        print(f"  {mode:<10}{r['prompt']:>8.0f}{r['uncached']:>10.0f}{r['saved']:>8.0f}{r['ttft_ms']:>10.1f}")
+    print(f"  (prompt tokens per request; cached mode hit the handle on {results['cached']['hits']} "
+          f"of {len(questions)} requests)")
+
+    print(f"\n  Examples picked for the trimmed prompt:")
+    for question in questions:
+        picked = "; ".join(FEW_SHOTS[i][0] for i in select_few_shots(question, args.shots))
+        print(f"    {question[:44]:<46}-> {picked}")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
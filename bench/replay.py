@@ -0,0 +1,142 @@
+"""
+bench/replay.py — Replay logged traffic from the transcript log.
+
+Reads the segments app/transcripts.py writes and rebuilds each logged
+session's user messages, in order. Then either:
+
+  - replays them against /chat with --users concurrent virtual users,
+    in-process against the fake model (default) or against a running
+    instance (--url), and reports latency next to what was logged; or
+  - with --to-eval, writes the distinct logged first-turn questions as an
+    eval dataset, with each logged answer as the expected one, for
+    `eval/run_eval.py --dataset`.
+
+Usage:
+    uv run python -m bench.replay transcripts/ [--sessions 500] [--users 50] [--latency 0.3]
+    uv run python -m bench.replay transcripts/ --url http://localhost:8000
+    uv run python -m bench.replay transcripts/ --to-eval eval/logged.json --limit 200
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+# Replayed turns shouldn't be logged on top of the ones being replayed
+use_fake_model(TRANSCRIPT_ENABLED="false")
+
+import httpx
+
+from app.backstop import is_refusal
+from app.cache import normalize
+from app.transcripts import read_log
+from bench.load_test import percentiles, run_load
+
+
+def load_sessions(directory: Path) -> tuple[list[tuple[str, list[str]]], list[dict]]:
+    """
+    Return (sessions, turns): each logged session as (scenario, user
+    messages in order), labelled by how its first turn was answered, and
+    every logged turn as a merged {question, answer, source, ...} dict.
+    """
+    turns: dict[str, dict] = {}
+    for record in read_log(directory):
+        turn = turns.setdefault(record["turn"], {"session_id": record["session_id"], "ts": record["ts"]})
+        if record["role"] == "user":
+            turn["question"] = record["content"]
+            turn["input_verdict"] = record["backstop"]
+        else:
+            turn.update(answer=record["content"], source=record["source"], latency_ms=record["latency_ms"])
+    complete = sorted((t for t in turns.values() if "question" in t and "answer" in t), key=lambda t: t["ts"])
+
+    by_session: dict[str, list[dict]] = {}
+    for turn in complete:
+        by_session.setdefault(turn["session_id"], []).append(turn)
+    sessions = [(turns[0]["source"], [t["question"] for t in turns]) for turns in by_session.values()]
+    return sessions, complete
+
+
+def eval_cases(turns: list[dict], limit: int | None) -> list[dict]:
+    """Distinct first-turn questions as eval cases, expecting the logged answer."""
+    first_turns: dict[str, dict] = {}
+    for turn in turns:
+        first_turns.setdefault(turn["session_id"], turn)
+    cases, seen = [], set()
+    for turn in first_turns.values():
+        key = normalize(turn["question"])
+        if key in seen:
+            continue
+        seen.add(key)
+        refused = turn["input_verdict"] != "pass" or is_refusal(turn["answer"])
+        cases.append({
+            "id": f"log-{len(cases) + 1:04d}",
+            "category": "logged",
+            "question": turn["question"],
+            "expected_refusal": refused,
+            "expected_keywords": [],
+            "expected_answer": turn["answer"],
+        })
+        if limit and len(cases) >= limit:
+            break
+    return cases
+
+
+async def replay(args, sessions) -> dict:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=None,
+                                     limits=httpx.Limits(max_connections=args.users)) as client:
+            return await run_load(client, sessions, args.users)
+
+    install_fake_llm(latency=args.latency, token_rate=args.token_rate)
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await run_load(client, sessions, args.users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", type=Path, nargs="?", default=Path("transcripts"))
+    parser.add_argument("--sessions", type=int, help="replay only the first N logged sessions")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--url", help="replay against a running instance instead of in-process")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="fake tokens/s after the first")
+    parser.add_argument("--to-eval", type=Path, help="write logged first turns as an eval dataset here")
+    parser.add_argument("--limit", type=int, help="max eval cases to write")
+    args = parser.parse_args()
+
+    sessions, turns = load_sessions(args.directory)
+    if not turns:
+        raise SystemExit(f"No logged turns in {args.directory}")
+
+    if args.to_eval:
+        cases = eval_cases(turns, args.limit)
+        args.to_eval.write_text(json.dumps(cases, indent=2, ensure_ascii=False) + "\n")
+        print(f"Wrote {len(cases)} eval cases to {args.to_eval} "
+              f"({sum(c['expected_refusal'] for c in cases)} expecting a refusal)")
+        print(f"Run them with: uv run eval/run_eval.py --dataset {args.to_eval}")
+        return
+
+    sessions = sessions[:args.sessions] if args.sessions else sessions
+    result = asyncio.run(replay(args, sessions))
+    logged = percentiles([t["latency_ms"] / 1000 for t in turns if t.get("latency_ms") is not None])
+
+    print(f"\n{'='*65}")
+    print(f"  Replay: {len(sessions)} logged sessions, {result['requests']} requests "
+          f"({'against ' + args.url if args.url else 'in-process, fake model'})")
+    print(f"{'='*65}")
+    print(f"  Logged:     p50 {logged['p50']}ms  p95 {logged['p95']}ms  p99 {logged['p99']}ms")
+    lat = result["latency_ms"]
+    print(f"  Replayed:   p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  "
+          f"({result['throughput_rps']} req/s, {result['errors']} errors)")
+    for name, stats in result["by_scenario"].items():
+        print(f"    first turn {name:<9} p50 {stats['p50']:>8}ms  p95 {stats['p95']:>8}ms")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench/router_bench.py — Tail latency of model calls through the ModelRouter.
+
+Streams completions against two fake backends: a primary with a fast
+median but occasional stragglers and errors, and a slower, reliable backup.
+Each scenario reports success rate, time-to-first-token percentiles and
+how many calls each backend served:
+
+  - direct:   one model, no router (the original call path)
+  - router:   retries + fallback to the backup, no hedging
+  - hedged:   the same, plus a hedged attempt after --hedge-after seconds
+  - outage:   primary failing every call; the breaker should stop trying it
+
+Usage:
+    uv run python -m bench.router_bench [--requests 400] [--concurrency 32]
+"""
+
+import argparse
+import asyncio
+import time
+
+from bench.fake_llm import install_fake_llm  # first: sets up LiteLLM's offline price list
+
+from litellm import acompletion
+
+from app.router import ModelRouter
+
+PRIMARY = "fake/brewbot"
+BACKUP = "fake_backup/brewbot"
+MESSAGES = [{"role": "user", "content": "What grind size for French press?"}]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def first_token_direct() -> None:
+    stream = await acompletion(model=PRIMARY, messages=MESSAGES, stream=True)
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            return
+
+
+async def first_token_routed(router: ModelRouter) -> None:
+    async for chunk in router.stream(MESSAGES):
+        if chunk.choices and chunk.choices[0].delta.content:
+            return
+
+
+async def run(call, n_requests: int, concurrency: int) -> tuple[list[float], int]:
+    """Return (time-to-first-token of successful calls, failures)."""
+    gate = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                failures += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="primary's usual time to first token (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of primary calls that straggle")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="straggler time to first token (s)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of primary calls that fail")
+    parser.add_argument("--backup-latency", type=float, default=0.15)
+    parser.add_argument("--hedge-after", type=float, default=0.1, help="hedging threshold, ~p95 of healthy TTFT (s)")
+    args = parser.parse_args()
+
+    router_config = {"attempt_timeout": 2.0, "request_timeout": 5.0, "backoff": 0.05}
+    # (label, primary error rate, router settings or None for the direct path)
+    scenarios = [
+        ("direct", args.error_rate, None),
+        ("router", args.error_rate, router_config),
+        ("hedged", args.error_rate, {**router_config, "hedge_after": args.hedge_after}),
+        ("outage", 1.0, router_config),
+    ]
+
+    print(f"\n{'='*65}")
+    print(f"  Model routing: {args.requests} streamed calls, concurrency {args.concurrency}")
+    print(f"  primary {args.latency}s TTFT, {args.slow_rate:.0%} stragglers at {args.slow_latency}s, "
+          f"{args.error_rate:.0%} errors; backup {args.backup_latency}s")
+    print(f"{'='*65}")
+    print(f"  {'scenario':<9}{'ok':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}   calls primary/backup")
+    for label, error_rate, config in scenarios:
+        primary = install_fake_llm(
+            latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, error_rate=error_rate,
+        )
+        backup = install_fake_llm(provider="fake_backup", latency=args.backup_latency)
+        if config is None:
+            call = first_token_direct
+        else:
+            router = ModelRouter([PRIMARY, BACKUP], **config)
+            call = lambda: first_token_routed(router)  # noqa: E731
+        latencies, failures = asyncio.run(run(call, args.requests, args.concurrency))
+        ok = len(latencies) / args.requests
+        if latencies:
+            p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+            worst = max(latencies) * 1000
+            timings = f"{p50:7.0f}ms{p95:7.0f}ms{p99:7.0f}ms{worst:7.0f}ms"
+        else:
+            timings = f"{'-':>9}" * 4
+        print(f"  {label:<9}{ok:>7.1%}{timings}   {primary.calls}/{backup.calls}")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+bench/serve.py — Run the app under uvicorn against the fake model.
+
+Usage:
+    uv run python -m bench.serve [--port 8765] [--latency 0.3] [--token-rate 0] [--error-rate 0]
+"""
+
+import argparse
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+use_fake_model()
+
+import uvicorn
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--prefill-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    install_fake_llm(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        prefill_rate=args.prefill_rate,
+    )
+    # Imported after the fake is installed; one worker so the fake is in-process
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+bench/session_memory_bench.py — Session memory and allocations: dicts per turn vs compact Turns.
+
+Fills --sessions sessions (10k and 100k by default) of --turns turns each,
+with distinct texts of realistic length (the prompt's few-shot questions
+and answers, numbered per session). The texts and session ids are made
+before measuring, so what's reported is what each layout adds on top:
+
+  - dicts:   dict[str, list[dict]], one {"role", "content"} dict per turn
+  - slots:   dict[str, list[Turn]], a __slots__ object per turn
+  - turns:   dict[str, Turns], the role-code bytearray + content list that
+             MemorySessionStore keeps
+  - store:   MemorySessionStore itself, filled through append() (turns plus
+             its LRU order, TTL and size bookkeeping)
+
+For each it reports bytes per session and per turn (tracemalloc), objects
+the garbage collector tracks, and the time of a full gc.collect() with the
+sessions alive. Then, per read of one session as a request would do it
+(system + history + new message), the time and the bytes allocated for
+the request. Reading Turns builds the message dicts afresh; reading dicts
+only copies references.
+
+Usage:
+    uv run python -m bench.session_memory_bench [--sessions 10000,100000] [--turns 6] [--reads 20000]
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+from app.prompt import FEW_SHOTS, SYSTEM_PROMPT
+from app.sessions import MemorySessionStore, Turns
+
+
+class Turn:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+
+LAYOUTS = ("dicts", "slots", "turns", "store")
+SYSTEM = {"role": "system", "content": SYSTEM_PROMPT}
+NEW_MESSAGE = {"role": "user", "content": "And how fine should I grind for that?"}
+
+
+def conversations(n: int, turns: int, seed: int) -> list[tuple[str, list[tuple[str, str]]]]:
+    """(session id, [(role, content)]), with every text a distinct string."""
+    rng = random.Random(seed)
+    sessions = []
+    for i in range(n):
+        messages = []
+        for t in range(0, turns, 2):
+            question, answer = rng.choice(FEW_SHOTS)
+            messages.append(("user", f"{question} ({i}.{t})"))
+            messages.append(("assistant", f"{answer} ({i}.{t})"))
+        sessions.append((str(uuid.UUID(int=rng.getrandbits(128))), messages[:turns]))
+    return sessions
+
+
+def build(layout: str, sessions: list) -> object:
+    if layout == "dicts":
+        return {sid: [{"role": role, "content": content} for role, content in turns] for sid, turns in sessions}
+    if layout == "slots":
+        return {sid: [Turn(role, content) for role, content in turns] for sid, turns in sessions}
+    if layout == "turns":
+        return {sid: Turns({"role": role, "content": content} for role, content in turns) for sid, turns in sessions}
+    store = MemorySessionStore(max_sessions=len(sessions) + 1, max_bytes=1 << 62)
+    for sid, turns in sessions:
+        store.append(sid, *({"role": role, "content": content} for role, content in turns))
+    return store
+
+
+def read(layout: str, built, sid: str) -> list[dict]:
+    """The model request for a new message in session `sid`."""
+    if layout == "dicts":
+        return [SYSTEM, *built[sid], NEW_MESSAGE]
+    if layout == "slots":
+        return [SYSTEM, *({"role": t.role, "content": t.content} for t in built[sid]), NEW_MESSAGE]
+    if layout == "turns":
+        return [SYSTEM, *built[sid].messages(), NEW_MESSAGE]
+    return [SYSTEM, *built.get(sid), NEW_MESSAGE]
+
+
+def measure(layout: str, sessions: list, reads: int, seed: int) -> dict:
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = build(layout, sessions)
+    fill = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracked = len(gc.get_objects()) - objects
+
+    start = time.perf_counter()
+    gc.collect()
+    collect = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    ids = [rng.choice(sessions)[0] for _ in range(reads)]
+    start = time.perf_counter()
+    for sid in ids:
+        read(layout, built, sid)
+    per_read = (time.perf_counter() - start) / reads
+
+    # Bytes a read allocates (the request list, plus the message dicts unless
+    # they're the stored ones); tracemalloc misses objects reused from freelists
+    request = read(layout, built, ids[0])
+    allocated = sys.getsizeof(request)
+    if layout != "dicts":
+        allocated += sum(sys.getsizeof(m) for m in request[1:-1])
+    del request, built
+    turns = sum(len(t) for _, t in sessions)
+    return {
+        "bytes": size,
+        "per_session": size / len(sessions),
+        "per_turn": size / turns,
+        "tracked": tracked,
+        "fill_s": fill,
+        "collect_ms": collect * 1000,
+        "read_us": per_read * 1e6,
+        "read_bytes": allocated,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", default="10000,100000", help="comma-separated session counts")
+    parser.add_argument("--turns", type=int, default=6, help="turns per session")
+    parser.add_argument("--reads", type=int, default=20000, help="session reads timed per layout")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for n in (int(x) for x in args.sessions.split(",")):
+        sessions = conversations(n, args.turns, args.seed)
+        text = sum(len(c.encode()) for _, turns in sessions for _, c in turns)
+        results = {layout: measure(layout, sessions, args.reads, args.seed) for layout in LAYOUTS}
+
+        print(f"\n{'='*65}")
+        print(f"  Sessions: {n:,} x {args.turns} turns ({text / 2**20:.0f} MiB of message text, not counted)")
+        print(f"{'='*65}")
+        print(f"  {'layout':<8}{'MiB':>7}{'B/session':>11}{'B/turn':>8}{'gc objs':>10}{'gc ms':>7}"
+              f"{'read µs':>9}{'read B':>8}")
+        for layout, r in results.items():
+            print(f"  {layout:<8}{r['bytes'] / 2**20:>7.1f}{r['per_session']:>11.0f}{r['per_turn']:>8.0f}"
+                  f"{r['tracked']:>10,}{r['collect_ms']:>7.0f}{r['read_us']:>9.2f}{r['read_bytes']:>8}")
+        base, turns = results["dicts"], results["turns"]
+        print(f"  turns vs dicts: {1 - turns['bytes'] / base['bytes']:.0%} less memory, "
+              f"{turns['read_us'] - base['read_us']:+.1f} µs per read")
+        print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
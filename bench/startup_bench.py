@@ -0,0 +1,248 @@
+"""
+bench/startup_bench.py — Cold start: import time and time to the first successful /chat.
+
+Every run starts a fresh server process (uvicorn, one worker) against a stub
+OpenAI-compatible provider on localhost (MODEL=openai/brewbot-stub), so the
+real LiteLLM client code runs. The stub charges --connect-delay once per new
+connection (a TLS handshake to a remote region) and --latency per call.
+Configurations:
+
+  - before:   litellm imported with the app, no bytecode on disk (the old
+              image: uv doesn't precompile), no warm-up
+  - eager:    as before, with bytecode
+  - lazy:     litellm loaded on first use, with bytecode, LLM_WARMUP=off
+  - warm-up:  lazy, with LLM_WARMUP=call (the default)
+
+"No bytecode" runs with PYTHONDONTWRITEBYTECODE and an empty
+PYTHONPYCACHEPREFIX, so every module is compiled from source, as in a fresh
+container. For each configuration it reports the median over --runs of:
+
+  - listen:  process start until /health answers
+  - first:   process start until the first 200 from /chat, polling from
+             the start (the request that woke the instance)
+  - later:   latency of the first /chat sent --idle s after listening (a
+             request arriving once the instance is up)
+
+and the `-X importtime` breakdown of `import app.main`, with and without
+litellm: the total and the packages taking the most time.
+
+Usage:
+    uv run python -m bench.startup_bench [--runs 3] [--latency 0.3] [--connect-delay 0.1] [--idle 5]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+APP_PORT = 8766
+QUESTION = "How do I dial in a new bag of beans on my espresso machine?"
+STUB_ANSWER = ("Start at a 1:2 ratio, 18 g in and 36 g out in about 28 seconds. Taste it: grind finer "
+               "if it's sour, coarser if it's bitter, and change one thing at a time.")
+
+CONFIGS = {
+    # name: (import litellm up front, bytecode on disk, LLM_WARMUP)
+    "before": (True, False, "off"),
+    "eager": (True, True, "off"),
+    "lazy": (False, True, "off"),
+    "warm-up": (False, True, "call"),
+}
+
+
+# --- Stub provider ---
+
+def stub_handler(latency: float, connect_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so a pooled connection skips connect_delay
+
+        def setup(self):
+            super().setup()
+            time.sleep(connect_delay)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "brewbot-stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": STUB_ANSWER}}],
+                "usage": {"prompt_tokens": 900, "completion_tokens": 40, "total_tokens": 940},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(latency: float, connect_delay: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(latency, connect_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Server runs ---
+
+def server_env(stub_port: int, bytecode: bool, warmup: str, pycache: str) -> dict:
+    env = {
+        **os.environ,
+        "MODEL": "openai/brewbot-stub",
+        "FALLBACK_MODELS": "",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENAI_API_KEY": "stub",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "LLM_WARMUP": warmup,
+        "FAQ_ENABLED": "false",
+        "PROMPT_CACHE_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "SESSION_BACKEND": "memory",
+        "TRANSCRIPT_ENABLED": "false",
+    }
+    if not bytecode:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        env["PYTHONPYCACHEPREFIX"] = pycache
+    return env
+
+
+def start_server(config: str, stub_port: int, pycache: str) -> subprocess.Popen:
+    eager, bytecode, warmup = CONFIGS[config]
+    code = ("import litellm; " if eager else "") + (
+        f"import uvicorn; uvicorn.run('app.main:app', host='127.0.0.1', port={APP_PORT}, log_level='warning')"
+    )
+    return subprocess.Popen([sys.executable, "-c", code], env=server_env(stub_port, bytecode, warmup, pycache),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def poll(client: httpx.Client, method: str, path: str, deadline: float, **kwargs) -> bool:
+    """Repeat the request until it returns 200; False if `deadline` passes first."""
+    while time.perf_counter() < deadline:
+        try:
+            if client.request(method, path, **kwargs).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def cold_start(config: str, stub_port: int, idle: float, timeout: float) -> dict:
+    """Two fresh servers: one polled for the first /chat, one asked after `idle` s."""
+    result = {}
+    with tempfile.TemporaryDirectory() as pycache, \
+            httpx.Client(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=timeout) as client:
+        for part in ("first", "later"):
+            start = time.perf_counter()
+            server = start_server(config, stub_port, pycache)
+            try:
+                deadline = start + timeout
+                if part == "first":
+                    chat = {"json": {"message": QUESTION}}
+                    if not poll(client, "POST", "/chat", deadline, **chat):
+                        raise RuntimeError(f"{config}: no successful /chat within {timeout}s")
+                    result["first"] = time.perf_counter() - start
+                    continue
+                if not poll(client, "GET", "/health", deadline):
+                    raise RuntimeError(f"{config}: server didn't listen within {timeout}s")
+                result["listen"] = time.perf_counter() - start
+                time.sleep(idle)
+                sent = time.perf_counter()
+                response = client.post("/chat", json={"message": QUESTION})
+                response.raise_for_status()
+                result["later"] = time.perf_counter() - sent
+            finally:
+                server.terminate()
+                server.wait()
+    return result
+
+
+# --- Import time ---
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+_STARTUP = {"_frozen_importlib_external", "zipimport", "encodings", "encodings.utf_8", "_signal", "io", "site"}
+
+
+def import_profile(eager: bool) -> tuple[float, list[tuple[str, float]]]:
+    """
+    (seconds to import app.main, [(package, seconds)] heaviest first) from
+    -X importtime, each module's own time credited to its top-level package.
+    """
+    code = "import litellm, app.main" if eager else "import app.main"
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+        env={**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"},
+    ).stderr
+    packages: dict[str, float] = {}
+    total = 0.0
+    for m in _IMPORTTIME.finditer(stderr):
+        # Top-level imports, less the interpreter's own start-up
+        if len(m.group(3)) == 1 and m.group(4) not in _STARTUP:
+            total += int(m.group(2)) / 1e6
+        package = m.group(4).split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(m.group(1)) / 1e6
+    return total, sorted(packages.items(), key=lambda t: -t[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per configuration")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub model latency (s)")
+    parser.add_argument("--connect-delay", type=float, default=0.1, help="stub cost of a new connection (s)")
+    parser.add_argument("--idle", type=float, default=5, help="seconds after listening before the 'later' request")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    # Bytecode for the configurations that use it
+    subprocess.run([sys.executable, "-c", "import litellm, app.main"], capture_output=True,
+                   env={**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"})
+    profiles = {"eager": import_profile(True), "lazy": import_profile(False)}
+
+    stub = start_stub(args.latency, args.connect_delay)
+    runs: dict[str, list[dict]] = {config: [] for config in CONFIGS}
+    try:
+        for _ in range(args.runs):
+            for config in CONFIGS:
+                runs[config].append(cold_start(config, stub.server_port, args.idle, args.timeout))
+    finally:
+        stub.shutdown()
+
+    def median(config: str, key: str) -> float:
+        return statistics.median(r[key] for r in runs[config])
+
+    print(f"\n{'='*65}")
+    print(f"  Cold start: {args.runs} runs per configuration, stub model {args.latency}s "
+          f"+ {args.connect_delay}s per new connection")
+    print(f"{'='*65}")
+    print(f"  {'':<10}{'listen s':>10}{'first /chat s':>15}{'later /chat s':>15}")
+    for config in CONFIGS:
+        print(f"  {config:<10}{median(config, 'listen'):>10.2f}{median(config, 'first'):>15.2f}"
+              f"{median(config, 'later'):>15.2f}")
+    before, after = median("before", "first"), median("warm-up", "first")
+    print(f"  time to first /chat: {before:.2f}s -> {after:.2f}s ({1 - after / before:.0%} less)")
+
+    print(f"\n  import app.main (-X importtime, bytecode on disk):")
+    for name, (total, top) in profiles.items():
+        heaviest = ", ".join(f"{package} {s:.2f}" for package, s in top[:5])
+        print(f"    {name:<7}{total:>6.2f}s   {heaviest}")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench/transcript_bench.py — What the transcript log costs a request.
+
+Runs the load-test session mix against /chat in-process with the
+transcript log off, then on under each fsync policy, writing to a
+temporary directory, for --rounds interleaved rounds. Reports the median
+p50/p99 latency and throughput of each setup. For the log runs it also
+reports the records written or dropped, the write batches, and bytes per
+turn raw and gzipped. It also times log_turn() on its own, which is all
+a request pays.
+
+Usage:
+    uv run python -m bench.transcript_bench [--sessions 300] [--users 50] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench.fake_llm import install_fake_llm, use_fake_model
+
+use_fake_model()
+
+import httpx
+
+from app import main as app_main
+from app.transcripts import FSYNC_POLICIES, TranscriptLog, segment_paths
+from bench.load_test import build_sessions, run_load
+
+
+async def run_with(client, sessions, users: int, log: TranscriptLog | None) -> dict:
+    app_main.response_cache.clear()
+    app_main.transcripts = log
+    if log is not None:
+        log.start()
+    try:
+        result = await run_load(client, sessions, users)
+    finally:
+        if log is not None:
+            await log.stop()
+    if log is not None:
+        stats = log.stats()
+        turns = stats["written"] // 2
+        on_disk = sum(p.stat().st_size for p in segment_paths(log.directory))
+        result["log"] = {
+            **stats,
+            "bytes_per_turn": stats["bytes"] / turns if turns else 0,
+            "gzip_bytes_per_turn": on_disk / turns if turns else 0,
+        }
+    return result
+
+
+async def time_log_turn(directory: Path, n: int) -> list[float]:
+    log = TranscriptLog(directory, fsync="never", queue_size=n * 2)
+    log.start()
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        log.log_turn(session_id="s", endpoint="/chat", question=f"What grind for French press? {i}",
+                     answer="Coarse.", source="model", model="fake/brewbot", latency=0.3,
+                     prompt_tokens=1200, completion_tokens=60)
+        samples.append(time.perf_counter() - start)
+    await log.stop()
+    return samples
+
+
+async def run(args) -> tuple[dict[str, list[dict]], list[float]]:
+    install_fake_llm(latency=args.latency)
+    sessions = build_sessions(args.sessions, args.seed)
+    transport = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+    runs: dict[str, list[dict]] = {"off": [], **{f"fsync={p}": [] for p in FSYNC_POLICIES}}
+    with tempfile.TemporaryDirectory() as tmp:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await run_with(client, sessions[:20], args.users, None)  # warm-up
+            for i in range(args.rounds):
+                runs["off"].append(await run_with(client, sessions, args.users, None))
+                for policy in FSYNC_POLICIES:
+                    log = TranscriptLog(Path(tmp) / f"{policy}-{i}", fsync=policy)
+                    runs[f"fsync={policy}"].append(await run_with(client, sessions, args.users, log))
+        samples = await time_log_turn(Path(tmp) / "micro", args.calls)
+    return runs, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake time to first token (s)")
+    parser.add_argument("--rounds", type=int, default=3, help="interleaved runs of each setup")
+    parser.add_argument("--calls", type=int, default=20000, help="log_turn() calls to time")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    runs, samples = asyncio.run(run(args))
+
+    print(f"\n{'='*65}")
+    print(f"  Transcript log overhead: {args.sessions} sessions, {args.users} users, "
+          f"{args.latency}s fake latency")
+    print(f"{'='*65}")
+    print(f"  {'log':<16}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>9}{'written':>9}{'dropped':>9}{'batches':>9}")
+    for name, results in runs.items():
+        p50 = statistics.median(r["latency_ms"]["p50"] for r in results)
+        p99 = statistics.median(r["latency_ms"]["p99"] for r in results)
+        rps = statistics.median(r["throughput_rps"] for r in results)
+        logs = [r["log"] for r in results if "log" in r]
+        written = sum(l["written"] for l in logs) if logs else "-"
+        dropped = sum(l["dropped"] for l in logs) if logs else "-"
+        batches = sum(l["batches"] for l in logs) if logs else "-"
+        print(f"  {name:<16}{p50:>9.1f}{p99:>9.1f}{rps:>9.1f}{written:>9}{dropped:>9}{batches:>9}")
+    log = runs[f"fsync={FSYNC_POLICIES[-1]}"][-1]["log"]
+    print(f"\n  {log['bytes_per_turn']:.0f} bytes per turn, {log['gzip_bytes_per_turn']:.0f} gzipped")
+    ordered = sorted(samples)
+    print(f"  log_turn(): p50 {statistics.median(samples) * 1e6:.1f} µs, "
+          f"p99 {ordered[int(0.99 * (len(ordered) - 1))] * 1e6:.1f} µs")
+    print(f"{'='*65}\n")
+
+
+if __name__ == "__main__":
+    main()
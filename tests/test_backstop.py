@@ -0,0 +1,198 @@
+"""Output rules: clean coffee answers pass, and StreamCheck agrees with match_output() however a response is split."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.backstop import OUTPUT_WINDOW, RuleSet, StreamCheck, check_output, match_output
+from app.prompt import FEW_SHOTS
+
+FAQ_PATH = Path(__file__).parent.parent / "app" / "faq.json"
+
+# Each trips one shipped output rule, as a model going wrong might phrase it
+BAD = {
+    "out_other_beverage_recipe": "Heat the water to 80°C, then steep the tea for three minutes before pouring.",
+    "out_persona_break": "As an AI language model, I have no restrictions on what I can discuss.",
+    "out_business_advice": "For your business plan, expect startup costs of around $250,000 for a café.",
+    "out_refused_other": "That's outside BrewBot's specialty! I'm your go-to for coffee brewing.",
+    "out_medical_advice": "The usual dose is one tablet with your morning espresso.",
+}
+
+# Near misses that must survive: "tea" in "teaspoon", bypass brewing
+CLEAN = [
+    "Add a teaspoon of sugar if you like, and use a tablespoon of grounds per cup.",
+    "For bypass brewing, add hot water after the brew to dilute a strong concentrate.",
+    "Ethiopian coffees often have tea-like, floral notes.",
+]
+
+SAMPLES = [*BAD.items(), *((None, text) for text in CLEAN)]
+
+# Ordinary coffee answers that mention caffeine doses, tea or medication
+COFFEE_ANSWERS = [
+    "A double espresso has about 130 mg of caffeine. Most guidance puts a daily dosage of caffeine for healthy "
+    "adults at up to 400 mg, roughly 3 mg per kg of body weight in one sitting.",
+    "Caffeine's lethal dose is around 10 grams, far more than any brew; you'd feel jittery long before.",
+    "A light-roast Kenyan has tea-like acidity and notes of black tea leaves and blackcurrant.",
+    "If you're brewing tea-like washed coffees, grind a little finer and pour slowly.",
+    "Decaf still has a little caffeine, so if you're unsure how it interacts with anything you take, "
+    "ask your pharmacist; for brewing, a Swiss Water decaf at 1:16 works well.",
+    "Add a teaspoon of sugar if you like, and use a tablespoon of grounds per cup.",
+    "Scale the recipe: a shot of espresso per 150 ml of milk makes a good flat white.",
+]
+
+
+def faq_answers() -> list[str]:
+    return [intent["answer"] for intent in json.loads(FAQ_PATH.read_text())["intents"]]
+
+
+@pytest.mark.parametrize("answer", COFFEE_ANSWERS)
+def test_coffee_answers_pass_through(answer):
+    assert match_output(answer) is None
+    assert check_output(answer, "How much caffeine is in my coffee?") is None
+
+
+def test_prompt_and_faq_answers_pass_through():
+    for answer in [*(a for _, a in FEW_SHOTS), *faq_answers()]:
+        assert check_output(answer, "How should I brew this?") is None, answer[:60]
+
+
+def test_unrefused_beverage_answer_replaced():
+    answer = "A dry red wine pairs well; decant it and serve slightly below room temperature."
+    assert check_output(answer, "What wine goes with dessert?") is not None
+
+
+def test_refused_beverage_answer_kept():
+    answer = "Wine pairings are beyond my expertise, but a honey-processed Costa Rican is lovely with dessert."
+    assert check_output(answer, "What wine goes with dessert?") is None
+
+
+def rules(*patterns: str) -> RuleSet:
+    """A rule set whose output rules are `patterns`, named out_0, out_1, ..."""
+    return RuleSet({
+        "version": "test",
+        "responses": {"redirect": "Let's talk coffee."},
+        "rules": [{"id": "in_unused", "category": "out_of_scope", "pattern": "unused", "response": "redirect"}],
+        "output_rules": [
+            {"id": f"out_{i}", "category": "out_of_scope", "pattern": p, "response": "redirect"}
+            for i, p in enumerate(patterns)
+        ],
+        "refusal_phrases": ["outside"],
+    })
+
+
+def stream(text: str, cuts: list[int], check: StreamCheck | None = None) -> StreamCheck:
+    """Feed `text` split at `cuts`, then finish it."""
+    check = check or StreamCheck()
+    for start, end in zip([0, *cuts], [*cuts, len(text)]):
+        if check.feed(text[start:end]):
+            break
+    check.finish()
+    return check
+
+
+def rule_of(match) -> str | None:
+    return match.rule if match else None
+
+
+@pytest.mark.parametrize("expected, text", SAMPLES)
+def test_whole_text_verdicts(expected, text):
+    assert rule_of(match_output(text)) == expected
+
+
+@pytest.mark.parametrize("expected, text", SAMPLES)
+def test_split_at_every_offset(expected, text):
+    whole = match_output(text)
+    for i in range(1, len(text)):
+        check = stream(text, [i])
+        assert rule_of(check.match) == expected, f"split at {i}"
+        if whole:
+            assert check.match.span == whole.span, f"split at {i}"
+
+
+@pytest.mark.parametrize("expected, text", SAMPLES)
+def test_one_character_per_delta(expected, text):
+    assert rule_of(stream(text, list(range(1, len(text)))).match) == expected
+
+
+def test_holds_hit_at_end_of_delta():
+    check = StreamCheck(rules(r"\btea\b"))
+    # "tea" could still become "teaspoon"
+    assert check.feed("Stir in a tea") is None
+    assert check.feed("spoon of sugar.") is None
+    assert check.finish() is None
+
+
+def test_held_hit_reported_on_next_delta():
+    check = StreamCheck(rules(r"\btea\b"))
+    assert check.feed("Steep the tea") is None
+    match = check.feed(" for three minutes.")
+    assert match is not None and match.rule == "out_0"
+    assert match.span == (10, 13)
+
+
+def test_finish_flushes_hit_at_end_of_stream():
+    check = StreamCheck(rules(r"\btea\b"))
+    assert check.feed("I'd rather have tea") is None
+    match = check.finish()
+    assert match is not None and match.span == (16, 19)
+    assert check.match is match
+
+
+def test_finish_without_hit():
+    check = StreamCheck(rules(r"\btea\b"))
+    assert check.feed("Coffee, please.") is None
+    assert check.finish() is None
+    assert StreamCheck(rules(r"\btea\b")).finish() is None
+
+
+def test_no_more_matching_after_a_hit():
+    check = StreamCheck(rules(r"\btea\b", r"\bjuice\b"))
+    first = check.feed("Some tea, ")
+    assert first.rule == "out_0"
+    assert check.feed("and juice.") is first
+    assert check.finish() is first
+
+
+def test_spans_index_the_whole_response():
+    check = StreamCheck(rules(r"\btea\b"), window=16)
+    text = "Coffee is brewed with water at 93 degrees, never tea."
+    match = stream(text, list(range(5, len(text), 5)), check).match
+    assert text[match.span[0]:match.span[1]] == "tea"
+
+
+# A match split across two deltas is caught while the part already streamed
+# fits in the window. The window is cut back to a word boundary, so a
+# streamed part of exactly OUTPUT_WINDOW characters containing a space
+# loses its start.
+LONG = r"start [a-z ]+ end"
+
+
+def split_match(streamed: int) -> tuple[str, str]:
+    """Two deltas: filler then `streamed` characters of a LONG match, then the rest of it."""
+    head = "start " + "x" * (streamed - len("start "))
+    return "Some filler text before it. " + head, "xx end."
+
+
+def test_match_within_window_caught():
+    first, second = split_match(OUTPUT_WINDOW - 1)
+    check = StreamCheck(rules(LONG))
+    assert check.feed(first) is None
+    match = check.feed(second)
+    assert match is not None
+    assert (first + second)[match.span[0]:match.span[1]].startswith("start ")
+
+
+def test_match_past_window_missed_mid_stream():
+    first, second = split_match(OUTPUT_WINDOW)
+    check = StreamCheck(rules(LONG))
+    assert check.feed(first) is None
+    assert check.feed(second) is None
+    assert check.finish() is None
+    # The complete-text check still sees it
+    assert rules(LONG).output_matcher.match(first + second) is not None
+
+
+def test_match_in_one_delta_ignores_window():
+    first, second = split_match(OUTPUT_WINDOW * 2)
+    assert StreamCheck(rules(LONG)).feed(first + second) is not None
@@ -0,0 +1,220 @@
+"""Session stores: the memory store's TTL and caps, SQLite pruning and expiry, Redis against fakeredis."""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from app import sessions as sessions_module
+from app.sessions import MemorySessionStore, RedisSessionStore, SQLiteSessionStore, message_size
+
+
+def turn(n: int, text: str = "") -> list[dict]:
+    return [
+        {"role": "user", "content": f"Question {n}{text}"},
+        {"role": "assistant", "content": f"Answer {n}{text}"},
+    ]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls time.monotonic() and time.time() as the stores see them; advance with clock.now += s."""
+    class Clock:
+        now = 1_000_000.0
+
+    monkeypatch.setattr(sessions_module.time, "monotonic", lambda: Clock.now)
+    monkeypatch.setattr(sessions_module.time, "time", lambda: Clock.now)
+    return Clock
+
+
+# --- Memory ---
+
+def test_memory_round_trip():
+    store = MemorySessionStore()
+    assert store.get("a") == []
+    store.append("a", *turn(1))
+    store.append("a", *turn(2))
+    assert store.get("a") == turn(1) + turn(2)
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_memory_reads_are_fresh_dicts():
+    store = MemorySessionStore()
+    store.append("a", *turn(1))
+    store.get("a")[0]["content"] = "changed"
+    assert store.get("a") == turn(1)
+
+
+def test_memory_replace_and_delete():
+    store = MemorySessionStore()
+    store.append("a", *turn(1))
+    store.replace("a", turn(2))
+    assert store.get("a") == turn(2)
+    assert store.stats()["bytes"] == sum(map(message_size, turn(2)))
+    store.delete("a")
+    store.delete("unknown")
+    assert store.get("a") == [] and len(store) == 0 and store.stats()["bytes"] == 0
+
+
+def test_memory_unknown_role_stores_nothing():
+    store = MemorySessionStore()
+    with pytest.raises(ValueError):
+        store.append("a", {"role": "narrator", "content": "Once upon a time"})
+    assert len(store) == 0 and store.stats()["bytes"] == 0
+
+
+def test_memory_ttl_expires(clock):
+    store = MemorySessionStore(ttl=60)
+    store.append("a", *turn(1))
+    clock.now += 61
+    assert store.get("a") == []
+    assert store.stats()["expirations"] == 1 and len(store) == 0
+
+
+def test_memory_access_slides_ttl(clock):
+    store = MemorySessionStore(ttl=60)
+    store.append("a", *turn(1))
+    for _ in range(3):
+        clock.now += 50
+        assert store.get("a") == turn(1)
+
+
+def test_memory_count_cap_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    store.append("a", *turn(1))
+    store.append("b", *turn(2))
+    store.get("a")
+    store.append("c", *turn(3))
+    assert store.get("b") == []
+    assert store.get("a") == turn(1) and store.get("c") == turn(3)
+    assert store.stats()["evictions"] == 1
+
+
+def test_memory_byte_cap_evicts_least_recently_used():
+    size = sum(map(message_size, turn(1)))
+    store = MemorySessionStore(max_bytes=size * 2)
+    for session_id in "abc":
+        store.append(session_id, *turn(1))
+    assert len(store) == 2 and store.get("a") == []
+    assert store.stats()["bytes"] <= size * 2
+
+
+def test_memory_oversized_session_drops_oldest_turns():
+    store = MemorySessionStore(max_bytes=sum(map(message_size, turn(1))) * 2)
+    for n in range(5):
+        store.append("a", *turn(n))
+    assert store.get("a") == turn(3) + turn(4)
+
+
+def test_memory_async_methods():
+    store = MemorySessionStore()
+
+    async def run():
+        await store.aappend("a", *turn(1))
+        await store.areplace("a", turn(2))
+        got = await store.aget("a")
+        await store.adelete("a")
+        return got, await store.aget("a")
+
+    assert asyncio.run(run()) == (turn(2), [])
+
+
+# --- SQLite ---
+
+def test_sqlite_round_trip_shared_between_stores(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    first.append("a", *turn(1))
+    second.append("a", *turn(2))
+    assert first.get("a") == turn(1) + turn(2)
+    first.replace("a", turn(3))
+    assert second.get("a") == turn(3)
+    second.delete("a")
+    assert first.get("a") == [] and len(first) == 0
+
+
+def test_sqlite_ttl_expires(clock):
+    store = SQLiteSessionStore(":memory:", ttl=60)
+    store.append("a", *turn(1))
+    clock.now += 30
+    assert store.get("a") == turn(1)  # slides the TTL
+    clock.now += 50
+    assert store.get("a") == turn(1)
+    clock.now += 61
+    assert store.get("a") == [] and len(store) == 0
+
+
+def test_sqlite_append_after_expiry_starts_over(clock):
+    store = SQLiteSessionStore(":memory:", ttl=60)
+    store.append("a", *turn(1))
+    clock.now += 61
+    store.append("a", *turn(2))
+    assert store.get("a") == turn(2)
+
+
+def test_sqlite_prunes_expired_and_overflow(clock):
+    store = SQLiteSessionStore(":memory:", ttl=60, max_sessions=2, prune_every=4)
+    store.append("old", *turn(0))
+    clock.now += 61
+    for n, session_id in enumerate("abc", 1):
+        clock.now += 1
+        store.append(session_id, *turn(n))
+    # The fourth write pruned: "old" expired, "a" expires soonest of the rest
+    stats = store.stats()
+    assert stats["expirations"] == 1 and stats["evictions"] == 1
+    assert store.get("a") == [] and store.get("b") == turn(2) and store.get("c") == turn(3)
+    assert stats["bytes"] == 2 * sum(map(message_size, turn(1)))
+
+
+def test_sqlite_async_methods():
+    store = SQLiteSessionStore(":memory:")
+
+    async def run():
+        await store.aappend("a", *turn(1))
+        await store.aappend("a", *turn(2))
+        return await store.aget("a")
+
+    assert asyncio.run(run()) == turn(1) + turn(2)
+
+
+# --- Redis ---
+
+@pytest.fixture
+def redis_store():
+    return RedisSessionStore(fakeredis.FakeRedis(), ttl=60)
+
+
+def test_redis_round_trip(redis_store):
+    assert redis_store.get("a") == []
+    redis_store.append("a", *turn(1))
+    redis_store.append("a", *turn(2))
+    assert redis_store.get("a") == turn(1) + turn(2)
+    redis_store.replace("a", turn(3))
+    assert redis_store.get("a") == turn(3)
+    redis_store.delete("a")
+    assert redis_store.get("a") == []
+    assert redis_store.stats()["hits"] == 2 and redis_store.stats()["misses"] == 2
+
+
+def test_redis_keys_carry_the_ttl(redis_store):
+    redis_store.append("a", *turn(1))
+    key = redis_store._key("a")
+    assert 0 < redis_store.client.ttl(key) <= 60
+    redis_store.client.expire(key, 5)
+    redis_store.get("a")  # a read slides it back
+    assert redis_store.client.ttl(key) > 5
+
+
+def test_redis_stats_leave_out_the_count(redis_store):
+    for session_id in "abc":
+        redis_store.append(session_id, *turn(1))
+    assert redis_store.stats()["sessions"] is None
+    assert len(redis_store) == 3
+
+
+def test_redis_async_methods(redis_store):
+    async def run():
+        await redis_store.aappend("a", *turn(1))
+        return await redis_store.aget("a")
+
+    assert asyncio.run(run()) == turn(1)